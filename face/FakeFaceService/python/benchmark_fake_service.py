@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+
+# Load and latency benchmark of the Python samples against the local fake Face service. Concurrent workers run the
+# workflow of each sample (enrollment, identification, cleanup) through the real helpers, so the numbers show the
+# client-side cost on top of the configured service latency: connection reuse, polling, rate limiting and retries.
+#
+#   python3 benchmark_fake_service.py --target all --workers 8 --iterations 20 --latency-ms 50 --throttle 0.02
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_face_service import LATENCY_DISTRIBUTIONS, FakeFaceService, LatencyModel
+
+FACE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DATA_DIR = os.path.join(FACE_DIR, 'Scenario-FacePhotoTagging', 'data')
+ENROLLMENT_IMAGES = [os.path.join(DATA_DIR, 'SingleFaceEnrollment', f"{name}.jpg") for name in ('Alex', 'Bill', 'Clare', 'Jordan')]
+QUERY_IMAGE = os.path.join(DATA_DIR, 'family.jpg')
+# The fake service accepts any key
+SUBSCRIPTION_KEY = 'fake-key'
+INJECTION_HEADER = 'sample=fake-face-service-benchmark'
+# Modules the samples import from their own folder; they are reloaded for every target, since the folders use the same names
+SAMPLE_MODULES = ('shared_functions', 'async_shared_functions', 'batch_enrollment', 'unified_face_collection',
+                  'detection_cache', 'image_preprocessing', 'rate_limiter', 'face_tracker', 'quality_gate',
+                  'perceptual_hash', 'person_index', 'training_scheduler', 'bulk_operations')
+
+# Function to import a module of a sample folder, replacing the same-named modules of a previously loaded sample
+def load_sample_module(folder, module_name):
+    for name in SAMPLE_MODULES:
+        sys.modules.pop(name, None)
+    path = os.path.join(FACE_DIR, folder, 'python')
+    if path in sys.path:
+        sys.path.remove(path)
+    sys.path.insert(0, path)
+    module = __import__(module_name)
+    sys.path.remove(path)
+    return module
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+# Latency samples per operation, recorded from many worker threads
+class LatencyRecorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def measure(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                self.errors[name] = self.errors.get(name, 0) + 1
+            raise
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.samples.setdefault(name, []).append(elapsed)
+
+    def report(self, elapsed):
+        print(f"  {'operation':<24} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>8}")
+        with self._lock:
+            for name, samples in self.samples.items():
+                samples = sorted(samples)
+                print(f"  {name:<24} {len(samples):6d} {self.errors.get(name, 0):6d} {percentile(samples, 0.50):9.1f} "
+                      f"{percentile(samples, 0.95):9.1f} {percentile(samples, 0.99):9.1f} {len(samples) / elapsed:8.1f}")
+
+# Workflow of the photo tagging sample: enroll a person with one face, identify in a dynamic person group, clean up
+class PhotoTaggingWorkload:
+    folder = 'Scenario-FacePhotoTagging'
+
+    def setup(self, endpoint):
+        self.sf = load_sample_module(self.folder, 'shared_functions')
+        self.sf.detection_cache = None
+        self.endpoint = endpoint
+        self.person_ids = self.sf.create_persons(SUBSCRIPTION_KEY, endpoint, [f"enrolled-{i}" for i in range(len(ENROLLMENT_IMAGES))], INJECTION_HEADER)
+        for person_id, image_path in zip(self.person_ids, ENROLLMENT_IMAGES):
+            self.sf.add_person_face(SUBSCRIPTION_KEY, endpoint, image_path, person_id, INJECTION_HEADER)
+        self.dynamic_person_group_id = f"benchmark-{uuid.uuid4()}"
+        self.sf.create_dynamic_person_group(SUBSCRIPTION_KEY, endpoint, self.dynamic_person_group_id, self.person_ids, INJECTION_HEADER)
+
+    def iteration(self, recorder, worker, index):
+        sf, endpoint = self.sf, self.endpoint
+        image_path = ENROLLMENT_IMAGES[index % len(ENROLLMENT_IMAGES)]
+        with recorder.measure('create_person'):
+            person_id = sf.create_person(SUBSCRIPTION_KEY, endpoint, f"worker-{worker}-{index}", INJECTION_HEADER)
+        with recorder.measure('add_person_face'):
+            sf.add_person_face(SUBSCRIPTION_KEY, endpoint, image_path, person_id, INJECTION_HEADER)
+        with recorder.measure('identify_faces'):
+            sf.identify_faces(SUBSCRIPTION_KEY, endpoint, QUERY_IMAGE, dynamic_person_group_id=self.dynamic_person_group_id, injection_header=INJECTION_HEADER)
+        with recorder.measure('delete_person'):
+            sf.delete_person(SUBSCRIPTION_KEY, endpoint, person_id, INJECTION_HEADER)
+
+    def metrics(self):
+        return self.sf.rate_limit_scheduler.metrics()
+
+    def teardown(self):
+        self.sf.delete_dynamic_person_group(SUBSCRIPTION_KEY, self.endpoint, self.dynamic_person_group_id, INJECTION_HEADER)
+        self.sf.close_client_contexts()
+
+# Workflow of the customer check-in sample: check in a known customer, register a new one, clean up
+class CheckinWorkload:
+    folder = 'Scenario-CustomerCheckinManagement'
+
+    def setup(self, endpoint):
+        self.sf = load_sample_module(self.folder, 'shared_functions')
+        self.sf.detection_cache = None
+        self.endpoint = endpoint
+        self.dynamic_person_group_id = f"benchmark-{uuid.uuid4()}"
+        self.sf.create_dynamic_person_group(SUBSCRIPTION_KEY, endpoint, self.dynamic_person_group_id, INJECTION_HEADER)
+        for image_path in ENROLLMENT_IMAGES:
+            person_id = self.sf.create_person(SUBSCRIPTION_KEY, endpoint, injection_header=INJECTION_HEADER)
+            self.sf.add_person_face(SUBSCRIPTION_KEY, endpoint, image_path, person_id, INJECTION_HEADER)
+            self.sf.link_person_to_dynamic_person_group(SUBSCRIPTION_KEY, endpoint, self.dynamic_person_group_id, person_id, INJECTION_HEADER)
+
+    def iteration(self, recorder, worker, index):
+        sf, endpoint = self.sf, self.endpoint
+        image_path = ENROLLMENT_IMAGES[index % len(ENROLLMENT_IMAGES)]
+        with recorder.measure('detect_faces'):
+            faces = sf.detect_faces(SUBSCRIPTION_KEY, endpoint, image_path, INJECTION_HEADER)
+        with recorder.measure('identify_faces'):
+            sf.identify_faces(SUBSCRIPTION_KEY, endpoint, faces[0].face_id, self.dynamic_person_group_id, INJECTION_HEADER)
+        with recorder.measure('create_person'):
+            person_id = sf.create_person(SUBSCRIPTION_KEY, endpoint, injection_header=INJECTION_HEADER)
+        with recorder.measure('add_person_face'):
+            sf.add_person_face(SUBSCRIPTION_KEY, endpoint, image_path, person_id, INJECTION_HEADER)
+        with recorder.measure('link_person'):
+            sf.link_person_to_dynamic_person_group(SUBSCRIPTION_KEY, endpoint, self.dynamic_person_group_id, person_id, INJECTION_HEADER)
+        with recorder.measure('delete_person'):
+            sf.delete_person(SUBSCRIPTION_KEY, endpoint, person_id, INJECTION_HEADER)
+
+    def metrics(self):
+        return self.sf.rate_limit_scheduler.metrics()
+
+    def teardown(self):
+        self.sf.delete_dynamic_person_group(SUBSCRIPTION_KEY, self.endpoint, self.dynamic_person_group_id, INJECTION_HEADER)
+        self.sf.close_client_contexts()
+
+# Workflow of UnifiedFaceCollection: add a named face, search by face and by person, remove the face again
+class UnifiedWorkload:
+    folder = 'UnifiedFaceCollection'
+
+    def __init__(self, train=False):
+        self.train = train
+
+    def setup(self, endpoint):
+        module = load_sample_module(self.folder, 'unified_face_collection')
+        self.scheduler = module.shared_rate_limit_scheduler
+        self.collection = module.UnifiedFaceCollection(SUBSCRIPTION_KEY, endpoint, f"benchmark-{uuid.uuid4()}", INJECTION_HEADER)
+        self.collection.detection_cache = None
+        for i, image_path in enumerate(ENROLLMENT_IMAGES):
+            self.collection.add_face(image_path, person_name=f"enrolled-{i}")
+
+    def iteration(self, recorder, worker, index):
+        collection = self.collection
+        image_path = ENROLLMENT_IMAGES[index % len(ENROLLMENT_IMAGES)]
+        with recorder.measure('add_face'):
+            result = collection.add_face(image_path, person_name=f"worker-{worker}-{index}")
+        # Training waits for the training operations, so it is only included on request
+        if self.train and index == 0:
+            with recorder.measure('train'):
+                collection.train()
+        with recorder.measure('find_face (face)'):
+            collection.find_face(QUERY_IMAGE, 'face')
+        with recorder.measure('find_face (person)'):
+            collection.find_face(QUERY_IMAGE, 'person')
+        with recorder.measure('remove_face'):
+            collection.remove_face(result['face_list']['persistedFaceId'])
+
+    def metrics(self):
+        return self.scheduler.metrics()
+
+    def teardown(self):
+        self.collection.delete_collection()
+        self.collection.close()
+
+# Function to run the workload with concurrent workers and print the latency report
+def run_target(name, workload, service, workers, iterations, verbose):
+    print(f"\n{name} ({workers} workers x {iterations} iterations)")
+    recorder = LatencyRecorder()
+    # The helpers print progress for every call; keep the report readable unless asked otherwise
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+
+    def worker(worker_index):
+        for index in range(iterations):
+            try:
+                workload.iteration(recorder, worker_index, index)
+            except Exception as e:
+                sys.stderr.write(f"worker {worker_index} iteration {index}: {e!r}\n")
+
+    with output:
+        workload.setup(service.endpoint)
+    service.reset_stats()
+    start = time.perf_counter()
+    with output:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(worker, range(workers)))
+    elapsed = time.perf_counter() - start
+    metrics = workload.metrics()
+    stats = service.stats()
+    with output:
+        workload.teardown()
+
+    recorder.report(elapsed)
+    print(f"  {workers * iterations / elapsed:.1f} iterations/s, {stats['totalRequests'] / elapsed:.1f} requests/s "
+          f"in {elapsed:.2f} s; {stats['throttled']} throttled by the service, {metrics['retries']} client retries")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the sample helpers against a local fake Face service.')
+    parser.add_argument('--target', choices=['photo-tagging', 'checkin', 'unified', 'all'], default='all')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=10, help='iterations per worker')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='median service latency per request')
+    parser.add_argument('--latency-distribution', choices=LATENCY_DISTRIBUTIONS, default='lognormal')
+    parser.add_argument('--latency-sigma', type=float, default=0.5)
+    parser.add_argument('--detect-latency-ms', type=float, default=None, help='median latency of detect, if different')
+    parser.add_argument('--operation-ms', type=float, default=200.0, help='median duration of long-running operations')
+    parser.add_argument('--throttle', type=float, default=0.0, help='fraction of requests answered with 429')
+    parser.add_argument('--service-rps', type=float, default=None, help='transactions per second allowed by the service')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds of 429 responses')
+    parser.add_argument('--train', action='store_true', help='include training in the UnifiedFaceCollection workload')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--verbose', action='store_true', help='show the output of the helpers')
+    args = parser.parse_args()
+
+    overrides = {'detect': args.detect_latency_ms} if args.detect_latency_ms is not None else None
+    latency = LatencyModel(args.latency_ms, args.latency_distribution, args.latency_sigma, overrides, args.seed)
+    operation_latency = LatencyModel(args.operation_ms, args.latency_distribution, args.latency_sigma, seed=args.seed)
+    targets = {
+        'photo-tagging': PhotoTaggingWorkload,
+        'checkin': CheckinWorkload,
+        'unified': lambda: UnifiedWorkload(args.train)
+    }
+    names = list(targets) if args.target == 'all' else [args.target]
+
+    with FakeFaceService(latency, operation_latency, args.throttle, args.service_rps, args.retry_after, seed=args.seed) as service:
+        print(f"Fake Face endpoint: {service.endpoint} ({args.latency_distribution} latency, median {args.latency_ms} ms, "
+              f"operations {args.operation_ms} ms, throttle {args.throttle:.1%})")
+        for name in names:
+            run_target(name, targets[name](), service, args.workers, args.iterations, args.verbose)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,608 @@
+# -*- coding: utf-8 -*-
+
+# In-process stand-in for the Face API, for load and latency benchmarking of the samples without an Azure resource.
+# It keeps persons, dynamic person groups, large face lists and large person groups in memory and answers the
+# endpoints the samples use with the same status codes, 202 + Operation-Location semantics and response shapes.
+# Latency, operation duration and throttling (429 + Retry-After) are configurable.
+#
+#   with FakeFaceService(latency_ms=50, throttle_probability=0.01) as service:
+#       run_workload(service.endpoint)
+
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Supported latency distributions of LatencyModel
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal')
+
+# Per-request service latency. latency_ms is the median; for lognormal, sigma is the shape parameter,
+# for normal and uniform it is the relative spread (0.5 -> +-50% for uniform, 50% standard deviation for normal).
+class LatencyModel:
+    def __init__(self, latency_ms=50.0, distribution='lognormal', sigma=0.5, overrides_ms=None, seed=None):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution {distribution!r}, expected one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+        self.latency_ms = latency_ms
+        self.distribution = distribution
+        self.sigma = sigma
+        # Median latency per operation name (for example {'detect': 120}), overriding latency_ms
+        self.overrides_ms = overrides_ms or {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    # Function to draw the latency of one request in seconds
+    def sample(self, operation=None):
+        median = self.overrides_ms.get(operation, self.latency_ms)
+        if median <= 0:
+            return 0.0
+        with self._lock:
+            if self.distribution == 'fixed':
+                value = median
+            elif self.distribution == 'uniform':
+                value = self._random.uniform(median * (1 - self.sigma), median * (1 + self.sigma))
+            elif self.distribution == 'normal':
+                value = self._random.gauss(median, median * self.sigma)
+            else:
+                value = median * math.exp(self._random.gauss(0, self.sigma))
+        return max(0.0, value) / 1000
+
+class FakeFaceError(Exception):
+    def __init__(self, status, code, message):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+# Function to apply the start/top paging of list operations: items with an ID greater than start, in ID order
+def _page(items, query, key):
+    items = sorted(items, key=lambda item: item[key])
+    start = query.get('start')
+    if start:
+        items = [item for item in items if item[key] > start]
+    return items[:min(int(query.get('top', 1000)), 1000)]
+
+class FakeFaceService:
+    def __init__(self, latency=None, operation_latency=None, throttle_probability=0.0, requests_per_second=None,
+                 retry_after=1, faces_per_image=1, host='127.0.0.1', port=0, seed=None):
+        self.latency = latency or LatencyModel(seed=seed)
+        # Time until a long-running operation (Operation-Location) reports succeeded
+        self.operation_latency = operation_latency or LatencyModel(200.0, 'lognormal', 0.5, seed=seed)
+        # Fraction of requests answered with 429 at random, and a server-side transactions-per-second limit
+        self.throttle_probability = throttle_probability
+        self.requests_per_second = requests_per_second
+        self.retry_after = retry_after
+        self.faces_per_image = faces_per_image
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = requests_per_second or 0
+        self._tokens_updated = time.monotonic()
+        self.reset()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def endpoint(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, name='fake-face-service', daemon=True)
+            self._thread.start()
+        return self.endpoint
+
+    def stop(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    # Function to drop all stored data and counters
+    def reset(self):
+        with self._lock:
+            self.faces = {}
+            self.persons = {}
+            self.dynamic_person_groups = {}
+            self.large_face_lists = {}
+            self.large_person_groups = {}
+            self.operations = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = {}
+            self.throttled = 0
+
+    # Function to report the number of requests per operation and of throttled responses
+    def stats(self):
+        with self._lock:
+            return {'requests': dict(self.requests), 'totalRequests': sum(self.requests.values()), 'throttled': self.throttled}
+
+    def _handler_class(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def _dispatch(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0) or 0))
+                status, payload, headers = service.handle(self.command, self.path, self.headers, body)
+                data = b'' if payload is None else json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                if payload is not None:
+                    self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.send_header('apim-request-id', str(uuid.uuid4()))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    # Function to answer one request: returns (status, JSON payload or None, headers)
+    def handle(self, method, path, headers, body):
+        url = urlparse(path)
+        match = re.match(r'^/face/[^/]+(/.*)$', url.path)
+        route = self._route(method, match.group(1) if match else url.path)
+        operation = route[0] if route else 'unknown'
+        with self._lock:
+            self.requests[operation] = self.requests.get(operation, 0) + 1
+        time.sleep(self.latency.sample(operation))
+
+        if self._throttle():
+            with self._lock:
+                self.throttled += 1
+            error = {'error': {'code': '429', 'message': 'Requests to the Face API are throttled. Please retry later.'}}
+            return 429, error, {'Retry-After': str(self.retry_after)}
+        if route is None:
+            return 404, {'error': {'code': 'NotFound', 'message': f'Resource not found: {method} {url.path}'}}, {}
+
+        operation, handler, arguments = route
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            data = json.loads(body) if body and 'json' in (headers.get('Content-Type') or '') else None
+        except ValueError:
+            return 400, {'error': {'code': 'BadArgument', 'message': 'Invalid JSON body.'}}, {}
+        try:
+            with self._lock:
+                return handler(*arguments, query=query, data=data, body=body, host=headers.get('Host'))
+        except FakeFaceError as e:
+            return e.status, {'error': {'code': e.code, 'message': e.message}}, {}
+
+    def _throttle(self):
+        if self.throttle_probability and self._random.random() < self.throttle_probability:
+            return True
+        if not self.requests_per_second:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.requests_per_second, self._tokens + (now - self._tokens_updated) * self.requests_per_second)
+            self._tokens_updated = now
+            if self._tokens < 1:
+                return True
+            self._tokens -= 1
+            return False
+
+    def _route(self, method, path):
+        for route_method, pattern, operation, handler in self._routes():
+            if route_method != method:
+                continue
+            match = re.match(pattern + '$', path)
+            if match:
+                return operation, handler, match.groups()
+        return None
+
+    def _routes(self):
+        segment = r'([^/]+)'
+        return [
+            ('POST', r'/detect', 'detect', self._detect),
+            ('POST', r'/identify', 'identify', self._identify),
+            ('POST', r'/findsimilars', 'findsimilars', self._find_similars),
+            ('GET', rf'/operations/{segment}', 'operations', self._get_operation),
+            # Person directory
+            ('POST', r'/persons', 'persons', self._create_person),
+            ('GET', r'/persons', 'persons', self._list_persons),
+            ('GET', rf'/persons/{segment}', 'persons', self._get_person),
+            ('DELETE', rf'/persons/{segment}', 'persons', self._delete_person),
+            ('POST', rf'/persons/{segment}/recognitionModels/{segment}/persistedFaces', 'persistedFaces', self._add_person_face),
+            ('GET', rf'/persons/{segment}/recognitionModels/{segment}/persistedFaces', 'persistedFaces', self._list_person_faces),
+            ('DELETE', rf'/persons/{segment}/recognitionModels/{segment}/persistedFaces/{segment}', 'persistedFaces', self._delete_person_face),
+            # Dynamic person groups
+            ('PUT', rf'/dynamicpersongroups/{segment}', 'dynamicpersongroups', self._create_dynamic_person_group),
+            ('GET', rf'/dynamicpersongroups/{segment}', 'dynamicpersongroups', self._get_dynamic_person_group),
+            ('PATCH', rf'/dynamicpersongroups/{segment}', 'dynamicpersongroups', self._update_dynamic_person_group),
+            ('DELETE', rf'/dynamicpersongroups/{segment}', 'dynamicpersongroups', self._delete_dynamic_person_group),
+            ('GET', rf'/dynamicpersongroups/{segment}/persons', 'dynamicpersongroups', self._list_dynamic_person_group_persons),
+            # Large face lists
+            ('PUT', rf'/largefacelists/{segment}', 'largefacelists', self._create_large_face_list),
+            ('GET', rf'/largefacelists/{segment}', 'largefacelists', self._get_large_face_list),
+            ('DELETE', rf'/largefacelists/{segment}', 'largefacelists', self._delete_large_face_list),
+            ('POST', rf'/largefacelists/{segment}/train', 'largefacelists', self._train_large_face_list),
+            ('GET', rf'/largefacelists/{segment}/training', 'largefacelists', self._get_large_face_list_training),
+            ('POST', rf'/largefacelists/{segment}/persistedfaces', 'largefacelists', self._add_large_face_list_face),
+            ('GET', rf'/largefacelists/{segment}/persistedfaces', 'largefacelists', self._list_large_face_list_faces),
+            ('GET', rf'/largefacelists/{segment}/persistedfaces/{segment}', 'largefacelists', self._get_large_face_list_face),
+            ('PATCH', rf'/largefacelists/{segment}/persistedfaces/{segment}', 'largefacelists', self._update_large_face_list_face),
+            ('DELETE', rf'/largefacelists/{segment}/persistedfaces/{segment}', 'largefacelists', self._delete_large_face_list_face),
+            # Large person groups
+            ('PUT', rf'/largepersongroups/{segment}', 'largepersongroups', self._create_large_person_group),
+            ('GET', rf'/largepersongroups/{segment}', 'largepersongroups', self._get_large_person_group),
+            ('DELETE', rf'/largepersongroups/{segment}', 'largepersongroups', self._delete_large_person_group),
+            ('POST', rf'/largepersongroups/{segment}/train', 'largepersongroups', self._train_large_person_group),
+            ('GET', rf'/largepersongroups/{segment}/training', 'largepersongroups', self._get_large_person_group_training),
+            ('POST', rf'/largepersongroups/{segment}/persons', 'largepersongroups', self._create_large_person_group_person),
+            ('GET', rf'/largepersongroups/{segment}/persons', 'largepersongroups', self._list_large_person_group_persons),
+            ('GET', rf'/largepersongroups/{segment}/persons/{segment}', 'largepersongroups', self._get_large_person_group_person),
+            ('PATCH', rf'/largepersongroups/{segment}/persons/{segment}', 'largepersongroups', self._update_large_person_group_person),
+            ('DELETE', rf'/largepersongroups/{segment}/persons/{segment}', 'largepersongroups', self._delete_large_person_group_person),
+            ('POST', rf'/largepersongroups/{segment}/persons/{segment}/persistedfaces', 'largepersongroups', self._add_large_person_group_face),
+            ('GET', rf'/largepersongroups/{segment}/persons/{segment}/persistedfaces/{segment}', 'largepersongroups', self._get_large_person_group_face),
+            ('PATCH', rf'/largepersongroups/{segment}/persons/{segment}/persistedfaces/{segment}', 'largepersongroups', self._update_large_person_group_face),
+            ('DELETE', rf'/largepersongroups/{segment}/persons/{segment}/persistedfaces/{segment}', 'largepersongroups', self._delete_large_person_group_face),
+        ]
+
+    # Long-running operations: the resource changes right away, the operation reports succeeded after a delay
+    def _start_operation(self, host, kind):
+        operation_id = str(uuid.uuid4())
+        self.operations[operation_id] = {
+            'operationId': operation_id,
+            'kind': kind,
+            'created': _now(),
+            'due': time.monotonic() + self.operation_latency.sample(kind)
+        }
+        return {'Operation-Location': f"http://{host}/face/v1.2-preview.1/operations/{operation_id}"}
+
+    def _get_operation(self, operation_id, **kwargs):
+        operation = self.operations.get(operation_id)
+        if operation is None:
+            raise FakeFaceError(404, 'NotFound', 'Operation not found.')
+        done = time.monotonic() >= operation['due']
+        payload = {
+            'operationId': operation_id,
+            'status': 'succeeded' if done else 'running',
+            'createdTime': operation['created'],
+            'lastActionTime': _now(),
+            'message': None
+        }
+        if done:
+            payload['finishedTime'] = payload['lastActionTime']
+        return 200, payload, {}
+
+    def _training_status(self, resource):
+        operation = self.operations.get(resource.get('trainingOperation'))
+        if operation is None:
+            return 200, {'status': 'notStarted', 'createdDateTime': resource['created']}, {}
+        done = time.monotonic() >= operation['due']
+        return 200, {'status': 'succeeded' if done else 'running', 'createdDateTime': operation['created'],
+                     'lastActionDateTime': _now()}, {}
+
+    @staticmethod
+    def _require(collection, key, code):
+        if key not in collection:
+            raise FakeFaceError(404, code, f"{code}: {key}")
+        return collection[key]
+
+    # Detection and recognition
+    def _detect(self, query, body, **kwargs):
+        if not body:
+            raise FakeFaceError(400, 'InvalidImage', 'Image is empty.')
+        seed = int(hashlib.sha256(body).hexdigest()[:8], 16)
+        attributes = [name for name in query.get('returnFaceAttributes', '').split(',') if name]
+        faces = []
+        for index in range(self.faces_per_image):
+            size = 80 + (seed + index * 37) % 120
+            face = {'faceRectangle': {'top': 40 + index * 10, 'left': 40 + index * (size + 20), 'width': size, 'height': size}}
+            if query.get('returnFaceId', 'false').lower() == 'true':
+                face_id = str(uuid.uuid4())
+                self.faces[face_id] = seed + index
+                face = {'faceId': face_id, **face}
+            if query.get('returnFaceLandmarks', 'false').lower() == 'true':
+                rectangle = face['faceRectangle']
+                center_x = rectangle['left'] + rectangle['width'] / 2
+                face['faceLandmarks'] = {
+                    'pupilLeft': {'x': center_x - size / 5, 'y': rectangle['top'] + size / 3},
+                    'pupilRight': {'x': center_x + size / 5, 'y': rectangle['top'] + size / 3},
+                    'noseTip': {'x': center_x, 'y': rectangle['top'] + size / 2}
+                }
+            if attributes:
+                face['faceAttributes'] = self._face_attributes(attributes)
+            faces.append(face)
+        return 200, faces, {}
+
+    @staticmethod
+    def _face_attributes(attributes):
+        values = {
+            'qualityForRecognition': 'high',
+            'blur': {'blurLevel': 'low', 'value': 0.0},
+            'headPose': {'pitch': 0.0, 'roll': 0.0, 'yaw': 0.0},
+            'mask': {'type': 'noMask', 'noseAndMouthCovered': False},
+            'exposure': {'exposureLevel': 'goodExposure', 'value': 0.5},
+            'noise': {'noiseLevel': 'low', 'value': 0.0},
+            'occlusion': {'foreheadOccluded': False, 'eyeOccluded': False, 'mouthOccluded': False},
+            'glasses': 'noGlasses',
+            'accessories': []
+        }
+        return {name: values[name] for name in attributes if name in values}
+
+    # Identify returns the person of the scope picked by the face seed, so the same image identifies the same person
+    def _identify(self, data, **kwargs):
+        data = data or {}
+        if 'dynamicPersonGroupId' in data:
+            scope = sorted(self._require(self.dynamic_person_groups, data['dynamicPersonGroupId'], 'DynamicPersonGroupNotFound')['personIds'])
+        elif 'largePersonGroupId' in data:
+            scope = sorted(self._require(self.large_person_groups, data['largePersonGroupId'], 'LargePersonGroupNotFound')['persons'])
+        elif data.get('personIds') == ['*'] or data.get('personIds') == '*':
+            scope = sorted(self.persons)
+        else:
+            scope = [person_id for person_id in data.get('personIds', []) if person_id in self.persons]
+        results = []
+        for face_id in data.get('faceIds', []):
+            seed = self._require(self.faces, face_id, 'FaceNotFound')
+            candidates = []
+            if scope:
+                candidates.append({'personId': scope[seed % len(scope)], 'confidence': 0.9})
+            results.append({'faceId': face_id, 'candidates': candidates[:data.get('maxNumOfCandidatesReturned', 1)]})
+        return 200, results, {}
+
+    def _find_similars(self, data, **kwargs):
+        data = data or {}
+        seed = self._require(self.faces, data.get('faceId'), 'FaceNotFound')
+        face_list = self._require(self.large_face_lists, data.get('largeFaceListId'), 'LargeFaceListNotFound')
+        faces = sorted(face_list['faces'])
+        if not faces:
+            return 200, [], {}
+        return 200, [{'persistedFaceId': faces[seed % len(faces)], 'confidence': 0.9}], {}
+
+    # Person directory
+    def _create_person(self, data, host, **kwargs):
+        person_id = str(uuid.uuid4())
+        self.persons[person_id] = {'personId': person_id, 'name': (data or {}).get('name'), 'userData': (data or {}).get('userData'), 'faces': []}
+        return 202, {'personId': person_id}, self._start_operation(host, 'persons')
+
+    def _list_persons(self, query, **kwargs):
+        persons = [{'personId': p['personId'], 'name': p['name'], 'userData': p['userData']} for p in self.persons.values()]
+        return 200, _page(persons, query, 'personId'), {}
+
+    def _get_person(self, person_id, **kwargs):
+        person = self._require(self.persons, person_id, 'PersonNotFound')
+        return 200, {'personId': person_id, 'name': person['name'], 'userData': person['userData']}, {}
+
+    def _delete_person(self, person_id, host, **kwargs):
+        self._require(self.persons, person_id, 'PersonNotFound')
+        del self.persons[person_id]
+        for group in self.dynamic_person_groups.values():
+            group['personIds'].discard(person_id)
+        return 202, None, self._start_operation(host, 'persons')
+
+    def _add_person_face(self, person_id, recognition_model, body, host, **kwargs):
+        person = self._require(self.persons, person_id, 'PersonNotFound')
+        if not body:
+            raise FakeFaceError(400, 'InvalidImage', 'Image is empty.')
+        persisted_face_id = str(uuid.uuid4())
+        person['faces'].append(persisted_face_id)
+        return 202, {'persistedFaceId': persisted_face_id}, self._start_operation(host, 'persistedFaces')
+
+    def _list_person_faces(self, person_id, recognition_model, **kwargs):
+        person = self._require(self.persons, person_id, 'PersonNotFound')
+        return 200, {'personId': person_id, 'persistedFaceIds': list(person['faces'])}, {}
+
+    def _delete_person_face(self, person_id, recognition_model, persisted_face_id, host, **kwargs):
+        person = self._require(self.persons, person_id, 'PersonNotFound')
+        if persisted_face_id not in person['faces']:
+            raise FakeFaceError(404, 'PersistedFaceNotFound', f"PersistedFaceNotFound: {persisted_face_id}")
+        person['faces'].remove(persisted_face_id)
+        return 202, None, self._start_operation(host, 'persistedFaces')
+
+    # Dynamic person groups
+    def _create_dynamic_person_group(self, group_id, data, host, **kwargs):
+        data = data or {}
+        if group_id in self.dynamic_person_groups:
+            raise FakeFaceError(409, 'DynamicPersonGroupExists', f"DynamicPersonGroupExists: {group_id}")
+        person_ids = set(data.get('addPersonIds') or [])
+        for person_id in person_ids:
+            self._require(self.persons, person_id, 'PersonNotFound')
+        self.dynamic_person_groups[group_id] = {'name': data.get('name'), 'userData': data.get('userData'), 'personIds': person_ids}
+        if person_ids:
+            return 202, None, self._start_operation(host, 'dynamicpersongroups')
+        return 200, None, {}
+
+    def _get_dynamic_person_group(self, group_id, **kwargs):
+        group = self._require(self.dynamic_person_groups, group_id, 'DynamicPersonGroupNotFound')
+        return 200, {'dynamicPersonGroupId': group_id, 'name': group['name'], 'userData': group['userData']}, {}
+
+    def _update_dynamic_person_group(self, group_id, data, host, **kwargs):
+        group = self._require(self.dynamic_person_groups, group_id, 'DynamicPersonGroupNotFound')
+        data = data or {}
+        for person_id in data.get('addPersonIds') or []:
+            self._require(self.persons, person_id, 'PersonNotFound')
+            group['personIds'].add(person_id)
+        for person_id in data.get('removePersonIds') or []:
+            group['personIds'].discard(person_id)
+        for field in ('name', 'userData'):
+            if field in data:
+                group[field] = data[field]
+        if data.get('addPersonIds') or data.get('removePersonIds'):
+            return 202, None, self._start_operation(host, 'dynamicpersongroups')
+        return 200, None, {}
+
+    def _delete_dynamic_person_group(self, group_id, host, **kwargs):
+        self._require(self.dynamic_person_groups, group_id, 'DynamicPersonGroupNotFound')
+        del self.dynamic_person_groups[group_id]
+        return 202, None, self._start_operation(host, 'dynamicpersongroups')
+
+    def _list_dynamic_person_group_persons(self, group_id, query, **kwargs):
+        group = self._require(self.dynamic_person_groups, group_id, 'DynamicPersonGroupNotFound')
+        persons = _page([{'personId': person_id} for person_id in group['personIds']], query, 'personId')
+        return 200, {'personIds': [person['personId'] for person in persons]}, {}
+
+    # Large face lists
+    def _create_large_face_list(self, list_id, data, **kwargs):
+        if list_id in self.large_face_lists:
+            raise FakeFaceError(409, 'LargeFaceListExists', f"LargeFaceListExists: {list_id}")
+        data = data or {}
+        self.large_face_lists[list_id] = {'name': data.get('name'), 'userData': data.get('userData'),
+                                          'recognitionModel': data.get('recognitionModel'), 'faces': {}, 'created': _now()}
+        return 200, None, {}
+
+    def _get_large_face_list(self, list_id, **kwargs):
+        face_list = self._require(self.large_face_lists, list_id, 'LargeFaceListNotFound')
+        return 200, {'largeFaceListId': list_id, 'name': face_list['name'], 'userData': face_list['userData'],
+                     'recognitionModel': face_list['recognitionModel']}, {}
+
+    def _delete_large_face_list(self, list_id, **kwargs):
+        self._require(self.large_face_lists, list_id, 'LargeFaceListNotFound')
+        del self.large_face_lists[list_id]
+        return 200, None, {}
+
+    def _train_large_face_list(self, list_id, host, **kwargs):
+        face_list = self._require(self.large_face_lists, list_id, 'LargeFaceListNotFound')
+        headers = self._start_operation(host, 'train')
+        face_list['trainingOperation'] = headers['Operation-Location'].rsplit('/', 1)[-1]
+        return 202, None, headers
+
+    def _get_large_face_list_training(self, list_id, **kwargs):
+        return self._training_status(self._require(self.large_face_lists, list_id, 'LargeFaceListNotFound'))
+
+    def _add_large_face_list_face(self, list_id, query, body, **kwargs):
+        face_list = self._require(self.large_face_lists, list_id, 'LargeFaceListNotFound')
+        if not body:
+            raise FakeFaceError(400, 'InvalidImage', 'Image is empty.')
+        persisted_face_id = str(uuid.uuid4())
+        face_list['faces'][persisted_face_id] = {'persistedFaceId': persisted_face_id, 'userData': query.get('userData')}
+        return 200, {'persistedFaceId': persisted_face_id}, {}
+
+    def _list_large_face_list_faces(self, list_id, query, **kwargs):
+        face_list = self._require(self.large_face_lists, list_id, 'LargeFaceListNotFound')
+        return 200, _page([dict(face) for face in face_list['faces'].values()], query, 'persistedFaceId'), {}
+
+    def _get_large_face_list_face(self, list_id, persisted_face_id, **kwargs):
+        face_list = self._require(self.large_face_lists, list_id, 'LargeFaceListNotFound')
+        return 200, dict(self._require(face_list['faces'], persisted_face_id, 'PersistedFaceNotFound')), {}
+
+    def _update_large_face_list_face(self, list_id, persisted_face_id, data, **kwargs):
+        face_list = self._require(self.large_face_lists, list_id, 'LargeFaceListNotFound')
+        face = self._require(face_list['faces'], persisted_face_id, 'PersistedFaceNotFound')
+        face['userData'] = (data or {}).get('userData')
+        return 200, None, {}
+
+    def _delete_large_face_list_face(self, list_id, persisted_face_id, **kwargs):
+        face_list = self._require(self.large_face_lists, list_id, 'LargeFaceListNotFound')
+        self._require(face_list['faces'], persisted_face_id, 'PersistedFaceNotFound')
+        del face_list['faces'][persisted_face_id]
+        return 200, None, {}
+
+    # Large person groups
+    def _create_large_person_group(self, group_id, data, **kwargs):
+        if group_id in self.large_person_groups:
+            raise FakeFaceError(409, 'LargePersonGroupExists', f"LargePersonGroupExists: {group_id}")
+        data = data or {}
+        self.large_person_groups[group_id] = {'name': data.get('name'), 'userData': data.get('userData'),
+                                              'recognitionModel': data.get('recognitionModel'), 'persons': {}, 'created': _now()}
+        return 200, None, {}
+
+    def _get_large_person_group(self, group_id, **kwargs):
+        group = self._require(self.large_person_groups, group_id, 'LargePersonGroupNotFound')
+        return 200, {'largePersonGroupId': group_id, 'name': group['name'], 'userData': group['userData'],
+                     'recognitionModel': group['recognitionModel']}, {}
+
+    def _delete_large_person_group(self, group_id, **kwargs):
+        self._require(self.large_person_groups, group_id, 'LargePersonGroupNotFound')
+        del self.large_person_groups[group_id]
+        return 200, None, {}
+
+    def _train_large_person_group(self, group_id, host, **kwargs):
+        group = self._require(self.large_person_groups, group_id, 'LargePersonGroupNotFound')
+        headers = self._start_operation(host, 'train')
+        group['trainingOperation'] = headers['Operation-Location'].rsplit('/', 1)[-1]
+        return 202, None, headers
+
+    def _get_large_person_group_training(self, group_id, **kwargs):
+        return self._training_status(self._require(self.large_person_groups, group_id, 'LargePersonGroupNotFound'))
+
+    @staticmethod
+    def _person_payload(person):
+        return {'personId': person['personId'], 'name': person['name'], 'userData': person['userData'],
+                'persistedFaceIds': list(person['faces'])}
+
+    def _create_large_person_group_person(self, group_id, data, **kwargs):
+        group = self._require(self.large_person_groups, group_id, 'LargePersonGroupNotFound')
+        person_id = str(uuid.uuid4())
+        group['persons'][person_id] = {'personId': person_id, 'name': (data or {}).get('name'),
+                                       'userData': (data or {}).get('userData'), 'faces': {}}
+        return 200, {'personId': person_id}, {}
+
+    def _list_large_person_group_persons(self, group_id, query, **kwargs):
+        group = self._require(self.large_person_groups, group_id, 'LargePersonGroupNotFound')
+        return 200, _page([self._person_payload(person) for person in group['persons'].values()], query, 'personId'), {}
+
+    def _get_large_person_group_person(self, group_id, person_id, **kwargs):
+        group = self._require(self.large_person_groups, group_id, 'LargePersonGroupNotFound')
+        return 200, self._person_payload(self._require(group['persons'], person_id, 'PersonNotFound')), {}
+
+    def _update_large_person_group_person(self, group_id, person_id, data, **kwargs):
+        group = self._require(self.large_person_groups, group_id, 'LargePersonGroupNotFound')
+        person = self._require(group['persons'], person_id, 'PersonNotFound')
+        for field in ('name', 'userData'):
+            if field in (data or {}):
+                person[field] = data[field]
+        return 200, None, {}
+
+    def _delete_large_person_group_person(self, group_id, person_id, **kwargs):
+        group = self._require(self.large_person_groups, group_id, 'LargePersonGroupNotFound')
+        self._require(group['persons'], person_id, 'PersonNotFound')
+        del group['persons'][person_id]
+        return 200, None, {}
+
+    def _add_large_person_group_face(self, group_id, person_id, query, body, **kwargs):
+        group = self._require(self.large_person_groups, group_id, 'LargePersonGroupNotFound')
+        person = self._require(group['persons'], person_id, 'PersonNotFound')
+        if not body:
+            raise FakeFaceError(400, 'InvalidImage', 'Image is empty.')
+        persisted_face_id = str(uuid.uuid4())
+        person['faces'][persisted_face_id] = {'persistedFaceId': persisted_face_id, 'userData': query.get('userData')}
+        return 200, {'persistedFaceId': persisted_face_id}, {}
+
+    def _get_large_person_group_face(self, group_id, person_id, persisted_face_id, **kwargs):
+        group = self._require(self.large_person_groups, group_id, 'LargePersonGroupNotFound')
+        person = self._require(group['persons'], person_id, 'PersonNotFound')
+        return 200, dict(self._require(person['faces'], persisted_face_id, 'PersistedFaceNotFound')), {}
+
+    def _update_large_person_group_face(self, group_id, person_id, persisted_face_id, data, **kwargs):
+        group = self._require(self.large_person_groups, group_id, 'LargePersonGroupNotFound')
+        person = self._require(group['persons'], person_id, 'PersonNotFound')
+        face = self._require(person['faces'], persisted_face_id, 'PersistedFaceNotFound')
+        face['userData'] = (data or {}).get('userData')
+        return 200, None, {}
+
+    def _delete_large_person_group_face(self, group_id, person_id, persisted_face_id, **kwargs):
+        group = self._require(self.large_person_groups, group_id, 'LargePersonGroupNotFound')
+        person = self._require(group['persons'], person_id, 'PersonNotFound')
+        self._require(person['faces'], persisted_face_id, 'PersistedFaceNotFound')
+        del person['faces'][persisted_face_id]
+        return 200, None, {}
@@ -0,0 +1,339 @@
+import asyncio, time
+import aiohttp
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.ai.vision.face.aio import FaceClient
+from azure.ai.vision.face.models import FaceDetectionModel, FaceRecognitionModel, FaceAttributeTypeRecognition04, QualityForRecognition
+
+import shared_functions
+from rate_limiter import PRIORITY_INTERACTIVE, rate_limit_middleware, request_priority
+from shared_functions import IDENTIFY_BATCH_WINDOW, IDENTIFY_MAX_FACE_IDS, _identify_body, api_version, enlarge_bounding_box, preprocess_image
+
+# Size of the shared connection pool (total, and per Face endpoint host)
+POOL_LIMIT = 256
+POOL_LIMIT_PER_HOST = 128
+# Adaptive polling of long-running operations
+POLL_INITIAL_INTERVAL = 0.25
+POLL_MAX_INTERVAL = 5.0
+POLL_BACKOFF = 1.5
+POLL_TIMEOUT = 300
+
+_session = None
+_face_clients = {}
+_identify_batcher = None
+
+# Function to get the aiohttp session shared by all async helpers; must be called from the event loop that uses it.
+# Its requests share the rate limit scheduler of shared_functions with the synchronous helpers.
+def get_session():
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=POOL_LIMIT, limit_per_host=POOL_LIMIT_PER_HOST, keepalive_timeout=60)
+        middleware = rate_limit_middleware(shared_functions.rate_limit_scheduler)
+        _session = aiohttp.ClientSession(connector=connector, middlewares=(middleware,))
+    return _session
+
+# Function to get the long-lived async FaceClient for a key/endpoint, sending through the shared session
+def get_face_client(subscription_key, endpoint):
+    key = (subscription_key, endpoint)
+    face_client = _face_clients.get(key)
+    if face_client is None:
+        face_client = FaceClient(
+            endpoint,
+            AzureKeyCredential(subscription_key),
+            transport=AioHttpTransport(session=get_session(), session_owner=False),
+            retry_status=0
+        )
+        _face_clients[key] = face_client
+    return face_client
+
+# Function to close the shared clients and session, e.g. when the event loop shuts down
+async def close_client_contexts():
+    global _session
+    face_clients = list(_face_clients.values())
+    _face_clients.clear()
+    for face_client in face_clients:
+        await face_client.close()
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+# aiohttp rejects None header values, so optional headers are left out
+def _headers(subscription_key, injection_header=None, content_type=None):
+    headers = {'Ocp-Apim-Subscription-Key': subscription_key}
+    if content_type:
+        headers['Content-Type'] = content_type
+    if injection_header:
+        headers['X-MS-AZSDK-Telemetry'] = injection_header
+    return headers
+
+# Reading and downscaling the image is blocking work, so it runs on the default executor
+async def _preprocess_image(image_path):
+    return await asyncio.get_running_loop().run_in_executor(None, preprocess_image, image_path)
+
+async def detect_faces(subscription_key, endpoint, image_path, injection_header=None):
+    processed = await _preprocess_image(image_path)
+    image_content = processed.content
+    # Shares the detection cache of shared_functions
+    detection_cache = shared_functions.detection_cache
+    if detection_cache is not None:
+        key = detection_cache.make_key(
+            image_content,
+            endpoint=endpoint,
+            detection_model=FaceDetectionModel.DETECTION03,
+            recognition_model=FaceRecognitionModel.RECOGNITION04,
+            return_face_attributes=[FaceAttributeTypeRecognition04.QUALITY_FOR_RECOGNITION]
+        )
+        detected_faces = detection_cache.get(key)
+        if detected_faces is not None:
+            return processed.map_faces_to_original(detected_faces)
+    detected_faces = await get_face_client(subscription_key, endpoint).detect(
+            image_content=image_content,
+            detection_model=FaceDetectionModel.DETECTION03,
+            recognition_model=FaceRecognitionModel.RECOGNITION04,
+            return_face_id=True,
+            return_face_attributes=[FaceAttributeTypeRecognition04.QUALITY_FOR_RECOGNITION],
+            headers=_headers(subscription_key, injection_header)
+        )
+    if detection_cache is not None:
+        detection_cache.put(key, detected_faces)
+    return processed.map_faces_to_original(detected_faces)
+
+async def check_operation_status(subscription_key, operation_location, injection_header=None, timeout=POLL_TIMEOUT):
+    headers = _headers(subscription_key, injection_header)
+    deadline = time.monotonic() + timeout
+    interval = POLL_INITIAL_INTERVAL
+    while True:
+        async with get_session().get(operation_location, headers=headers) as response:
+            retry_after = response.headers.get('Retry-After')
+            if response.status != 429:
+                response.raise_for_status()
+                status = (await response.json(content_type=None)).get('status')
+                if status in ['succeeded', 'failed']:
+                    return status == 'succeeded'
+
+        delay = interval
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            print(f"Timed out waiting for operation: {operation_location}")
+            return False
+        await asyncio.sleep(min(delay, remaining))
+        interval = min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+
+# Function to POST/PUT/PATCH/DELETE a request that completes through an Operation-Location, returning the response body on success
+async def _run_operation(method, url, subscription_key, injection_header, action, headers, **kwargs):
+    try:
+        async with get_session().request(method, url, headers=headers, **kwargs) as response:
+            response.raise_for_status()
+            body = await response.json(content_type=None)
+            if response.status != 202:
+                print(f"Failed to {action}: {body}")
+                return None
+            operation_location = response.headers.get('Operation-Location')
+        if not operation_location:
+            print("No Operation-Location header found in the response.")
+            return None
+        if await check_operation_status(subscription_key, operation_location, injection_header):
+            return body if body is not None else {}
+        print(f"Failed to {action}.")
+        return None
+    except aiohttp.ClientError as e:
+        print(f"Request failed: {e}")
+        return None
+
+# Function to add face to a person
+async def add_person_face(subscription_key, endpoint, image_path, person_id, injection_header=None, quality_filter=False):
+    params = {
+        'detectionModel': 'detection_03'
+    }
+
+    gate_reason = None
+    if quality_filter and shared_functions.quality_gate is not None:
+        gate_reason = await asyncio.get_running_loop().run_in_executor(None, shared_functions.check_image_quality, image_path)
+        if gate_reason and shared_functions.quality_gate.enforce:
+            print(f"Image quality is too low ({gate_reason}). Please use a different image.")
+            return None
+
+    faces = await detect_faces(subscription_key, endpoint, image_path, injection_header)
+    if quality_filter:
+        shared_functions.record_quality_verdict(gate_reason, faces)
+    if len(faces) == 0:
+        print("No faces detected in the image.")
+        return None
+    if quality_filter and faces[0].face_attributes.quality_for_recognition == QualityForRecognition.LOW:
+        print("Face quality is too low. Please use a different image.")
+        return None
+
+    # Upload the same preprocessed image that was used for detection
+    processed = await _preprocess_image(image_path)
+    if len(faces) > 1:
+        image_width, image_height = processed.original_size
+        # If multiple faces are detected, use the first face (largest face) for adding to the target
+        print(f"Multiple faces detected. Using the first face (largest face) for adding to the target.")
+        face_rectangle = enlarge_bounding_box(faces[0].face_rectangle, image_width, image_height)
+        face_rectangle = processed.to_processed_rectangle(face_rectangle)
+        params['targetFace'] = f"{face_rectangle['left']},{face_rectangle['top']},{face_rectangle['width']},{face_rectangle['height']}"
+    else:
+        print(f"One face detected. Adding to the target.")
+
+    add_face_url = endpoint + f"/face/{api_version}/persons/{person_id}/recognitionModels/recognition_04/persistedFaces"
+    body = await _run_operation('POST', add_face_url, subscription_key, injection_header, 'add face',
+                                _headers(subscription_key, injection_header, 'application/octet-stream'),
+                                params=params, data=processed.content)
+    return body['persistedFaceId'] if body else None
+
+# Function to create a new person
+async def create_person(subscription_key, endpoint, person_name = None, injection_header=None):
+    create_person_url = f"{endpoint}/face/{api_version}/persons"
+    body = await _run_operation('POST', create_person_url, subscription_key, injection_header, 'create person',
+                                _headers(subscription_key, injection_header, 'application/json'), json={"name": person_name})
+    return body['personId'] if body else None
+
+# Function to delete a person
+async def delete_person(subscription_key, endpoint, person_id, injection_header=None):
+    delete_person_url = f"{endpoint}/face/{api_version}/persons/{person_id}"
+    body = await _run_operation('DELETE', delete_person_url, subscription_key, injection_header, 'delete person', _headers(subscription_key, injection_header))
+    return body is not None
+
+# Collects the faceIds of identify calls made by concurrent tasks with the same key, endpoint and scope and sends them
+# as one identify request: as soon as IDENTIFY_MAX_FACE_IDS are queued, or once the first one has waited for window seconds.
+# When nothing else is queued or in flight, the window is skipped.
+class AsyncIdentifyBatcher:
+    def __init__(self, window=IDENTIFY_BATCH_WINDOW, max_batch_size=IDENTIFY_MAX_FACE_IDS):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.requests = 0
+        self.face_ids = 0
+        self._batches = {}
+        self._in_flight = 0
+
+    # Function to identify one faceId together with the other queued ones; returns its list of candidates
+    async def identify(self, subscription_key, endpoint, face_id, dynamic_person_group_id=None, injection_header=None):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (subscription_key, endpoint, dynamic_person_group_id, injection_header)
+        batch = self._batches.get(key)
+        if batch is None:
+            # With no other identify queued or in flight, only calls made in this same loop iteration (e.g. by one
+            # gather) can join, so the batch is sent on the next iteration rather than after the window
+            delay = 0 if not self._batches and not self._in_flight else self.window
+            batch = self._batches[key] = {'faces': {}, 'timer': loop.call_later(delay, self._flush, key)}
+        batch['faces'].setdefault(face_id, []).append(future)
+        if len(batch['faces']) >= self.max_batch_size:
+            self._flush(key)
+        return await future
+
+    def _flush(self, key):
+        batch = self._batches.pop(key, None)
+        if batch is not None:
+            batch['timer'].cancel()
+            self._in_flight += 1
+            asyncio.ensure_future(self._send(key, batch['faces']))
+
+    async def _send(self, key, faces):
+        subscription_key, endpoint, dynamic_person_group_id, injection_header = key
+        headers = _headers(subscription_key, injection_header, 'application/json')
+        identify_url = endpoint + f"/face/{api_version}/identify"
+        try:
+            # Check-ins are interactive, so identify goes ahead of queued background work such as enrollment
+            with request_priority(PRIORITY_INTERACTIVE):
+                async with get_session().post(identify_url, headers=headers, json=_identify_body(list(faces), dynamic_person_group_id)) as response:
+                    response.raise_for_status()
+                    results = await response.json(content_type=None)
+            candidates = {result['faceId']: result['candidates'] for result in results}
+            self.requests += 1
+            self.face_ids += len(faces)
+            for face_id, futures in faces.items():
+                for future in futures:
+                    if not future.done():
+                        future.set_result(candidates.get(face_id, []))
+        except Exception as e:
+            for futures in faces.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+        finally:
+            self._in_flight -= 1
+
+# Function to get the identify batcher shared by the async helpers
+def get_identify_batcher():
+    global _identify_batcher
+    if _identify_batcher is None:
+        _identify_batcher = AsyncIdentifyBatcher()
+    return _identify_batcher
+
+# Function to identify faces in an image
+async def identify_faces(subscription_key, endpoint, face_id, dynamic_person_group_id=None, injection_header=None):
+    # Concurrent check-ins share identify requests of up to IDENTIFY_MAX_FACE_IDS faceIds
+    candidates = await get_identify_batcher().identify(subscription_key, endpoint, face_id, dynamic_person_group_id, injection_header)
+
+    if len(candidates) > 0:
+        return candidates[0]['personId']
+    else:
+        return None
+
+# Function to identify tracked faces (see shared_functions.track_faces); returns the personId (or None) of each track.
+# Only new tracks and tracks with a low confidence or unknown result are sent to identify.
+async def identify_tracked_faces(subscription_key, endpoint, tracks, dynamic_person_group_id=None, injection_header=None, source=None):
+    tracker = shared_functions.get_face_tracker(source)
+    pending = [track for track in tracks if tracker.needs_identify(track, dynamic_person_group_id)]
+    results = await asyncio.gather(*(get_identify_batcher().identify(subscription_key, endpoint, track.face_id, dynamic_person_group_id, injection_header)
+                                     for track in pending))
+    for track, candidates in zip(pending, results):
+        tracker.record(track, candidates, dynamic_person_group_id)
+    return [track.person_id(dynamic_person_group_id) for track in tracks]
+
+# Function to create a dynamic person group
+async def create_dynamic_person_group(subscription_key, endpoint, dynamic_person_group_id, injection_header=None):
+    create_DPG_url = f"{endpoint}/face/{api_version}/dynamicpersongroups/{dynamic_person_group_id}"
+    headers = _headers(subscription_key, injection_header, 'application/json')
+    body = {
+        "name": "Example DynamicPersonGroup",
+        "userData": "User defined data",
+    }
+    try:
+        async with get_session().put(create_DPG_url, headers=headers, json=body) as response:
+            response.raise_for_status()
+            if response.status == 200:
+                return True
+            print(f"Failed to create dynamic person group: {await response.text()}")
+            return False
+    except aiohttp.ClientError as e:
+        print(f"Request failed: {e}")
+        return False
+
+# Function to delete a dynamic person group
+async def delete_dynamic_person_group(subscription_key, endpoint, dynamic_person_group_id, injection_header=None):
+    delete_DPG_url = f"{endpoint}/face/{api_version}/dynamicpersongroups/{dynamic_person_group_id}"
+    result = await _run_operation('DELETE', delete_DPG_url, subscription_key, injection_header, 'delete dynamic person group', _headers(subscription_key, injection_header))
+    return result is not None
+
+# Function to check if a dynamic person group exists
+async def check_dynamic_person_group_exists(subscription_key, endpoint, dynamic_person_group_id, injection_header=None):
+    check_DPG_url = f"{endpoint}/face/{api_version}/dynamicpersongroups/{dynamic_person_group_id}"
+    try:
+        async with get_session().get(check_DPG_url, headers=_headers(subscription_key, injection_header)) as response:
+            response.raise_for_status()
+            if response.status == 200:
+                return True
+            print("Dynamic person group does not exist.")
+            return False
+    except aiohttp.ClientError as e:
+        print(f"Request failed: {e}")
+        return False
+
+# Function to link a person to a dynamic person group
+async def link_person_to_dynamic_person_group(subscription_key, endpoint, dynamic_person_group_id, person_id, injection_header=None):
+    link_DPG_url = f"{endpoint}/face/{api_version}/dynamicpersongroups/{dynamic_person_group_id}"
+    body = {
+        "name": "Example DynamicPersonGroup",
+        "userData": "User defined data",
+        "addPersonIds": [person_id]
+    }
+    result = await _run_operation('PATCH', link_DPG_url, subscription_key, injection_header, 'link person to dynamic person group',
+                                  _headers(subscription_key, injection_header, 'application/json'), json=body)
+    return result is not None
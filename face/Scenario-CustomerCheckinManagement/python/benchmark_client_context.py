@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+# Benchmark of per-call latency with a fresh connection per request versus the shared pooled session
+# in shared_functions.py. A local stub server stands in for the Face endpoint; it sleeps on every new
+# connection to emulate the TCP+TLS handshake cost of a remote endpoint.
+#
+#   python3 benchmark_client_context.py --calls 200 --handshake-ms 30
+
+import argparse
+import json
+import statistics
+import threading
+import time
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import shared_functions
+
+class StubFaceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    handshake_delay = 0.0
+
+    def setup(self):
+        # Called once per TCP connection, so the delay is only paid when a connection is not reused
+        time.sleep(self.handshake_delay)
+        super().setup()
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._send_json(200, {'status': 'succeeded'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        operation_location = f"http://{self.headers['Host']}/face/{shared_functions.api_version}/operations/stub"
+        self._send_json(202, {'personId': '00000000-0000-0000-0000-000000000000'}, {'Operation-Location': operation_location})
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(handshake_delay):
+    StubFaceHandler.handshake_delay = handshake_delay
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubFaceHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def measure(name, calls, func):
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<46} mean={statistics.mean(latencies):7.2f} ms  p50={statistics.median(latencies):7.2f} ms  p95={p95:7.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-call latency with and without the shared client context.')
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--handshake-ms', type=float, default=30.0)
+    args = parser.parse_args()
+
+    server = start_stub_server(args.handshake_ms / 1000)
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+    operation_location = f"{endpoint}/face/{shared_functions.api_version}/operations/stub"
+    print(f"Stub Face endpoint: {endpoint} (handshake delay {args.handshake_ms} ms, {args.calls} calls)")
+
+    try:
+        # Previous behavior: module-level requests calls open a new connection per request
+        measure('GET operation, new connection per call', args.calls,
+                lambda: requests.get(operation_location, headers={'Ocp-Apim-Subscription-Key': 'key'}).raise_for_status())
+        measure('GET operation, shared session', args.calls,
+                lambda: shared_functions.check_operation_status('key', operation_location))
+        measure('create_person (POST + poll), shared session', args.calls,
+                lambda: shared_functions.create_person('key', endpoint, 'benchmark'))
+    finally:
+        shared_functions.close_client_contexts()
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
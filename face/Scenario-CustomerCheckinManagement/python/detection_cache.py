@@ -0,0 +1,128 @@
+# Each Python sample is self-contained, so this module is copied in Scenario-CustomerCheckinManagement, Scenario-FacePhotoTagging and UnifiedFaceCollection; keep the copies identical
+import hashlib, json, os, tempfile, threading, time
+from collections import OrderedDict
+from concurrent.futures import Future
+from azure.ai.vision.face.models import FaceDetectionResult
+
+# faceIds returned by detect expire after 24 hours; cached results are dropped a little before that
+FACE_ID_TIME_TO_LIVE = 24 * 60 * 60
+EXPIRY_MARGIN = 10 * 60
+
+# Content-addressed cache of detect results, keyed by a hash of the image bytes plus the detection parameters.
+# Results live in an in-memory LRU tier and, if cache_dir is set, in an on-disk tier that survives restarts.
+class DetectionCache:
+    def __init__(self, max_entries=1024, ttl=FACE_ID_TIME_TO_LIVE - EXPIRY_MARGIN, cache_dir=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    # Function to build the cache key of an image and its detection parameters
+    def make_key(self, image_content, **params):
+        digest = hashlib.sha256(image_content)
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, faces = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    return faces
+                del self._entries[key]
+        entry = self._load(key, now)
+        if entry is None:
+            return None
+        with self._lock:
+            self._remember(key, entry)
+        return entry[1]
+
+    def put(self, key, faces):
+        entry = (time.time() + self.ttl, faces)
+        with self._lock:
+            self._remember(key, entry)
+        self._store(key, entry)
+
+    # Function to return the cached faces for the image, calling detect_function only on a miss.
+    # Concurrent calls for the same image wait for one upload instead of each sending their own.
+    def detect(self, image_content, detect_function, **params):
+        key = self.make_key(image_content, **params)
+        faces = self.get(key)
+        if faces is not None:
+            with self._lock:
+                self.hits += 1
+            return faces
+        with self._lock:
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._pending[key] = Future()
+                self.misses += 1
+            else:
+                self.hits += 1
+        if not owner:
+            return pending.result()
+        try:
+            faces = detect_function(image_content)
+            self.put(key, faces)
+            pending.set_result(faces)
+            return faces
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.cache_dir:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def _load(self, key, now):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key), 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data['expires'] <= now:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            return None
+        return data['expires'], [FaceDetectionResult(face) for face in data['faces']]
+
+    def _store(self, key, entry):
+        if not self.cache_dir:
+            return
+        expires, faces = entry
+        data = {'expires': expires, 'faces': [face.as_dict() for face in faces]}
+        # Write to a temporary file first so readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, self._path(key))
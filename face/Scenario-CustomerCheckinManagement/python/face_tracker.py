@@ -0,0 +1,142 @@
+import itertools, threading, time
+
+# A track that was not seen in any frame for this many seconds is dropped; its face is treated as new when it returns.
+# Keep it short: another customer stepping into the same spot within this time would inherit the identity.
+TRACK_TIME_TO_LIVE = 1.0
+# A face continues a track when their rectangles overlap by at least this intersection over union...
+IOU_THRESHOLD = 0.3
+# ...or when their centers are at most this many face widths apart, for fast movement between sparse frames
+MAX_CENTROID_DISTANCE = 0.5
+# Identities below this confidence, and faces that matched nobody, are identified again after RETRY_INTERVAL seconds
+MIN_CONFIDENCE = 0.7
+RETRY_INTERVAL = 1.0
+
+# The faces of one person across consecutive frames of a camera
+class Track:
+    def __init__(self, track_id, face, now):
+        self.track_id = track_id
+        self.face = face
+        self.first_seen = now
+        self.last_seen = now
+        self.frames = 1
+        # Identify results per dynamic person group (None for all persons): (personId or None, confidence, time)
+        self.identities = {}
+
+    @property
+    def face_id(self):
+        return self.face.face_id
+
+    @property
+    def face_rectangle(self):
+        return self.face.face_rectangle
+
+    # Function to return the personId this track was identified as in the scope, or None
+    def person_id(self, dynamic_person_group_id=None):
+        identity = self.identities.get(dynamic_person_group_id)
+        return identity[0] if identity else None
+
+# Associates the detected faces of consecutive frames from one camera, so a customer standing in front of a kiosk is
+# identified once rather than on every frame. update() matches the faces of a frame to the live tracks by rectangle
+# overlap, falling back to center distance, and starts a track for every face left over. needs_identify() tells
+# whether a track still has to be identified in a scope: new tracks do, and so do low confidence or unknown results
+# once RETRY_INTERVAL has passed. Everything else reuses the personId recorded on the track.
+class FaceTracker:
+    def __init__(self, ttl=TRACK_TIME_TO_LIVE, iou_threshold=IOU_THRESHOLD, max_centroid_distance=MAX_CENTROID_DISTANCE,
+                 min_confidence=MIN_CONFIDENCE, retry_interval=RETRY_INTERVAL):
+        self.ttl = ttl
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.min_confidence = min_confidence
+        self.retry_interval = retry_interval
+        self.identified = 0
+        self.reused = 0
+        self._tracks = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    # Function to add the faces of a frame; returns the track of each face, in the order of faces
+    def update(self, faces, timestamp=None):
+        now = time.monotonic() if timestamp is None else timestamp
+        with self._lock:
+            self._tracks = [track for track in self._tracks if now - track.last_seen <= self.ttl]
+            pairs = []
+            for track in self._tracks:
+                for index, face in enumerate(faces):
+                    score = self._score(track.face_rectangle, face.face_rectangle)
+                    if score is not None:
+                        pairs.append((score, track.track_id, index, track))
+            # Greedy assignment, best match first; each track and each face is used once
+            matched = {}
+            used = set()
+            for score, _, index, track in sorted(pairs, key=lambda pair: (-pair[0], pair[1], pair[2])):
+                if index in matched or track.track_id in used:
+                    continue
+                matched[index] = track
+                used.add(track.track_id)
+            tracks = []
+            for index, face in enumerate(faces):
+                track = matched.get(index)
+                if track is None:
+                    track = Track(next(self._ids), face, now)
+                    self._tracks.append(track)
+                else:
+                    track.face = face
+                    track.last_seen = now
+                    track.frames += 1
+                tracks.append(track)
+            return tracks
+
+    # Function to tell whether the track has to be identified in the scope; otherwise its recorded personId is reused
+    def needs_identify(self, track, dynamic_person_group_id=None, timestamp=None):
+        now = time.monotonic() if timestamp is None else timestamp
+        with self._lock:
+            identity = track.identities.get(dynamic_person_group_id)
+            if identity is not None:
+                person_id, confidence, identified_at = identity
+                if (person_id is not None and confidence >= self.min_confidence) or now - identified_at < self.retry_interval:
+                    self.reused += 1
+                    return False
+            return True
+
+    # Function to record the identify candidates of the track's current face in the scope
+    def record(self, track, candidates, dynamic_person_group_id=None, timestamp=None):
+        now = time.monotonic() if timestamp is None else timestamp
+        with self._lock:
+            self.identified += 1
+            if candidates:
+                track.identities[dynamic_person_group_id] = (candidates[0]['personId'], candidates[0].get('confidence', 1.0), now)
+            else:
+                track.identities[dynamic_person_group_id] = (None, 0.0, now)
+
+    # Function to set the personId of a track without identify, e.g. after the person was created or linked to a group
+    def assign(self, track, person_id, dynamic_person_group_id=None, timestamp=None):
+        now = time.monotonic() if timestamp is None else timestamp
+        with self._lock:
+            track.identities[dynamic_person_group_id] = (person_id, 1.0, now)
+
+    def clear(self):
+        with self._lock:
+            self._tracks = []
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tracks)
+
+    # Function to score how well a face continues a track: the overlap if it is large enough, otherwise a negative
+    # center distance if that is small enough, otherwise None
+    def _score(self, previous, current):
+        left = max(previous.left, current.left)
+        top = max(previous.top, current.top)
+        right = min(previous.left + previous.width, current.left + current.width)
+        bottom = min(previous.top + previous.height, current.top + current.height)
+        intersection = max(0, right - left) * max(0, bottom - top)
+        union = previous.width * previous.height + current.width * current.height - intersection
+        iou = intersection / union if union > 0 else 0.0
+        if iou >= self.iou_threshold:
+            return iou
+        dx = (previous.left + previous.width / 2) - (current.left + current.width / 2)
+        dy = (previous.top + previous.height / 2) - (current.top + current.height / 2)
+        distance = (dx * dx + dy * dy) ** 0.5 / max(previous.width, current.width, 1)
+        if distance <= self.max_centroid_distance:
+            return -distance
+        return None
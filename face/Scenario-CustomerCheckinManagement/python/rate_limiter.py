@@ -0,0 +1,234 @@
+# Each Python sample is self-contained, so this module is copied in Scenario-CustomerCheckinManagement, Scenario-FacePhotoTagging and UnifiedFaceCollection; keep the copies identical
+import asyncio, contextvars, email.utils, heapq, itertools, random, threading, time
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+
+# Request priorities; lower values get tokens first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+# Responses that mean the resource is throttled; they pause the whole bucket, not just the request that got them.
+# The request was not processed, so they are retried whatever the method.
+THROTTLE_STATUS_CODES = (429, 503)
+# Server errors that are retried with jittered exponential backoff, but only for methods in RETRY_METHODS: the
+# request may have been processed, and sending a POST or PATCH again could e.g. create a second person
+RETRY_STATUS_CODES = (500, 502, 504)
+RETRY_METHODS = ('GET', 'PUT', 'DELETE')
+# How often async waiters that are not first in line check the queue again
+ASYNC_POLL_INTERVAL = 0.01
+
+_priority = contextvars.ContextVar('face_request_priority', default=PRIORITY_NORMAL)
+
+# Function to run the requests sent inside the block with the given priority, in this thread or task
+@contextmanager
+def request_priority(priority):
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority():
+    return _priority.get()
+
+# Function to parse a Retry-After header, given in seconds or as an HTTP date, into seconds
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# Client-side token bucket shared by every Face call of the process. Callers wait in priority order for a token,
+# 429/503 responses pause the bucket for everyone until Retry-After (or a backoff) has passed, and failed requests
+# are retried with jittered exponential backoff. requests_per_second=None sends without a client-side limit.
+class RateLimitScheduler:
+    def __init__(self, requests_per_second=None, burst=None, max_retries=5, base_delay=0.5, max_delay=30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._condition = threading.Condition()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._updated = time.monotonic()
+        self.configure(requests_per_second, burst)
+        self.reset_metrics()
+
+    # Function to change the rate, e.g. to match the transactions-per-second limit of the pricing tier
+    def configure(self, requests_per_second=None, burst=None):
+        with self._condition:
+            self.requests_per_second = requests_per_second
+            self.burst = burst or max(1.0, requests_per_second or 1.0)
+            self._tokens = self.burst
+            self._condition.notify_all()
+
+    def reset_metrics(self):
+        with self._condition:
+            self.requests = 0
+            self.retries = 0
+            self.throttled = 0
+            self.max_queue_depth = len(self._waiters)
+            self.wait_seconds = {}
+            self.throttle_seconds = 0.0
+            self.retry_seconds = 0.0
+
+    def metrics(self):
+        with self._condition:
+            return {
+                'queueDepth': len(self._waiters),
+                'maxQueueDepth': self.max_queue_depth,
+                'requests': self.requests,
+                'retries': self.retries,
+                'throttled': self.throttled,
+                'throttleSeconds': self.throttle_seconds,
+                'retrySeconds': self.retry_seconds,
+                'waitSecondsByPriority': dict(self.wait_seconds)
+            }
+
+    # Function to block until the caller may send one request
+    def acquire(self, priority=None):
+        priority = current_priority() if priority is None else priority
+        start = time.monotonic()
+        with self._condition:
+            entry = self._enqueue(priority)
+            try:
+                while True:
+                    wait = self._take(entry, time.monotonic())
+                    if wait == 0:
+                        break
+                    self._condition.wait(wait)
+            except BaseException:
+                self._remove(entry)
+                raise
+            self._condition.notify_all()
+            self._record_wait(priority, time.monotonic() - start)
+
+    async def acquire_async(self, priority=None):
+        priority = current_priority() if priority is None else priority
+        start = time.monotonic()
+        with self._condition:
+            entry = self._enqueue(priority)
+        try:
+            while True:
+                with self._condition:
+                    wait = self._take(entry, time.monotonic())
+                    if wait == 0:
+                        self._condition.notify_all()
+                        self._record_wait(priority, time.monotonic() - start)
+                        return
+                await asyncio.sleep(ASYNC_POLL_INTERVAL if wait is None else wait)
+        except BaseException:
+            with self._condition:
+                self._remove(entry)
+            raise
+
+    # Function to decide how a response to a request with the given method is handled: returns None to accept it,
+    # or the seconds to wait before retrying it. Throttled responses pause the bucket, so the retry simply waits for
+    # its next token.
+    def on_response(self, status, retry_after, attempt, method=None):
+        if attempt >= self.max_retries:
+            return None
+        if status not in THROTTLE_STATUS_CODES and (status not in RETRY_STATUS_CODES or (method or '').upper() not in RETRY_METHODS):
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = parse_retry_after(retry_after)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        with self._condition:
+            self.retries += 1
+            self.retry_seconds += delay
+            if status in THROTTLE_STATUS_CODES:
+                self.throttled += 1
+                paused_until = time.monotonic() + delay
+                if paused_until > self._paused_until:
+                    self.throttle_seconds += paused_until - max(self._paused_until, time.monotonic())
+                    self._paused_until = paused_until
+                # Tokens saved up before or during the pause would only trigger another burst of 429s
+                self._tokens = min(self._tokens, 1.0)
+                self._updated = max(self._updated, self._paused_until)
+                self._condition.notify_all()
+        return delay
+
+    def _enqueue(self, priority):
+        entry = (priority, next(self._sequence))
+        heapq.heappush(self._waiters, entry)
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        return entry
+
+    def _remove(self, entry):
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+        self._condition.notify_all()
+
+    # Function to give the entry a token if it is first in line and one is available. Returns 0 when it got one,
+    # the seconds until the next token, or None when other requests are ahead of it.
+    def _take(self, entry, now):
+        if self._waiters[0] != entry:
+            return None
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.requests_per_second:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.requests_per_second)
+            self._updated = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.requests_per_second
+            self._tokens -= 1
+        heapq.heappop(self._waiters)
+        self.requests += 1
+        return 0
+
+    def _record_wait(self, priority, seconds):
+        self.wait_seconds[priority] = self.wait_seconds.get(priority, 0.0) + seconds
+
+# Function to tell whether a request body can be sent again, rewinding it if it is a seekable stream
+def _rewind_body(body, position):
+    if body is None or isinstance(body, (bytes, str)):
+        return True
+    if position is not None and hasattr(body, 'seek'):
+        body.seek(position)
+        return True
+    return False
+
+# Transport adapter for requests sessions: every request, including retries, takes a token from the scheduler.
+# Mounting it on a session covers the REST helpers and the SDK clients that send through that session.
+class RateLimitedAdapter(HTTPAdapter):
+    def __init__(self, scheduler, **kwargs):
+        self.scheduler = scheduler
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        position = request.body.tell() if hasattr(request.body, 'tell') else None
+        attempt = 0
+        while True:
+            self.scheduler.acquire()
+            response = super().send(request, **kwargs)
+            delay = self.scheduler.on_response(response.status_code, response.headers.get('Retry-After'), attempt, request.method)
+            if delay is None or not _rewind_body(request.body, position):
+                return response
+            response.close()
+            if response.status_code not in THROTTLE_STATUS_CODES:
+                time.sleep(delay)
+            attempt += 1
+
+# Function to build an aiohttp client middleware (aiohttp 3.12+) that sends every request through the scheduler
+def rate_limit_middleware(scheduler):
+    async def middleware(request, handler):
+        attempt = 0
+        while True:
+            await scheduler.acquire_async()
+            response = await handler(request)
+            delay = scheduler.on_response(response.status, response.headers.get('Retry-After'), attempt, request.method)
+            if delay is None:
+                return response
+            response.release()
+            if response.status not in THROTTLE_STATUS_CODES:
+                await asyncio.sleep(delay)
+            attempt += 1
+    return middleware
@@ -1,24 +1,178 @@
-import requests, time
+import requests, os, time, threading, heapq, itertools, asyncio
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from PIL import Image
 from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import RequestsTransport
 from azure.ai.vision.face import FaceClient
 from azure.ai.vision.face.models import FaceDetectionModel, FaceRecognitionModel, FaceAttributeTypeRecognition04, QualityForRecognition
 
+from detection_cache import DetectionCache
+from face_tracker import FaceTracker
+from image_preprocessing import ImagePreprocessor, passthrough_image
+from rate_limiter import PRIORITY_INTERACTIVE, RateLimitedAdapter, RateLimitScheduler, current_priority, request_priority
+
 # Updated API version
 api_version = 'v1.2-preview.1'
 
+# Keep-alive connection pool size of the shared session (number of hosts, connections per host)
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 32
+
+# Every request of the shared session, REST helpers and SDK clients alike, takes a token from this scheduler and is
+# retried on 429/5xx. Set the rate of your pricing tier with rate_limit_scheduler.configure(requests_per_second=...)
+rate_limit_scheduler = RateLimitScheduler()
+
+_session = None
+_client_contexts = {}
+_client_lock = threading.Lock()
+
+# Function to get the process-wide requests.Session shared by all helpers, so connections are reused
+def get_session():
+    global _session
+    with _client_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = RateLimitedAdapter(rate_limit_scheduler, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+        return _session
+
+# Long-lived FaceClient plus the shared pooled session for one key/endpoint pair
+class FaceClientContext:
+    def __init__(self, subscription_key, endpoint, session=None):
+        self.subscription_key = subscription_key
+        self.endpoint = endpoint
+        self.session = session or get_session()
+        # The SDK client sends through the same session, so SDK and REST calls share one connection pool and rate limit.
+        # Status codes are retried by the session, so the SDK retry policy only handles connection errors.
+        self.face_client = FaceClient(
+            endpoint,
+            AzureKeyCredential(subscription_key),
+            transport=RequestsTransport(session=self.session, session_owner=False),
+            retry_status=0
+        )
+
+    def close(self):
+        self.face_client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# Function to get the shared client context for a key/endpoint, created on first use
+def get_client_context(subscription_key, endpoint):
+    key = (subscription_key, endpoint)
+    context = _client_contexts.get(key)
+    if context is None:
+        session = get_session()
+        with _client_lock:
+            context = _client_contexts.get(key)
+            if context is None:
+                context = FaceClientContext(subscription_key, endpoint, session)
+                _client_contexts[key] = context
+    return context
+
+# Function to close the shared clients and session, e.g. when the application shuts down
+def close_client_contexts():
+    global _session, _operation_tracker, _identify_batcher, _dynamic_person_group_manager
+    with _client_lock:
+        contexts = list(_client_contexts.values())
+        _client_contexts.clear()
+        session, _session = _session, None
+        tracker, _operation_tracker = _operation_tracker, None
+        batcher, _identify_batcher = _identify_batcher, None
+        manager, _dynamic_person_group_manager = _dynamic_person_group_manager, None
+    if batcher is not None:
+        batcher.close()
+    # Queued membership changes are sent, and their operations awaited, before the operation tracker stops
+    if manager is not None:
+        manager.close()
+    if tracker is not None:
+        tracker.close()
+    for context in contexts:
+        context.close()
+    if session is not None:
+        session.close()
+
+# Detect results are reused for identical image bytes until the faceIds expire; set to None to always call the service
+detection_cache = DetectionCache()
+
+# Images are downscaled and re-encoded before every upload; set to None to upload the original files
+image_preprocessor = ImagePreprocessor()
+# Number of recently preprocessed images kept, so that detect and add of the same file only preprocess once
+PREPROCESSED_CACHE_SIZE = 16
+_preprocessed_images = OrderedDict()
+
+# Function to read and preprocess an image file; returns a PreprocessedImage with the bytes to upload
+def preprocess_image(image_path):
+    stat = os.stat(image_path)
+    key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size, image_preprocessor)
+    with _client_lock:
+        processed = _preprocessed_images.get(key)
+        if processed is not None:
+            _preprocessed_images.move_to_end(key)
+            return processed
+    with open(image_path, 'rb') as image_data:
+        image_content = image_data.read()
+    processed = image_preprocessor.process(image_content) if image_preprocessor else passthrough_image(image_content)
+    with _client_lock:
+        _preprocessed_images[key] = processed
+        while len(_preprocessed_images) > PREPROCESSED_CACHE_SIZE:
+            _preprocessed_images.popitem(last=False)
+    return processed
+
+# Optional local pre-gate for add_person_face(..., quality_filter=True), e.g. QualityGate(). Images it is certain
+# will fail the service's quality check are rejected before any upload; None sends every image to detect.
+quality_gate = None
+
+# Function to run the quality pre-gate on an image file; returns why it will fail the quality check, or None
+def check_image_quality(image_path):
+    if quality_gate is None:
+        return None
+    processed = preprocess_image(image_path)
+    return quality_gate.reject_reason(processed.content, processed.original_size)
+
+# Function to compare the pre-gate verdict on an image with the quality the service detected
+def record_quality_verdict(gate_reason, faces):
+    if quality_gate is not None:
+        service_rejected = len(faces) == 0 or faces[0].face_attributes.quality_for_recognition == QualityForRecognition.LOW
+        quality_gate.record_service_verdict(gate_reason is not None, service_rejected)
+
+# Function to detect faces in image bytes, going through the detection cache
+def detect_faces_in_content(subscription_key, endpoint, image_content, injection_header=None):
+    face_client = get_client_context(subscription_key, endpoint).face_client
+
+    def detect(image_content):
+        return face_client.detect(
+                image_content=image_content,
+                detection_model=FaceDetectionModel.DETECTION03,
+                recognition_model=FaceRecognitionModel.RECOGNITION04,
+                return_face_id=True,
+                return_face_attributes=[FaceAttributeTypeRecognition04.QUALITY_FOR_RECOGNITION],
+                headers={"X-MS-AZSDK-Telemetry": injection_header}
+            )
+
+    if detection_cache is None:
+        return detect(image_content)
+    # faceIds only work on the resource that created them, so the endpoint is part of the key
+    return detection_cache.detect(
+            image_content,
+            detect,
+            endpoint=endpoint,
+            detection_model=FaceDetectionModel.DETECTION03,
+            recognition_model=FaceRecognitionModel.RECOGNITION04,
+            return_face_attributes=[FaceAttributeTypeRecognition04.QUALITY_FOR_RECOGNITION]
+        )
+
+# Function to detect faces in an image file; face rectangles are in the coordinates of the original image
 def detect_faces(subscription_key, endpoint, image_path, injection_header=None):
-    with FaceClient(endpoint, AzureKeyCredential(subscription_key), headers = {"X-MS-AZSDK-Telemetry": injection_header}) as face_client:
-        with open(image_path, 'rb') as image_data:
-            detected_faces = face_client.detect(
-                    image_content=image_data.read(),
-                    detection_model=FaceDetectionModel.DETECTION03,
-                    recognition_model=FaceRecognitionModel.RECOGNITION04,
-                    return_face_id=True,
-                    return_face_attributes=[FaceAttributeTypeRecognition04.QUALITY_FOR_RECOGNITION]
-                )
-        return detected_faces
-    
+    processed = preprocess_image(image_path)
+    faces = detect_faces_in_content(subscription_key, endpoint, processed.content, injection_header)
+    return processed.map_faces_to_original(faces)
+
 def enlarge_bounding_box(face_rectangle, image_width, image_height, enlargement_factor=1.2):
     left = max(0, face_rectangle.left - (face_rectangle.width * (enlargement_factor - 1) / 2))
     top = max(0, face_rectangle.top - (face_rectangle.height * (enlargement_factor - 1) / 2))
@@ -30,24 +184,130 @@ def get_image_dimensions(image_path):
     with Image.open(image_path) as img:
         return img.width, img.height
     
-def check_operation_status(subscription_key, operation_location, injection_header=None):
-    headers = {
-        'Ocp-Apim-Subscription-Key': subscription_key,
-        'X-MS-AZSDK-Telemetry': injection_header,
-    }
-    
-    while True:
-        response = requests.get(operation_location, headers=headers)
-        response.raise_for_status()
-        
-        status = response.json()
-        if status.get('status') in ['succeeded', 'failed']:
-            if status.get('status') == 'succeeded':
-                return True
-            else:
-                return False
-        
-        time.sleep(5) 
+# Tracks many long-running operations together on one background thread.
+# Each Operation-Location is polled with adaptive backoff (sub-second at first), Retry-After is honored
+# and a deadline is enforced. track() returns a Future resolving to True (succeeded) or False (failed).
+class OperationTracker:
+    def __init__(self, initial_interval=0.25, max_interval=5.0, backoff=1.5, timeout=300, max_workers=16):
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='operation-poll')
+        self._schedule = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='operation-tracker', daemon=True)
+        self._thread.start()
+
+    # Function to start tracking an operation; returns a concurrent.futures.Future
+    def track(self, subscription_key, operation_location, injection_header=None, timeout=None):
+        future = Future()
+        headers = {
+            'Ocp-Apim-Subscription-Key': subscription_key,
+            'X-MS-AZSDK-Telemetry': injection_header
+        }
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        # Polls run on the tracker threads with the priority of the caller that started the operation
+        entry = [operation_location, headers, deadline, self.initial_interval, future, current_priority()]
+        # Short operations are often done by the first look, so poll right away before backing off
+        self._schedule_poll(entry, 0)
+        return future
+
+    # Function to track an operation from asyncio code; returns an awaitable
+    def track_async(self, subscription_key, operation_location, injection_header=None, timeout=None):
+        return asyncio.wrap_future(self.track(subscription_key, operation_location, injection_header, timeout))
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def _schedule_poll(self, entry, delay):
+        with self._condition:
+            if self._closed:
+                entry[4].set_exception(RuntimeError("Operation tracker is closed."))
+                return
+            heapq.heappush(self._schedule, (time.monotonic() + delay, next(self._counter), entry))
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and (not self._schedule or self._schedule[0][0] > time.monotonic()):
+                    self._condition.wait(self._schedule[0][0] - time.monotonic() if self._schedule else None)
+                if self._closed:
+                    pending = [entry for _, _, entry in self._schedule]
+                    self._schedule.clear()
+                    break
+                _, _, entry = heapq.heappop(self._schedule)
+            self._executor.submit(self._poll, entry)
+        for entry in pending:
+            entry[4].set_exception(RuntimeError("Operation tracker is closed."))
+
+    def _poll(self, entry):
+        operation_location, headers, deadline, interval, future, priority = entry
+        try:
+            with request_priority(priority):
+                response = get_session().get(operation_location, headers=headers)
+            if response.status_code != 429:
+                response.raise_for_status()
+                status = response.json().get('status')
+                if status in ['succeeded', 'failed']:
+                    future.set_result(status == 'succeeded')
+                    return
+        except Exception as e:
+            future.set_exception(e)
+            return
+
+        delay = interval
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            future.set_exception(TimeoutError(f"Operation did not complete before the deadline: {operation_location}"))
+            return
+        # Always take one last look at the deadline rather than giving up early
+        delay = min(delay, remaining)
+        entry[3] = min(interval * self.backoff, self.max_interval)
+        self._schedule_poll(entry, delay)
+
+_operation_tracker = None
+
+# Function to get the process-wide operation tracker used by all helpers
+def get_operation_tracker():
+    global _operation_tracker
+    with _client_lock:
+        if _operation_tracker is None:
+            _operation_tracker = OperationTracker()
+        return _operation_tracker
+
+# Function to turn a tracked operation into a Future of value (or None if the operation failed)
+def _operation_result(tracked, value):
+    result = Future()
+    def on_done(future):
+        if future.exception() is not None:
+            result.set_exception(future.exception())
+        else:
+            result.set_result(value if future.result() else None)
+    tracked.add_done_callback(on_done)
+    return result
+
+# Function to wait for a long-running operation; returns True if it succeeded
+def check_operation_status(subscription_key, operation_location, injection_header=None, timeout=None):
+    future = get_operation_tracker().track(subscription_key, operation_location, injection_header, timeout)
+    try:
+        return future.result()
+    except TimeoutError:
+        print(f"Timed out waiting for operation: {operation_location}")
+        return False
 
 # Function to add face to a person    
 def add_person_face(subscription_key, endpoint, image_path, person_id, injection_header=None, quality_filter=False):
@@ -60,7 +320,13 @@ def add_person_face(subscription_key, endpoint, image_path, person_id, injection
         'detectionModel': 'detection_03'
     }
         
+    gate_reason = check_image_quality(image_path) if quality_filter else None
+    if gate_reason and quality_gate.enforce:
+        print(f"Image quality is too low ({gate_reason}). Please use a different image.")
+        return None
     faces = detect_faces(subscription_key, endpoint, image_path, injection_header)
+    if quality_filter:
+        record_quality_verdict(gate_reason, faces)
     if len(faces) == 0:
         print("No faces detected in the image.")
         return None
@@ -69,34 +335,36 @@ def add_person_face(subscription_key, endpoint, image_path, person_id, injection
             print("Face quality is too low. Please use a different image.")
             return None
 
+    # Upload the same preprocessed image that was used for detection
+    processed = preprocess_image(image_path)
     if len(faces) > 1:
-        image_width, image_height = get_image_dimensions(image_path)
+        image_width, image_height = processed.original_size
         # If multiple faces are detected, use the first face (largest face) for adding to the target
         print(f"Multiple faces detected. Using the first face (largest face) for adding to the target.")
         face_rectangle = enlarge_bounding_box(faces[0].face_rectangle, image_width, image_height)
+        face_rectangle = processed.to_processed_rectangle(face_rectangle)
         params['targetFace'] = f"{face_rectangle['left']},{face_rectangle['top']},{face_rectangle['width']},{face_rectangle['height']}"
     else:
         print(f"One face detected. Adding to the target.")
 
     add_face_url = endpoint + f"/face/{api_version}/persons/{person_id}/recognitionModels/recognition_04/persistedFaces"
-    with open(image_path, 'rb') as image_data:
-        response = requests.post(add_face_url, params=params, headers=headers, data=image_data)
-        if response.status_code == 202:
-            operation_location = response.headers.get('Operation-Location')
-            if operation_location:
-                if check_operation_status(subscription_key, operation_location, injection_header):
-                    persisted_face_id = response.json()['persistedFaceId']
-                    return persisted_face_id
-                else:
-                    print("Failed to add face.")
-                    return None
+    response = get_session().post(add_face_url, params=params, headers=headers, data=processed.content)
+    if response.status_code == 202:
+        operation_location = response.headers.get('Operation-Location')
+        if operation_location:
+            if check_operation_status(subscription_key, operation_location, injection_header):
+                persisted_face_id = response.json()['persistedFaceId']
+                return persisted_face_id
             else:
-                print("No Operation-Location header found in the response.")
+                print("Failed to add face.")
                 return None
         else:
-            print(f"Failed to add face: {response.json()}")
+            print("No Operation-Location header found in the response.")
             return None
-        
+    else:
+        print(f"Failed to add face: {response.json()}")
+        return None
+
 # Function to create a new person
 def create_person(subscription_key, endpoint, person_name = None, injection_header=None):
     create_person_url = f"{endpoint}/face/{api_version}/persons"
@@ -109,7 +377,7 @@ def create_person(subscription_key, endpoint, person_name = None, injection_head
         "name": person_name,
     }
     try:
-        response = requests.post(create_person_url, headers=headers, json=data)
+        response = get_session().post(create_person_url, headers=headers, json=data)
         response.raise_for_status()
 
         if response.status_code == 202:
@@ -131,6 +399,40 @@ def create_person(subscription_key, endpoint, person_name = None, injection_head
         print(f"Request failed: {e}")
         return None
 
+# Function to start creating a person without waiting for the operation; returns a Future resolving to the personId
+def begin_create_person(subscription_key, endpoint, person_name = None, injection_header=None, timeout=None):
+    create_person_url = f"{endpoint}/face/{api_version}/persons"
+    headers = {
+        'Ocp-Apim-Subscription-Key': subscription_key,
+        'Content-Type': 'application/json',
+        'X-MS-AZSDK-Telemetry': injection_header
+    }
+    response = get_session().post(create_person_url, headers=headers, json={"name": person_name})
+    response.raise_for_status()
+    operation_location = response.headers.get('Operation-Location')
+    if response.status_code != 202 or not operation_location:
+        raise RuntimeError(f"Failed to create person: {response.text}")
+    tracked = get_operation_tracker().track(subscription_key, operation_location, injection_header, timeout)
+    return _operation_result(tracked, response.json()['personId'])
+
+# Function to create many persons at once; the operations are polled together, so the batch takes about as long as the slowest one
+def create_persons(subscription_key, endpoint, person_names, injection_header=None, timeout=None):
+    futures = []
+    for person_name in person_names:
+        try:
+            futures.append(begin_create_person(subscription_key, endpoint, person_name, injection_header, timeout))
+        except (requests.exceptions.RequestException, RuntimeError) as e:
+            print(f"Request failed: {e}")
+            futures.append(None)
+    person_ids = []
+    for future in futures:
+        try:
+            person_ids.append(future.result() if future else None)
+        except Exception as e:
+            print(f"Failed to create person: {e}")
+            person_ids.append(None)
+    return person_ids
+
 # Function to delete a person
 def delete_person(subscription_key, endpoint, person_id, injection_header=None):
     delete_person_url = f"{endpoint}/face/{api_version}/persons/{person_id}"
@@ -139,13 +441,16 @@ def delete_person(subscription_key, endpoint, person_id, injection_header=None):
         'X-MS-AZSDK-Telemetry': injection_header
     }
     try:
-        response = requests.delete(delete_person_url, headers=headers)
+        response = get_session().delete(delete_person_url, headers=headers)
         response.raise_for_status()
 
         if response.status_code == 202:
             operation_location = response.headers.get('Operation-Location')
             if operation_location:
                 if check_operation_status(subscription_key, operation_location, injection_header):
+                    # The service removes the person from its dynamic person groups as well
+                    if _dynamic_person_group_manager is not None:
+                        _dynamic_person_group_manager.person_deleted(person_id)
                     return True
                 else:
                     print("Failed to delete person.")
@@ -160,17 +465,15 @@ def delete_person(subscription_key, endpoint, person_id, injection_header=None):
         print(f"Request failed: {e}")
         return False
 
-# Function to identify faces in an image
-def identify_faces(subscription_key, endpoint, face_id, dynamic_person_group_id=None, injection_header=None):
-    headers = {
-        'Ocp-Apim-Subscription-Key': subscription_key,
-        'Content-Type': 'application/json',
-        'X-MS-AZSDK-Telemetry': injection_header
-    }
+# Most faceIds the service accepts in one identify request
+IDENTIFY_MAX_FACE_IDS = 10
+# How long the first faceId of a batch waits for faceIds of other callers before the batch is sent
+IDENTIFY_BATCH_WINDOW = 0.02
 
-    identify_url = endpoint + "/face/{api_version}/identify"
+# Function to build the identify request body for faceIds in a dynamic person group, or in all persons
+def _identify_body(face_ids, dynamic_person_group_id=None):
     body = {
-        'faceIds': [face_id],
+        'faceIds': face_ids,
         'maxNumOfCandidatesReturned': 1,
         'confidenceThreshold': 0.5
     }
@@ -179,16 +482,417 @@ def identify_faces(subscription_key, endpoint, face_id, dynamic_person_group_id=
         body['dynamicPersonGroupId'] = dynamic_person_group_id
     else:
         body['personIds'] = '*'
+    return body
 
-    response = requests.post(identify_url, headers=headers, json=body)
-    response.raise_for_status()
-    results = response.json()
+# Collects the faceIds of concurrent identify calls with the same key, endpoint and scope and sends them as one
+# identify request. A batch is sent as soon as it is full, or once its first faceId has waited for window seconds,
+# so no caller waits longer than the window plus one request. A call made while no other identify is queued or in
+# flight is sent right away, since nothing would join it; the window only applies under concurrency. Each caller
+# gets the candidates of its own faceId.
+class IdentifyBatcher:
+    def __init__(self, window=IDENTIFY_BATCH_WINDOW, max_batch_size=IDENTIFY_MAX_FACE_IDS, max_workers=16):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.requests = 0
+        self.face_ids = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='identify')
+        self._batches = {}
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='identify-batcher', daemon=True)
+        self._thread.start()
+
+    # Function to queue a faceId for identification; returns a Future resolving to its list of candidates
+    def submit(self, subscription_key, endpoint, face_id, dynamic_person_group_id=None, injection_header=None):
+        return self.submit_many(subscription_key, endpoint, [face_id], dynamic_person_group_id, injection_header)[0]
+
+    # Function to queue several faceIds at once, e.g. the faces of one frame; returns one Future per faceId
+    def submit_many(self, subscription_key, endpoint, face_ids, dynamic_person_group_id=None, injection_header=None):
+        key = (subscription_key, endpoint, dynamic_person_group_id, injection_header)
+        futures = []
+        ready = []
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Identify batcher is closed.")
+            idle = not self._batches and not self._in_flight
+            for face_id in face_ids:
+                batch = self._batches.get(key)
+                if batch is None:
+                    batch = self._batches[key] = {'due': time.monotonic() + self.window, 'faces': {}}
+                    self._condition.notify()
+                future = Future()
+                # The same faceId from two callers is sent once
+                batch['faces'].setdefault(face_id, []).append(future)
+                futures.append(future)
+                if len(batch['faces']) >= self.max_batch_size:
+                    ready.append(self._batches.pop(key))
+            if idle and key in self._batches:
+                ready.append(self._batches.pop(key))
+            self._in_flight += len(ready)
+        for batch in ready:
+            self._executor.submit(self._send, key, batch['faces'])
+        return futures
 
-    if len(results) > 0:
-        return results[0]['candidates'][0]['personId']
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    # Batches still waiting at close are sent right away
+                    ready = [key for key, batch in self._batches.items() if self._closed or batch['due'] <= now]
+                    if ready or self._closed:
+                        break
+                    self._condition.wait(min(batch['due'] for batch in self._batches.values()) - now if self._batches else None)
+                batches = [(key, self._batches.pop(key)) for key in ready]
+                self._in_flight += len(batches)
+            for key, batch in batches:
+                self._executor.submit(self._send, key, batch['faces'])
+            if not batches:
+                return
+
+    def _send(self, key, faces):
+        subscription_key, endpoint, dynamic_person_group_id, injection_header = key
+        headers = {
+            'Ocp-Apim-Subscription-Key': subscription_key,
+            'Content-Type': 'application/json',
+            'X-MS-AZSDK-Telemetry': injection_header
+        }
+        identify_url = endpoint + f"/face/{api_version}/identify"
+        try:
+            # Check-ins are interactive, so identify goes ahead of queued background work such as enrollment
+            with request_priority(PRIORITY_INTERACTIVE):
+                response = get_session().post(identify_url, headers=headers, json=_identify_body(list(faces), dynamic_person_group_id))
+            response.raise_for_status()
+            candidates = {result['faceId']: result['candidates'] for result in response.json()}
+            with self._condition:
+                self.requests += 1
+                self.face_ids += len(faces)
+            for face_id, futures in faces.items():
+                for future in futures:
+                    if not future.done():
+                        future.set_result(candidates.get(face_id, []))
+        except Exception as e:
+            for futures in faces.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+
+_identify_batcher = None
+
+# Function to get the process-wide identify batcher used by identify_faces
+def get_identify_batcher():
+    global _identify_batcher
+    with _client_lock:
+        if _identify_batcher is None:
+            _identify_batcher = IdentifyBatcher()
+        return _identify_batcher
+
+# Function to identify faces in an image
+def identify_faces(subscription_key, endpoint, face_id, dynamic_person_group_id=None, injection_header=None):
+    # Concurrent check-ins share identify requests of up to IDENTIFY_MAX_FACE_IDS faceIds
+    candidates = get_identify_batcher().submit(subscription_key, endpoint, face_id, dynamic_person_group_id, injection_header).result()
+
+    if len(candidates) > 0:
+        return candidates[0]['personId']
     else:
         return None
 
+_face_trackers = {}
+
+# Function to get the face tracker of a camera or kiosk; each source needs its own, as tracks follow one video feed
+def get_face_tracker(source=None):
+    with _client_lock:
+        tracker = _face_trackers.get(source)
+        if tracker is None:
+            tracker = _face_trackers[source] = FaceTracker()
+        return tracker
+
+# Function to associate the faces detected in a frame with the faces of earlier frames; returns one track per face
+def track_faces(detected_faces, source=None, timestamp=None):
+    return get_face_tracker(source).update(detected_faces, timestamp)
+
+# Function to identify tracked faces; returns the personId (or None) of each track. Only new tracks and tracks with
+# a low confidence or unknown result are sent to identify, all in one batch; the others reuse their personId.
+def identify_tracked_faces(subscription_key, endpoint, tracks, dynamic_person_group_id=None, injection_header=None, source=None):
+    tracker = get_face_tracker(source)
+    pending = [track for track in tracks if tracker.needs_identify(track, dynamic_person_group_id)]
+    futures = get_identify_batcher().submit_many(subscription_key, endpoint, [track.face_id for track in pending], dynamic_person_group_id, injection_header)
+    for track, future in zip(pending, futures):
+        tracker.record(track, future.result(), dynamic_person_group_id)
+    return [track.person_id(dynamic_person_group_id) for track in tracks]
+
+# How long membership changes of a dynamic person group are collected before they are sent as one PATCH
+MEMBERSHIP_FLUSH_WINDOW = 0.5
+# Most person IDs added or removed by one PATCH; a group with more pending changes is flushed right away
+MEMBERSHIP_MAX_CHANGES = 1000
+# Number of person IDs per request when listing the members of a group
+MEMBERSHIP_PAGE_SIZE = 1000
+
+# Local view of dynamic person groups (whether they exist, and their members) plus coalescing of membership changes.
+# Links of persons that are already members are skipped; while the PATCH that made them members is still in flight,
+# they resolve with its result. Other adds and removes are collected per group for a short window and sent as one
+# PATCH with addPersonIds/removePersonIds, whose operation is tracked once for the whole flush.
+class DynamicPersonGroupManager:
+    def __init__(self, window=MEMBERSHIP_FLUSH_WINDOW, max_changes=MEMBERSHIP_MAX_CHANGES, max_workers=4):
+        self.window = window
+        self.max_changes = max_changes
+        self.patches = 0
+        self.skipped = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='membership')
+        # (subscription_key, endpoint, dynamic_person_group_id) -> set of member personIds, for groups known to exist
+        self._members = {}
+        self._pending = {}
+        # key -> {(change, person_id): Future of the flush carrying it}, for PATCHes whose operation has not finished
+        self._in_flight = {}
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='membership-flush', daemon=True)
+        self._thread.start()
+
+    def _url(self, key):
+        return f"{key[1]}/face/{api_version}/dynamicpersongroups/{key[2]}"
+
+    # Function to tell whether the group exists, asking the service only for groups not seen yet.
+    # The members of a group found on the service are loaded once, page by page.
+    def exists(self, subscription_key, endpoint, dynamic_person_group_id, injection_header=None):
+        key = (subscription_key, endpoint, dynamic_person_group_id)
+        with self._condition:
+            if key in self._members:
+                return True
+        headers = {
+            'Ocp-Apim-Subscription-Key': subscription_key,
+            'X-MS-AZSDK-Telemetry': injection_header
+        }
+        response = get_session().get(self._url(key), headers=headers)
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        members = set()
+        start = None
+        while True:
+            params = {'top': MEMBERSHIP_PAGE_SIZE}
+            if start:
+                params['start'] = start
+            response = get_session().get(self._url(key) + '/persons', headers=headers, params=params)
+            response.raise_for_status()
+            person_ids = response.json().get('personIds', [])
+            members.update(person_ids)
+            if len(person_ids) < MEMBERSHIP_PAGE_SIZE:
+                break
+            start = person_ids[-1]
+        with self._condition:
+            self._members.setdefault(key, set()).update(members)
+        return True
+
+    # Function to record a group created by this process, so it is not looked up again
+    def created(self, subscription_key, endpoint, dynamic_person_group_id):
+        with self._condition:
+            self._members[(subscription_key, endpoint, dynamic_person_group_id)] = set()
+
+    # Function to forget a deleted group
+    def deleted(self, subscription_key, endpoint, dynamic_person_group_id):
+        with self._condition:
+            self._members.pop((subscription_key, endpoint, dynamic_person_group_id), None)
+
+    # Function to drop the queued changes of a group, e.g. before it is deleted; they resolve to False.
+    # Returns the futures of its flushes still in flight, which the caller should wait for.
+    def cancel(self, subscription_key, endpoint, dynamic_person_group_id):
+        key = (subscription_key, endpoint, dynamic_person_group_id)
+        with self._condition:
+            pending = self._pending.pop(key, None)
+            in_flight = set(self._in_flight.get(key, {}).values())
+        if pending is not None:
+            for change in ('add', 'remove'):
+                for person_futures in pending[change].values():
+                    for future in person_futures:
+                        future.set_result(False)
+        return list(in_flight)
+
+    # Function to drop a deleted person from every group, since the service removes it from them as well
+    def person_deleted(self, person_id):
+        with self._condition:
+            for members in self._members.values():
+                members.discard(person_id)
+
+    # Function to queue adding a person to a group; returns a Future resolving to True once it is a member
+    def add(self, subscription_key, endpoint, dynamic_person_group_id, person_id, injection_header=None):
+        return self._change(subscription_key, endpoint, dynamic_person_group_id, person_id, injection_header, 'add')
+
+    # Function to queue removing a person from a group; returns a Future resolving to True once it is removed
+    def remove(self, subscription_key, endpoint, dynamic_person_group_id, person_id, injection_header=None):
+        return self._change(subscription_key, endpoint, dynamic_person_group_id, person_id, injection_header, 'remove')
+
+    def _change(self, subscription_key, endpoint, dynamic_person_group_id, person_id, injection_header, change):
+        key = (subscription_key, endpoint, dynamic_person_group_id)
+        if key not in self._members:
+            self.exists(subscription_key, endpoint, dynamic_person_group_id, injection_header)
+        future = Future()
+        opposite = 'remove' if change == 'add' else 'add'
+        full = None
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Dynamic person group manager is closed.")
+            pending = self._pending.get(key)
+            # A queued change in the other direction is superseded by this one
+            superseded = pending[opposite].pop(person_id, []) if pending else []
+            members = self._members.get(key)
+            is_member = members is not None and person_id in members
+            if is_member != (change == 'add'):
+                if pending is None:
+                    pending = self._pending[key] = {'due': time.monotonic() + self.window, 'add': {}, 'remove': {}, 'injection_header': injection_header}
+                    self._condition.notify()
+                pending[change].setdefault(person_id, []).append(future)
+                if len(pending['add']) + len(pending['remove']) >= self.max_changes:
+                    full = self._take(key)
+            else:
+                # Already in the requested state, so there is nothing to send; if that state comes from a PATCH still
+                # in flight, the change succeeds only if the PATCH does
+                self.skipped += 1
+                flush = self._in_flight.get(key, {}).get((change, person_id))
+                if flush is None:
+                    future.set_result(True)
+                else:
+                    flush.add_done_callback(lambda flush: future.set_exception(flush.exception()) if flush.exception() else future.set_result(flush.result()))
+        for superseded_future in superseded:
+            superseded_future.set_result(True)
+        if full is not None:
+            self._executor.submit(self._send, key, full)
+        return future
+
+    # Function to send all queued changes now
+    def flush(self):
+        with self._condition:
+            for pending in self._pending.values():
+                pending['due'] = 0
+            self._condition.notify()
+
+    # Function to send the queued changes and wait until the operations of all PATCHes have finished
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+        with self._condition:
+            in_flight = {flush for flushes in self._in_flight.values() for flush in flushes.values()}
+        wait(in_flight)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    ready = [key for key, pending in self._pending.items() if self._closed or pending['due'] <= now]
+                    if ready or self._closed:
+                        break
+                    self._condition.wait(min(pending['due'] for pending in self._pending.values()) - now if self._pending else None)
+                batches = [(key, self._take(key)) for key in ready]
+            for key, pending in batches:
+                self._executor.submit(self._send, key, pending)
+            if not batches:
+                return
+
+    # Function to take the queued changes of a group for sending. The local view is updated right away, so changes
+    # queued while the PATCH is in flight see the new membership; a failed PATCH reverts it.
+    def _take(self, key):
+        pending = self._pending.pop(key)
+        pending['flush'] = Future()
+        flushes = self._in_flight.setdefault(key, {})
+        for change in ('add', 'remove'):
+            for person_id in pending[change]:
+                flushes[(change, person_id)] = pending['flush']
+        self._apply(key, pending)
+        return pending
+
+    # Function to apply (or with undo, revert) the changes of a flush to the local view of the members
+    def _apply(self, key, pending, undo=False):
+        with self._condition:
+            members = self._members.get(key)
+            if undo and pending.get('unknown_group'):
+                # The group was not known to exist before this flush, and its failure may mean it does not, so it is
+                # forgotten rather than reported as existing; the next change looks it up again
+                self._members.pop(key, None)
+                return
+            # A group deleted meanwhile stays forgotten
+            if members is None:
+                if undo:
+                    return
+                pending['unknown_group'] = True
+                members = self._members[key] = set()
+            added, removed = (pending['remove'], pending['add']) if undo else (pending['add'], pending['remove'])
+            members.update(added)
+            members.difference_update(removed)
+
+    def _send(self, key, pending):
+        futures = [future for change in ('add', 'remove') for person_futures in pending[change].values() for future in person_futures]
+        futures.append(pending['flush'])
+        subscription_key = key[0]
+        injection_header = pending['injection_header']
+        headers = {
+            'Ocp-Apim-Subscription-Key': subscription_key,
+            'Content-Type': 'application/json',
+            'X-MS-AZSDK-Telemetry': injection_header
+        }
+        body = {}
+        if pending['add']:
+            body['addPersonIds'] = list(pending['add'])
+        if pending['remove']:
+            body['removePersonIds'] = list(pending['remove'])
+
+        def finish(succeeded, error=None):
+            with self._condition:
+                flushes = self._in_flight.get(key, {})
+                for change in ('add', 'remove'):
+                    for person_id in pending[change]:
+                        if flushes.get((change, person_id)) is pending['flush']:
+                            del flushes[(change, person_id)]
+                if not flushes:
+                    self._in_flight.pop(key, None)
+            if not succeeded:
+                self._apply(key, pending, undo=True)
+            for future in futures:
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(succeeded)
+
+        try:
+            response = get_session().patch(self._url(key), headers=headers, json=body)
+            response.raise_for_status()
+            with self._condition:
+                self.patches += 1
+            operation_location = response.headers.get('Operation-Location')
+            if response.status_code != 202 or not operation_location:
+                finish(response.status_code == 200)
+                return
+            tracked = get_operation_tracker().track(subscription_key, operation_location, injection_header)
+            tracked.add_done_callback(lambda future: finish(future.result()) if future.exception() is None else finish(False, future.exception()))
+        except Exception as e:
+            finish(False, e)
+
+_dynamic_person_group_manager = None
+
+# Function to get the process-wide dynamic person group manager used by the helpers
+def get_dynamic_person_group_manager():
+    global _dynamic_person_group_manager
+    with _client_lock:
+        if _dynamic_person_group_manager is None:
+            _dynamic_person_group_manager = DynamicPersonGroupManager()
+        return _dynamic_person_group_manager
+
 # Function to create a dynamic person group
 def create_dynamic_person_group(subscription_key, endpoint, dynamic_person_group_id, injection_header=None):
     create_DPG_url = f"{endpoint}/face/{api_version}/dynamicpersongroups/{dynamic_person_group_id}"
@@ -202,10 +906,11 @@ def create_dynamic_person_group(subscription_key, endpoint, dynamic_person_group
         "userData": "User defined data",
     }
     try:
-        response = requests.put(create_DPG_url, headers=headers, json=body)
+        response = get_session().put(create_DPG_url, headers=headers, json=body)
         response.raise_for_status()
 
         if response.status_code == 200:
+            get_dynamic_person_group_manager().created(subscription_key, endpoint, dynamic_person_group_id)
             return True
         else:
             print(f"Failed to create dynamic person group: {response.json()}")
@@ -221,14 +926,18 @@ def delete_dynamic_person_group(subscription_key, endpoint, dynamic_person_group
         'Ocp-Apim-Subscription-Key': subscription_key,
         'X-MS-AZSDK-Telemetry': injection_header
     }
+    manager = get_dynamic_person_group_manager()
+    # Queued membership changes are dropped and those in flight are awaited, so none lands after the delete
+    wait(manager.cancel(subscription_key, endpoint, dynamic_person_group_id))
     try:
-        response = requests.delete(delete_DPG_url, headers=headers)
+        response = get_session().delete(delete_DPG_url, headers=headers)
         response.raise_for_status()
 
         if response.status_code == 202:
             operation_location = response.headers.get('Operation-Location')
             if operation_location:
                 if check_operation_status(subscription_key, operation_location, injection_header):
+                    manager.deleted(subscription_key, endpoint, dynamic_person_group_id)
                     return True
                 else:
                     print("Failed to delete dynamic person group.")
@@ -243,17 +952,10 @@ def delete_dynamic_person_group(subscription_key, endpoint, dynamic_person_group
         print(f"Request failed: {e}")
         return False
     
-# Function to check if a dynamic person group exists
+# Function to check if a dynamic person group exists; groups already seen by this process are not looked up again
 def check_dynamic_person_group_exists(subscription_key, endpoint, dynamic_person_group_id, injection_header=None):
-    check_DPG_url = f"{endpoint}/face/{api_version}/dynamicpersongroups/{dynamic_person_group_id}"
-    headers = {
-        'Ocp-Apim-Subscription-Key': subscription_key,
-        'X-MS-AZSDK-Telemetry': injection_header
-    }
     try:
-        response = requests.get(check_DPG_url, headers=headers)
-        response.raise_for_status()
-        if response.status_code == 200:
+        if get_dynamic_person_group_manager().exists(subscription_key, endpoint, dynamic_person_group_id, injection_header):
             return True
         else:
             print("Dynamic person group does not exist.")
@@ -261,38 +963,47 @@ def check_dynamic_person_group_exists(subscription_key, endpoint, dynamic_person
     except requests.exceptions.RequestException as e:
         print(f"Request failed: {e}")
         return False
-    
+
+# Function to start linking a person to a dynamic person group; returns a Future resolving to True once linked.
+# Links of concurrent callers are sent together in one PATCH, and links of persons already in the group are skipped.
+# The result is that of the PATCH operation, also for a skipped link whose PATCH is still in flight.
+def begin_link_person_to_dynamic_person_group(subscription_key, endpoint, dynamic_person_group_id, person_id, injection_header=None):
+    return get_dynamic_person_group_manager().add(subscription_key, endpoint, dynamic_person_group_id, person_id, injection_header)
+
 # Function to link a person to a dynamic person group
 def link_person_to_dynamic_person_group(subscription_key, endpoint, dynamic_person_group_id, person_id, injection_header=None):
-    link_DPG_url = f"{endpoint}/face/{api_version}/dynamicpersongroups/{dynamic_person_group_id}"
-    headers = {
-        'Ocp-Apim-Subscription-Key': subscription_key,
-        'Content-Type': 'application/json',
-        'X-MS-AZSDK-Telemetry': injection_header
-    }
-    body = {
-        "name": "Example DynamicPersonGroup",
-        "userData": "User defined data",
-        "addPersonIds": [person_id]
-    }
     try:
-        response = requests.patch(link_DPG_url, headers=headers, json=body)
-        response.raise_for_status()
+        if begin_link_person_to_dynamic_person_group(subscription_key, endpoint, dynamic_person_group_id, person_id, injection_header).result():
+            return True
+        else:
+            print("Failed to link person to dynamic person group.")
+            return False
+    except requests.exceptions.RequestException as e:
+        print(f"Request failed: {e}")
+        return False
 
-        if response.status_code == 202:
-            operation_location = response.headers.get('Operation-Location')
-            if operation_location:
-                if check_operation_status(subscription_key, operation_location, injection_header):
-                    return True
-                else:
-                    print("Failed to create dynamic person group.")
-                    return False
-            else:
-                print("No Operation-Location header found in the response.")
-                return False
+# Function to link many persons to a dynamic person group with as few PATCH requests as possible; returns one bool per person
+def link_persons_to_dynamic_person_group(subscription_key, endpoint, dynamic_person_group_id, person_ids, injection_header=None):
+    manager = get_dynamic_person_group_manager()
+    futures = [manager.add(subscription_key, endpoint, dynamic_person_group_id, person_id, injection_header) for person_id in person_ids]
+    manager.flush()
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except requests.exceptions.RequestException as e:
+            print(f"Request failed: {e}")
+            results.append(False)
+    return results
+
+# Function to remove a person from a dynamic person group, coalesced like the links
+def unlink_person_from_dynamic_person_group(subscription_key, endpoint, dynamic_person_group_id, person_id, injection_header=None):
+    try:
+        if get_dynamic_person_group_manager().remove(subscription_key, endpoint, dynamic_person_group_id, person_id, injection_header).result():
+            return True
         else:
-            print(f"Failed to create dynamic person group: {response.json()}")
+            print("Failed to unlink person from dynamic person group.")
             return False
     except requests.exceptions.RequestException as e:
         print(f"Request failed: {e}")
-        return False
\ No newline at end of file
+        return False
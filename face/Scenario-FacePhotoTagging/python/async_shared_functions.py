@@ -0,0 +1,292 @@
+import asyncio, time
+import aiohttp
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.ai.vision.face.aio import FaceClient
+from azure.ai.vision.face.models import FaceDetectionModel, FaceRecognitionModel, FaceAttributeTypeRecognition04, QualityForRecognition
+
+import shared_functions
+from rate_limiter import rate_limit_middleware
+from shared_functions import api_version, enlarge_bounding_box, preprocess_image, person_cache
+
+# Size of the shared connection pool (total, and per Face endpoint host)
+POOL_LIMIT = 256
+POOL_LIMIT_PER_HOST = 128
+# Adaptive polling of long-running operations
+POLL_INITIAL_INTERVAL = 0.25
+POLL_MAX_INTERVAL = 5.0
+POLL_BACKOFF = 1.5
+POLL_TIMEOUT = 300
+
+_session = None
+_face_clients = {}
+
+# Function to get the aiohttp session shared by all async helpers; must be called from the event loop that uses it.
+# Its requests share the rate limit scheduler of shared_functions with the synchronous helpers.
+def get_session():
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=POOL_LIMIT, limit_per_host=POOL_LIMIT_PER_HOST, keepalive_timeout=60)
+        middleware = rate_limit_middleware(shared_functions.rate_limit_scheduler)
+        _session = aiohttp.ClientSession(connector=connector, middlewares=(middleware,))
+    return _session
+
+# Function to get the long-lived async FaceClient for a key/endpoint, sending through the shared session
+def get_face_client(subscription_key, endpoint):
+    key = (subscription_key, endpoint)
+    face_client = _face_clients.get(key)
+    if face_client is None:
+        face_client = FaceClient(
+            endpoint,
+            AzureKeyCredential(subscription_key),
+            transport=AioHttpTransport(session=get_session(), session_owner=False),
+            retry_status=0
+        )
+        _face_clients[key] = face_client
+    return face_client
+
+# Function to close the shared clients and session, e.g. when the event loop shuts down
+async def close_client_contexts():
+    global _session
+    face_clients = list(_face_clients.values())
+    _face_clients.clear()
+    for face_client in face_clients:
+        await face_client.close()
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+# aiohttp rejects None header values, so optional headers are left out
+def _headers(subscription_key, injection_header=None, content_type=None):
+    headers = {'Ocp-Apim-Subscription-Key': subscription_key}
+    if content_type:
+        headers['Content-Type'] = content_type
+    if injection_header:
+        headers['X-MS-AZSDK-Telemetry'] = injection_header
+    return headers
+
+# Reading and downscaling the image is blocking work, so it runs on the default executor
+async def _preprocess_image(image_path):
+    return await asyncio.get_running_loop().run_in_executor(None, preprocess_image, image_path)
+
+async def detect_faces(subscription_key, endpoint, image_path, injection_header=None):
+    processed = await _preprocess_image(image_path)
+    image_content = processed.content
+    # Shares the detection cache of shared_functions
+    detection_cache = shared_functions.detection_cache
+    if detection_cache is not None:
+        key = detection_cache.make_key(
+            image_content,
+            endpoint=endpoint,
+            detection_model=FaceDetectionModel.DETECTION03,
+            recognition_model=FaceRecognitionModel.RECOGNITION04,
+            return_face_attributes=[FaceAttributeTypeRecognition04.QUALITY_FOR_RECOGNITION]
+        )
+        detected_faces = detection_cache.get(key)
+        if detected_faces is not None:
+            return processed.map_faces_to_original(detected_faces)
+    detected_faces = await get_face_client(subscription_key, endpoint).detect(
+            image_content=image_content,
+            detection_model=FaceDetectionModel.DETECTION03,
+            recognition_model=FaceRecognitionModel.RECOGNITION04,
+            return_face_id=True,
+            return_face_attributes=[FaceAttributeTypeRecognition04.QUALITY_FOR_RECOGNITION],
+            headers=_headers(subscription_key, injection_header)
+        )
+    if detection_cache is not None:
+        detection_cache.put(key, detected_faces)
+    return processed.map_faces_to_original(detected_faces)
+
+async def check_operation_status(subscription_key, operation_location, timeout=POLL_TIMEOUT):
+    headers = _headers(subscription_key, 'sample=enroll-faces-person-directory')
+    deadline = time.monotonic() + timeout
+    interval = POLL_INITIAL_INTERVAL
+    while True:
+        async with get_session().get(operation_location, headers=headers) as response:
+            retry_after = response.headers.get('Retry-After')
+            if response.status != 429:
+                response.raise_for_status()
+                status = (await response.json(content_type=None)).get('status')
+                if status in ['succeeded', 'failed']:
+                    return status == 'succeeded'
+
+        delay = interval
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            print(f"Timed out waiting for operation: {operation_location}")
+            return False
+        await asyncio.sleep(min(delay, remaining))
+        interval = min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+
+# Function to POST/PUT/PATCH/DELETE a request that completes through an Operation-Location, returning the response body on success
+async def _run_operation(method, url, subscription_key, action, headers, **kwargs):
+    try:
+        async with get_session().request(method, url, headers=headers, **kwargs) as response:
+            response.raise_for_status()
+            body = await response.json(content_type=None)
+            if response.status != 202:
+                print(f"Failed to {action}: {body}")
+                return None
+            operation_location = response.headers.get('Operation-Location')
+        if not operation_location:
+            print("No Operation-Location header found in the response.")
+            return None
+        if await check_operation_status(subscription_key, operation_location):
+            return body if body is not None else {}
+        print(f"Failed to {action}.")
+        return None
+    except aiohttp.ClientError as e:
+        print(f"Request failed: {e}")
+        return None
+
+# Function to add face to a person
+async def add_person_face(subscription_key, endpoint, image_path, person_id, injection_header=None, quality_filter=False):
+    params = {
+        'detectionModel': 'detection_03'
+    }
+
+    gate_reason = None
+    if quality_filter and shared_functions.quality_gate is not None:
+        gate_reason = await asyncio.get_running_loop().run_in_executor(None, shared_functions.check_image_quality, image_path)
+        if gate_reason and shared_functions.quality_gate.enforce:
+            print(f"Image quality is too low ({gate_reason}). Please use a different image.")
+            return None
+
+    faces = await detect_faces(subscription_key, endpoint, image_path, injection_header)
+    if quality_filter:
+        shared_functions.record_quality_verdict(gate_reason, faces)
+    if len(faces) == 0:
+        print("No faces detected in the image.")
+        return None
+    if quality_filter and faces[0].face_attributes.quality_for_recognition == QualityForRecognition.LOW:
+        print("Face quality is too low. Please use a different image.")
+        return None
+
+    # Upload the same preprocessed image that was used for detection
+    processed = await _preprocess_image(image_path)
+    if len(faces) > 1:
+        image_width, image_height = processed.original_size
+        # If multiple faces are detected, use the first face (largest face) for adding to the target
+        print(f"Multiple faces detected. Using the first face (largest face) for adding to the target.")
+        face_rectangle = enlarge_bounding_box(faces[0].face_rectangle, image_width, image_height)
+        face_rectangle = processed.to_processed_rectangle(face_rectangle)
+        params['targetFace'] = f"{face_rectangle['left']},{face_rectangle['top']},{face_rectangle['width']},{face_rectangle['height']}"
+    else:
+        print(f"One face detected. Adding to the target.")
+
+    add_face_url = endpoint + f"/face/{api_version}/persons/{person_id}/recognitionModels/recognition_04/persistedFaces"
+    body = await _run_operation('POST', add_face_url, subscription_key, 'add face',
+                                _headers(subscription_key, injection_header, 'application/octet-stream'),
+                                params=params, data=processed.content)
+    return body['persistedFaceId'] if body else None
+
+# Function to delete a face from a person
+async def delete_person_face(subscription_key, endpoint, person_id, face_id, injection_header=None):
+    delete_face_url = f"{endpoint}/face/{api_version}/persons/{person_id}/recognitionModels/recognition_04/persistedFaces/{face_id}"
+    body = await _run_operation('DELETE', delete_face_url, subscription_key, 'delete face', _headers(subscription_key, injection_header))
+    return body is not None
+
+# Function to create a new person
+async def create_person(subscription_key, endpoint, person_name, injection_header=None):
+    create_person_url = f"{endpoint}/face/{api_version}/persons"
+    body = await _run_operation('POST', create_person_url, subscription_key, 'create person',
+                                _headers(subscription_key, injection_header, 'application/json'), json={"name": person_name})
+    if not body:
+        return None
+    person_cache.put(body['personId'], {'personId': body['personId'], 'name': person_name})
+    return body['personId']
+
+# Function to delete a person
+async def delete_person(subscription_key, endpoint, person_id, injection_header=None):
+    delete_person_url = f"{endpoint}/face/{api_version}/persons/{person_id}"
+    person_cache.invalidate(person_id)
+    body = await _run_operation('DELETE', delete_person_url, subscription_key, 'delete person', _headers(subscription_key, injection_header))
+    return body is not None
+
+# Function to identify faces in an image
+async def identify_faces(subscription_key, endpoint, image_path, person_ids=None, dynamic_person_group_id=None, injection_header=None):
+    headers = _headers(subscription_key, injection_header, 'application/json')
+    faces = await detect_faces(subscription_key, endpoint, image_path, injection_header)
+    if len(faces) == 0:
+        print("No faces detected in the image.")
+        return None
+    face_ids = []
+    face_details = []
+
+    for face in faces:
+        face_ids.append(face['faceId'])
+        face_details.append({
+            'faceId': face['faceId'],
+            'bbox': face['faceRectangle']
+        })
+
+    identify_url = endpoint + f"/face/{api_version}/identify"
+    body = {
+        'faceIds': face_ids,
+        'maxNumOfCandidatesReturned': 1,
+        'confidenceThreshold': 0.5
+    }
+    if person_ids:
+        body['personIds'] = person_ids
+    elif dynamic_person_group_id:
+        body['dynamicPersonGroupId'] = dynamic_person_group_id
+    else:
+        print("Person IDs or Dynamic Person Group ID must be provided.")
+        return None
+
+    async with get_session().post(identify_url, headers=headers, json=body) as response:
+        response.raise_for_status()
+        results = await response.json(content_type=None)
+
+    async def get_person(person_id):
+        person_details_url = f"{endpoint}/face/{api_version}/persons/{person_id}"
+        async with get_session().get(person_details_url, headers=headers) as person_response:
+            person_response.raise_for_status()
+            person = await person_response.json(content_type=None)
+        person_cache.put(person_id, person)
+        return person
+
+    # Look up all identified person names at once; only cache misses go to the service, concurrently
+    candidate_person_ids = list(dict.fromkeys(result['candidates'][0]['personId'] for result in results if len(result['candidates']) > 0))
+    persons = {person_id: person_cache.get(person_id) for person_id in candidate_person_ids}
+    missing = [person_id for person_id, person in persons.items() if person is None]
+    persons.update(zip(missing, await asyncio.gather(*[get_person(person_id) for person_id in missing])))
+
+    identified_faces = []
+    for i, result in enumerate(results):
+        face_info = face_details[i]
+        if len(result['candidates']) > 0:
+            candidate = result['candidates'][0]
+            face_info['personId'] = candidate['personId']
+            face_info['confidence'] = candidate['confidence']
+            face_info['personName'] = persons[candidate['personId']]['name']
+        else:
+            face_info['personId'] = None
+            face_info['confidence'] = None
+            face_info['personName'] = 'Unknown'
+        identified_faces.append(face_info)
+
+    return identified_faces
+
+# Function to create a dynamic person group
+async def create_dynamic_person_group(subscription_key, endpoint, dynamic_person_group_id, person_ids, injection_header=None):
+    create_DPG_url = f"{endpoint}/face/{api_version}/dynamicpersongroups/{dynamic_person_group_id}"
+    body = {
+        "name": "Example DynamicPersonGroup",
+        "userData": "User defined data",
+        "addPersonIds": person_ids
+    }
+    result = await _run_operation('PUT', create_DPG_url, subscription_key, 'create dynamic person group',
+                                  _headers(subscription_key, injection_header, 'application/json'), json=body)
+    return result is not None
+
+# Function to delete a dynamic person group
+async def delete_dynamic_person_group(subscription_key, endpoint, dynamic_person_group_id, injection_header=None):
+    delete_DPG_url = f"{endpoint}/face/{api_version}/dynamicpersongroups/{dynamic_person_group_id}"
+    result = await _run_operation('DELETE', delete_DPG_url, subscription_key, 'delete dynamic person group', _headers(subscription_key, injection_header))
+    return result is not None
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import shared_functions
+from bulk_operations import BulkOperation
+from shared_functions import detect_faces, add_detected_person_face, check_duplicate_image, check_image_quality, finish_duplicate_check, record_quality_verdict
+
+# Spaces out the enrollments of one batch so that no more than requests_per_second are started, shared by all workers.
+# The process-wide limit of all Face calls is shared_functions.rate_limit_scheduler.
+class RequestRateLimiter:
+    def __init__(self, requests_per_second=None):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(self.next_time, now) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+# Enrolls many (person_id, image_path) pairs with the bounded worker pool of BulkOperation.
+# Detection and persistedFaces uploads of different images run concurrently; results stream back as each item finishes.
+class BatchEnrollment(BulkOperation):
+    def __init__(self, subscription_key, endpoint, injection_header=None, max_workers=8, max_in_flight=16, requests_per_second=None, quality_filter=False):
+        super().__init__(max_workers, max_in_flight)
+        self.subscription_key = subscription_key
+        self.endpoint = endpoint
+        self.injection_header = injection_header
+        self.quality_filter = quality_filter
+        self.rate_limiter = RequestRateLimiter(requests_per_second)
+
+    # Runs as background work of the rate limiter, so interactive requests sharing the rate limit go first
+    def _enroll_one(self, item):
+        person_id, image_path = item
+        result = {'personId': person_id, 'imagePath': image_path, 'persistedFaceId': None, 'error': None}
+        try:
+            # Near-duplicates of an image already added to the person get its persistedFaceId without any upload
+            duplicate, entry_id = check_duplicate_image(image_path, f"face:{person_id}")
+            result['duplicate'] = duplicate is not None
+            if duplicate is not None:
+                result['persistedFaceId'] = duplicate
+            else:
+                try:
+                    gate_reason = check_image_quality(image_path) if self.quality_filter else None
+                    if gate_reason and shared_functions.quality_gate.enforce:
+                        # Rejected locally, before any upload
+                        raise ValueError(f"Image quality is too low ({gate_reason}).")
+                    self.rate_limiter.acquire()
+                    faces = detect_faces(self.subscription_key, self.endpoint, image_path, self.injection_header)
+                    if self.quality_filter:
+                        record_quality_verdict(gate_reason, faces)
+                    self.rate_limiter.acquire()
+                    result['persistedFaceId'] = add_detected_person_face(
+                        self.subscription_key, self.endpoint, image_path, person_id, faces, self.injection_header, self.quality_filter
+                    )
+                finally:
+                    finish_duplicate_check(entry_id, result['persistedFaceId'])
+        except Exception as e:
+            result['error'] = str(e)
+        return result
+
+    # An image with no face, or one rejected for quality, has no error but was not enrolled
+    def _is_success(self, result):
+        return bool(result['persistedFaceId'])
+
+    # Function to enroll the given pairs, yielding one result dict per item in completion order
+    def enroll(self, items):
+        return self.run(self._enroll_one, items)
+
+# Function to enroll (person_id, image_path) pairs concurrently and print a summary at the end
+def batch_add_person_faces(subscription_key, endpoint, items, injection_header=None, max_workers=8, max_in_flight=16, requests_per_second=None, quality_filter=False):
+    enrollment = BatchEnrollment(subscription_key, endpoint, injection_header, max_workers, max_in_flight, requests_per_second, quality_filter)
+    results = []
+    for result in enrollment.enroll(items):
+        results.append(result)
+    summary = enrollment.summary()
+    print(f"Enrolled {summary['succeeded']}/{summary['count']} faces in {summary['elapsedSeconds']:.1f}s ({summary['itemsPerSecond']:.1f} faces/s)")
+    return results, summary
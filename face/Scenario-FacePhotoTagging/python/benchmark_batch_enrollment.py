@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+# Benchmark of sequential add_person_face against BatchEnrollment on a local fake Face endpoint.
+# The fake endpoint answers detect, persistedFaces and operation polls with a fixed service latency.
+#
+#   python3 benchmark_batch_enrollment.py --images 200 --latency-ms 50 --workers 16
+
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import shared_functions
+from batch_enrollment import BatchEnrollment
+
+class FakeFaceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.0
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        self._send_json(200, {'status': 'succeeded'})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.latency)
+        if '/detect' in self.path:
+            self._send_json(200, [{
+                'faceId': str(uuid.uuid4()),
+                'faceRectangle': {'top': 10, 'left': 10, 'width': 100, 'height': 100},
+                'faceAttributes': {'qualityForRecognition': 'high'}
+            }])
+        else:
+            operation_location = f"http://{self.headers['Host']}/face/{shared_functions.api_version}/operations/{uuid.uuid4()}"
+            self._send_json(202, {'persistedFaceId': str(uuid.uuid4())}, {'Operation-Location': operation_location})
+
+    def log_message(self, format, *args):
+        pass
+
+def start_fake_endpoint(latency):
+    FakeFaceHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeFaceHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description='Sequential versus batch enrollment against a fake Face endpoint.')
+    parser.add_argument('--images', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--rps', type=float, default=None)
+    args = parser.parse_args()
+
+    image_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'SingleFaceEnrollment', 'Alex.jpg')
+    items = [(str(uuid.uuid4()), image_path) for _ in range(args.images)]
+    # Every item uses the same image, so turn off the detection cache to measure real uploads
+    shared_functions.detection_cache = None
+    server, endpoint = start_fake_endpoint(args.latency_ms / 1000)
+
+    try:
+        sequential_count = min(args.images, 20)
+        start = time.perf_counter()
+        for person_id, path in items[:sequential_count]:
+            shared_functions.add_person_face('key', endpoint, path, person_id)
+        elapsed = time.perf_counter() - start
+        sequential_rate = sequential_count / elapsed
+
+        enrollment = BatchEnrollment('key', endpoint, max_workers=args.workers, max_in_flight=args.workers * 2, requests_per_second=args.rps)
+        for _ in enrollment.enroll(items):
+            pass
+        summary = enrollment.summary()
+    finally:
+        shared_functions.close_client_contexts()
+        server.shutdown()
+
+    print(f"Sequential add_person_face: {sequential_rate:8.1f} faces/s ({sequential_count} images)")
+    print(f"BatchEnrollment ({args.workers} workers): {summary['itemsPerSecond']:8.1f} faces/s ({summary['count']} images, "
+          f"{summary['failed']} failed), latency p50={summary['latencyP50'] * 1000:.1f} ms p95={summary['latencyP95'] * 1000:.1f} ms")
+
+if __name__ == '__main__':
+    main()
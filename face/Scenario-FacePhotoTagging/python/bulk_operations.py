@@ -0,0 +1,76 @@
+# Each Python sample is self-contained, so this module is copied in Scenario-FacePhotoTagging and UnifiedFaceCollection; keep the copies identical
+import statistics, time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from rate_limiter import PRIORITY_BACKGROUND, request_priority
+
+# Runs one function over many items with a bounded worker pool, as background work of the rate limiter.
+# Items are pulled from the iterable only while there is room, so huge inputs are never materialized,
+# and one result dict per item streams back in completion order.
+class BulkOperation:
+    def __init__(self, max_workers=8, max_in_flight=None):
+        self.max_workers = max_workers
+        self.max_in_flight = max(max_in_flight or 2 * max_workers, 1)
+        self.latencies = []
+        self.succeeded = 0
+        self.failed = 0
+        self.started = None
+        self.finished = None
+
+    def _run_one(self, function, item):
+        start = time.perf_counter()
+        try:
+            # Interactive requests sharing the rate limit go ahead of bulk work
+            with request_priority(PRIORITY_BACKGROUND):
+                result = function(item)
+        except Exception as e:
+            result = {'item': item, 'error': str(e)}
+        result['latency'] = time.perf_counter() - start
+        return result
+
+    # Function to tell whether a result counts as succeeded; a result with an 'error' counts as failed
+    def _is_success(self, result):
+        return not result.get('error')
+
+    # Function to apply function to every item, yielding the result dicts
+    def run(self, function, items):
+        self.started = time.perf_counter()
+        items = iter(items)
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                while len(pending) < self.max_in_flight:
+                    item = next(items, None)
+                    if item is None:
+                        break
+                    pending.add(executor.submit(self._run_one, function, item))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    self.latencies.append(result['latency'])
+                    if self._is_success(result):
+                        self.succeeded += 1
+                    else:
+                        self.failed += 1
+                    yield result
+        self.finished = time.perf_counter()
+
+    # Function to summarize throughput and latency of the last run
+    def summary(self):
+        count = len(self.latencies)
+        elapsed = ((self.finished or time.perf_counter()) - self.started) if self.started else 0.0
+        summary = {
+            'count': count,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'elapsedSeconds': elapsed,
+            'itemsPerSecond': count / elapsed if elapsed > 0 else 0.0,
+        }
+        if count:
+            latencies = sorted(self.latencies)
+            summary['latencyP50'] = statistics.median(latencies)
+            summary['latencyP95'] = latencies[max(int(count * 0.95) - 1, 0)]
+            summary['latencyMax'] = latencies[-1]
+        return summary
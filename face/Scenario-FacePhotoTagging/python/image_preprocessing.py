@@ -0,0 +1,123 @@
+# Each Python sample is self-contained, so this module is copied in Scenario-CustomerCheckinManagement, Scenario-FacePhotoTagging and UnifiedFaceCollection; keep the copies identical
+import io, threading, time
+from PIL import Image, ImageOps
+
+# Longest side of the image that is uploaded to the Face service
+MAX_IMAGE_SIZE = 1920
+# JPEG quality of the re-encoded image
+JPEG_QUALITY = 95
+# EXIF orientations that swap width and height
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+# The bytes to upload for one image, plus what is needed to map face rectangles back to the original.
+# Original coordinates are those of the full-resolution image after applying its EXIF orientation.
+class PreprocessedImage:
+    def __init__(self, content, size, original_size, original_bytes, elapsed):
+        self.content = content
+        self.size = size
+        self.original_size = original_size
+        self.original_bytes = original_bytes
+        self.elapsed = elapsed
+        self.scale_x = size[0] / original_size[0]
+        self.scale_y = size[1] / original_size[1]
+
+    @property
+    def bytes_saved(self):
+        return self.original_bytes - len(self.content)
+
+    def to_original_rectangle(self, rectangle):
+        return {
+            'left': int(round(rectangle['left'] / self.scale_x)),
+            'top': int(round(rectangle['top'] / self.scale_y)),
+            'width': int(round(rectangle['width'] / self.scale_x)),
+            'height': int(round(rectangle['height'] / self.scale_y))
+        }
+
+    def to_processed_rectangle(self, rectangle):
+        return {
+            'left': int(round(rectangle['left'] * self.scale_x)),
+            'top': int(round(rectangle['top'] * self.scale_y)),
+            'width': int(round(rectangle['width'] * self.scale_x)),
+            'height': int(round(rectangle['height'] * self.scale_y))
+        }
+
+    # Function to return copies of detected faces with rectangles and landmarks in original coordinates
+    def map_faces_to_original(self, faces):
+        if self.scale_x == 1 and self.scale_y == 1:
+            return faces
+        mapped_faces = []
+        for face in faces:
+            data = face.as_dict()
+            if 'faceRectangle' in data:
+                data['faceRectangle'] = self.to_original_rectangle(data['faceRectangle'])
+            for name, point in data.get('faceLandmarks', {}).items():
+                data['faceLandmarks'][name] = {'x': point['x'] / self.scale_x, 'y': point['y'] / self.scale_y}
+            mapped_faces.append(type(face)(data))
+        return mapped_faces
+
+# Function to wrap image bytes that are uploaded unchanged; only the header is parsed for the size
+def passthrough_image(image_content):
+    with Image.open(io.BytesIO(image_content)) as image:
+        size = image.size
+        if image.getexif().get(0x0112, 1) in _TRANSPOSED_ORIENTATIONS:
+            size = (size[1], size[0])
+    return PreprocessedImage(image_content, size, size, len(image_content), 0.0)
+
+# Downscales images to max_size on the longest side and re-encodes them as JPEG before upload.
+# JPEG files are decoded in draft mode, which lets the decoder skip most of the work of a large downscale,
+# and the EXIF orientation is applied so that the uploaded image is upright.
+class ImagePreprocessor:
+    def __init__(self, max_size=MAX_IMAGE_SIZE, jpeg_quality=JPEG_QUALITY):
+        self.max_size = max_size
+        self.jpeg_quality = jpeg_quality
+        self.images = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def process(self, image_content):
+        start = time.perf_counter()
+        with Image.open(io.BytesIO(image_content)) as image:
+            orientation = image.getexif().get(0x0112, 1)
+            width, height = image.size
+            original_size = (height, width) if orientation in _TRANSPOSED_ORIENTATIONS else (width, height)
+            scale = min(1.0, self.max_size / max(width, height))
+
+            if scale == 1.0 and orientation == 1 and image.format == 'JPEG':
+                # Already small enough and upright; upload the original bytes as they are
+                content = image_content
+                size = original_size
+            else:
+                target_size = (max(1, round(original_size[0] * scale)), max(1, round(original_size[1] * scale)))
+                if image.format == 'JPEG' and scale < 1.0:
+                    image.draft('RGB', (max(1, round(width * scale)), max(1, round(height * scale))))
+                image = ImageOps.exif_transpose(image).convert('RGB')
+                if image.size != target_size:
+                    image = image.resize(target_size, Image.LANCZOS)
+                output = io.BytesIO()
+                image.save(output, format='jpeg', quality=self.jpeg_quality)
+                content = output.getvalue()
+                size = target_size
+                if scale == 1.0 and orientation == 1 and len(content) >= len(image_content):
+                    content = image_content
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.images += 1
+            self.bytes_in += len(image_content)
+            self.bytes_out += len(content)
+            self.seconds += elapsed
+        return PreprocessedImage(content, size, original_size, len(image_content), elapsed)
+
+    # Function to report how many bytes preprocessing saved and how much time it cost
+    def stats(self):
+        with self._lock:
+            return {
+                'images': self.images,
+                'bytesIn': self.bytes_in,
+                'bytesOut': self.bytes_out,
+                'bytesSaved': self.bytes_in - self.bytes_out,
+                'seconds': self.seconds,
+                'secondsPerImage': self.seconds / self.images if self.images else 0.0
+            }
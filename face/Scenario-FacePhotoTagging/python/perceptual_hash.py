@@ -0,0 +1,178 @@
+# Each Python sample is self-contained, so this module is copied in Scenario-FacePhotoTagging and UnifiedFaceCollection; keep the copies identical
+import io, json, threading
+import numpy as np
+from PIL import Image, ImageOps
+
+# Hashes have HASH_SIZE x HASH_SIZE = 64 bits
+HASH_SIZE = 8
+# Images whose hashes differ in at most this many bits are near-duplicates (burst shots, re-exports, resizes)
+MAX_DISTANCE = 6
+# Longest side of the grayscale copy the sharpness is computed on, whatever the size of the image
+SHARPNESS_SIZE = 256
+
+# Number of set bits of every byte value, for counting differing bits without np.bitwise_count (NumPy < 2.0)
+_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+# The perceptual hash of an image plus its sharpness, used to prefer the best of several near-duplicates
+class ImageSignature:
+    def __init__(self, digest, sharpness):
+        self.hash = digest
+        self.sharpness = sharpness
+
+# Function to compute the difference hash (dHash) and the sharpness (variance of the Laplacian) of image bytes.
+# Both come from one small grayscale copy; JPEG files are decoded in draft mode, so this costs a few milliseconds.
+def image_signature(image_content):
+    with Image.open(io.BytesIO(image_content)) as image:
+        if image.format == 'JPEG':
+            image.draft('L', (SHARPNESS_SIZE, SHARPNESS_SIZE))
+        gray = ImageOps.exif_transpose(image).convert('L')
+    # Scaled to a fixed size, up or down, so that low-resolution copies score as the blurrier ones
+    scale = SHARPNESS_SIZE / max(gray.size)
+    gray = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))), Image.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.float32)
+    laplacian = pixels[1:-1, :-2] + pixels[1:-1, 2:] + pixels[:-2, 1:-1] + pixels[2:, 1:-1] - 4 * pixels[1:-1, 1:-1]
+    # dHash: one bit per horizontally adjacent pair of a (HASH_SIZE + 1) x HASH_SIZE thumbnail, set where brightness drops
+    small = np.asarray(gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS), dtype=np.int16)
+    bits = (small[:, :-1] > small[:, 1:]).ravel()
+    digest = int.from_bytes(np.packbits(bits).tobytes(), 'big')
+    return ImageSignature(digest, float(laplacian.var()) if laplacian.size else 0.0)
+
+# Function to count the differing bits between one hash and an array of hashes
+def hamming_distances(hashes, digest):
+    difference = np.bitwise_xor(hashes, np.uint64(digest))
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(difference)
+    return _POPCOUNT[difference.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+# Function to pick up to count of the given (key, signature) pairs, dropping near-duplicates of sharper images.
+# Returns the keys, sharpest first.
+def select_distinct(items, count=None, max_distance=MAX_DISTANCE):
+    items = sorted(items, key=lambda item: -item[1].sharpness)
+    hashes = np.zeros(len(items), dtype=np.uint64)
+    selected = []
+    for key, signature in items:
+        if count is not None and len(selected) >= count:
+            break
+        if selected and hamming_distances(hashes[:len(selected)], signature.hash).min() <= max_distance:
+            continue
+        hashes[len(selected)] = signature.hash
+        selected.append(key)
+    return selected
+
+# Near-duplicate index of image hashes. Hashes, groups and sharpness are kept in NumPy arrays, so a lookup is one
+# vectorized XOR and bit count over all entries. Each entry belongs to a group (e.g. a person) and carries a
+# JSON-serializable value (e.g. the persistedFaceId). Removed entries leave a slot that the next add reuses.
+class PerceptualHashIndex:
+    def __init__(self, max_distance=MAX_DISTANCE, capacity=1024):
+        self.max_distance = max_distance
+        self._hashes = np.zeros(capacity, dtype=np.uint64)
+        self._groups = np.full(capacity, -1, dtype=np.int32)
+        self._sharpness = np.zeros(capacity, dtype=np.float32)
+        self._values = [None] * capacity
+        self._group_ids = {}
+        self._group_names = []
+        self._free = []
+        self._size = 0
+        self._lock = threading.Lock()
+
+    # Function to add an image; returns the id of its entry
+    def add(self, signature, value, group=None):
+        with self._lock:
+            group_id = self._group_ids.get(group)
+            if group_id is None:
+                group_id = self._group_ids[group] = len(self._group_names)
+                self._group_names.append(group)
+            if self._free:
+                entry_id = self._free.pop()
+            else:
+                if self._size == len(self._hashes):
+                    self._grow()
+                entry_id = self._size
+                self._size += 1
+            self._hashes[entry_id] = signature.hash
+            self._groups[entry_id] = group_id
+            self._sharpness[entry_id] = signature.sharpness
+            self._values[entry_id] = value
+            return entry_id
+
+    # Function to return the id of the closest near-duplicate in the group, or None
+    def find(self, signature, group=None, max_distance=None):
+        with self._lock:
+            group_id = self._group_ids.get(group)
+            if group_id is None or not self._size:
+                return None
+            distances = hamming_distances(self._hashes[:self._size], signature.hash)
+            limit = self.max_distance if max_distance is None else max_distance
+            matches = np.flatnonzero((self._groups[:self._size] == group_id) & (distances <= limit))
+            if not matches.size:
+                return None
+            return int(matches[np.argmin(distances[matches])])
+
+    def get(self, entry_id):
+        with self._lock:
+            return self._values[entry_id]
+
+    def set(self, entry_id, value):
+        with self._lock:
+            self._values[entry_id] = value
+
+    def remove(self, entry_id):
+        with self._lock:
+            if self._groups[entry_id] >= 0:
+                self._groups[entry_id] = -1
+                self._values[entry_id] = None
+                self._free.append(entry_id)
+
+    # Function to remove every entry of a group, e.g. of a deleted person
+    def remove_group(self, group):
+        with self._lock:
+            group_id = self._group_ids.get(group)
+            if group_id is None:
+                return 0
+            entry_ids = np.flatnonzero(self._groups[:self._size] == group_id)
+            self._groups[entry_ids] = -1
+            for entry_id in entry_ids:
+                self._values[entry_id] = None
+            self._free.extend(int(entry_id) for entry_id in entry_ids)
+            return len(entry_ids)
+
+    # Function to remove every entry whose value matches, e.g. the entries of deleted faces
+    def remove_matching(self, predicate):
+        with self._lock:
+            entry_ids = [entry_id for entry_id in range(self._size)
+                         if self._groups[entry_id] >= 0 and self._values[entry_id] is not None and predicate(self._values[entry_id])]
+        for entry_id in entry_ids:
+            self.remove(entry_id)
+        return len(entry_ids)
+
+    def __len__(self):
+        with self._lock:
+            return self._size - len(self._free)
+
+    # Function to write the index to a .npz file; groups and values are stored as JSON
+    def save(self, path):
+        with self._lock:
+            # Entries still reserved for an image being processed have no value yet and are left out
+            alive = [entry_id for entry_id in np.flatnonzero(self._groups[:self._size] >= 0) if self._values[entry_id] is not None]
+            np.savez_compressed(
+                path,
+                hashes=self._hashes[alive],
+                sharpness=self._sharpness[alive],
+                groups=np.array([json.dumps(self._group_names[self._groups[entry_id]]) for entry_id in alive], dtype=str),
+                values=np.array([json.dumps(self._values[entry_id]) for entry_id in alive], dtype=str)
+            )
+
+    @classmethod
+    def load(cls, path, max_distance=MAX_DISTANCE):
+        data = np.load(path)
+        index = cls(max_distance, capacity=max(len(data['hashes']), 1024))
+        for digest, sharpness, group, value in zip(data['hashes'], data['sharpness'], data['groups'], data['values']):
+            index.add(ImageSignature(int(digest), float(sharpness)), json.loads(value), json.loads(group))
+        return index
+
+    def _grow(self):
+        capacity = 2 * len(self._hashes)
+        self._hashes = np.resize(self._hashes, capacity)
+        self._groups = np.concatenate([self._groups, np.full(capacity - len(self._groups), -1, dtype=np.int32)])
+        self._sharpness = np.resize(self._sharpness, capacity)
+        self._values.extend([None] * (capacity - len(self._values)))
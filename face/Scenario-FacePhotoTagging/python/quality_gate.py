@@ -0,0 +1,109 @@
+# Each Python sample is self-contained, so this module is copied in Scenario-CustomerCheckinManagement, Scenario-FacePhotoTagging and Scenario-PortraitProcessing; keep the copies identical
+import io, threading, time
+import numpy as np
+from PIL import Image, ImageOps
+
+# Longest side of the grayscale copy the statistics are computed on
+ANALYSIS_SIZE = 512
+# Images with a shorter side below this many pixels cannot hold a face large enough for recognition
+MIN_IMAGE_SIDE = 64
+# Variance of the Laplacian below which the image is blurred beyond use
+MIN_SHARPNESS = 15.0
+# Mean brightness (0-255) outside this range means the image is nearly black or white
+MIN_BRIGHTNESS = 16.0
+MAX_BRIGHTNESS = 240.0
+# Fraction of clipped (near black or near white) pixels above which the image is under- or overexposed
+MAX_CLIPPED_FRACTION = 0.95
+
+# Rejects images that are certain to fail the service's quality check before they are uploaded. Cheap statistics are
+# computed with NumPy on a small grayscale copy: the shorter side of the original, the variance of the Laplacian
+# (blur), and the brightness and clipped pixels (exposure). The defaults only catch hopeless images; everything
+# else is left to the service. With enforce=False the gate only measures, so its verdicts can be compared with the
+# service's on every image before it is trusted to reject anything.
+class QualityGate:
+    def __init__(self, min_side=MIN_IMAGE_SIDE, min_sharpness=MIN_SHARPNESS, min_brightness=MIN_BRIGHTNESS, max_brightness=MAX_BRIGHTNESS,
+                 max_clipped_fraction=MAX_CLIPPED_FRACTION, analysis_size=ANALYSIS_SIZE, enforce=True):
+        self.min_side = min_side
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_clipped_fraction = max_clipped_fraction
+        self.analysis_size = analysis_size
+        self.enforce = enforce
+        self.checked = 0
+        self.rejected = {}
+        self.seconds = 0.0
+        # Gate verdict against the service's verdict, for the images that reached the service
+        self.verdicts = {'agreed': 0, 'falseRejects': 0, 'missed': 0}
+        self._lock = threading.Lock()
+
+    # Function to compute the statistics of an image given as bytes or as a PIL image.
+    # original_size is the size before any downscaling, if the image was already downscaled for upload.
+    def measure(self, image, original_size=None):
+        if isinstance(image, (bytes, bytearray)):
+            with Image.open(io.BytesIO(image)) as decoded:
+                if original_size is None:
+                    original_size = decoded.size
+                if decoded.format == 'JPEG':
+                    # Let the JPEG decoder downscale, which is much cheaper than a full decode
+                    decoded.draft('L', (self.analysis_size, self.analysis_size))
+                gray = ImageOps.exif_transpose(decoded).convert('L')
+        else:
+            gray = image.convert('L')
+        if original_size is None:
+            original_size = gray.size
+        gray.thumbnail((self.analysis_size, self.analysis_size))
+        pixels = np.asarray(gray, dtype=np.float32)
+        laplacian = pixels[1:-1, :-2] + pixels[1:-1, 2:] + pixels[:-2, 1:-1] + pixels[2:, 1:-1] - 4 * pixels[1:-1, 1:-1]
+        return {
+            'shortSide': min(original_size),
+            'sharpness': float(laplacian.var()) if laplacian.size else 0.0,
+            'brightness': float(pixels.mean()),
+            'clippedFraction': float(np.count_nonzero((pixels <= 5) | (pixels >= 250)) / pixels.size)
+        }
+
+    # Function to return why the image will fail the quality check, or None if it may pass
+    def reject_reason(self, image, original_size=None):
+        start = time.perf_counter()
+        stats = self.measure(image, original_size)
+        if stats['shortSide'] < self.min_side:
+            reason = 'resolution'
+        elif not self.min_brightness <= stats['brightness'] <= self.max_brightness or stats['clippedFraction'] > self.max_clipped_fraction:
+            reason = 'exposure'
+        elif stats['sharpness'] < self.min_sharpness:
+            reason = 'blur'
+        else:
+            reason = None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.checked += 1
+            self.seconds += elapsed
+            if reason:
+                self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        return reason
+
+    # Function to record the service's verdict on an image the gate checked; gate_rejected is only True here
+    # when the gate does not enforce, since enforced rejections never reach the service
+    def record_service_verdict(self, gate_rejected, service_rejected):
+        with self._lock:
+            if gate_rejected == service_rejected:
+                self.verdicts['agreed'] += 1
+            elif gate_rejected:
+                self.verdicts['falseRejects'] += 1
+            else:
+                self.verdicts['missed'] += 1
+
+    # Function to report how often the gate rejected images and how well it agreed with the service
+    def stats(self):
+        with self._lock:
+            rejected = sum(self.rejected.values())
+            compared = sum(self.verdicts.values())
+            return {
+                'checked': self.checked,
+                'rejected': rejected,
+                'rejectRate': rejected / self.checked if self.checked else 0.0,
+                'rejectedBy': dict(self.rejected),
+                'secondsPerImage': self.seconds / self.checked if self.checked else 0.0,
+                'serviceVerdicts': dict(self.verdicts),
+                'agreement': self.verdicts['agreed'] / compared if compared else None
+            }
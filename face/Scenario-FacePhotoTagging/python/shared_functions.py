@@ -1,24 +1,219 @@
-import requests, time
+import requests, os, time, threading, heapq, itertools, asyncio
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from PIL import Image
 from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import RequestsTransport
 from azure.ai.vision.face import FaceClient
 from azure.ai.vision.face.models import FaceDetectionModel, FaceRecognitionModel, FaceAttributeTypeRecognition04, QualityForRecognition
 
+from detection_cache import DetectionCache
+from image_preprocessing import ImagePreprocessor, passthrough_image
+from perceptual_hash import image_signature, select_distinct
+from rate_limiter import RateLimitedAdapter, RateLimitScheduler, current_priority, request_priority
+
 # Updated API version
 api_version = 'v1.2-preview.1'
 
+# Keep-alive connection pool size of the shared session (number of hosts, connections per host)
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 32
+
+# Every request of the shared session, REST helpers and SDK clients alike, takes a token from this scheduler and is
+# retried on 429/5xx. Set the rate of your pricing tier with rate_limit_scheduler.configure(requests_per_second=...)
+rate_limit_scheduler = RateLimitScheduler()
+
+_session = None
+_client_contexts = {}
+_client_lock = threading.Lock()
+
+# Function to get the process-wide requests.Session shared by all helpers, so connections are reused
+def get_session():
+    global _session
+    with _client_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = RateLimitedAdapter(rate_limit_scheduler, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+        return _session
+
+# Long-lived FaceClient plus the shared pooled session for one key/endpoint pair
+class FaceClientContext:
+    def __init__(self, subscription_key, endpoint, session=None):
+        self.subscription_key = subscription_key
+        self.endpoint = endpoint
+        self.session = session or get_session()
+        # The SDK client sends through the same session, so SDK and REST calls share one connection pool and rate limit.
+        # Status codes are retried by the session, so the SDK retry policy only handles connection errors.
+        self.face_client = FaceClient(
+            endpoint,
+            AzureKeyCredential(subscription_key),
+            transport=RequestsTransport(session=self.session, session_owner=False),
+            retry_status=0
+        )
+
+    def close(self):
+        self.face_client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# Function to get the shared client context for a key/endpoint, created on first use
+def get_client_context(subscription_key, endpoint):
+    key = (subscription_key, endpoint)
+    context = _client_contexts.get(key)
+    if context is None:
+        session = get_session()
+        with _client_lock:
+            context = _client_contexts.get(key)
+            if context is None:
+                context = FaceClientContext(subscription_key, endpoint, session)
+                _client_contexts[key] = context
+    return context
+
+# Function to close the shared clients and session, e.g. when the application shuts down
+def close_client_contexts():
+    global _session, _operation_tracker
+    with _client_lock:
+        contexts = list(_client_contexts.values())
+        _client_contexts.clear()
+        session, _session = _session, None
+        tracker, _operation_tracker = _operation_tracker, None
+    if tracker is not None:
+        tracker.close()
+    for context in contexts:
+        context.close()
+    if session is not None:
+        session.close()
+
+# Detect results are reused for identical image bytes until the faceIds expire; set to None to always call the service
+detection_cache = DetectionCache()
+
+# Images are downscaled and re-encoded before every upload; set to None to upload the original files
+image_preprocessor = ImagePreprocessor()
+# Number of recently preprocessed images kept, so that detect and add of the same file only preprocess once
+PREPROCESSED_CACHE_SIZE = 16
+_preprocessed_images = OrderedDict()
+
+# Function to read and preprocess an image file; returns a PreprocessedImage with the bytes to upload
+def preprocess_image(image_path):
+    stat = os.stat(image_path)
+    key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size, image_preprocessor)
+    with _client_lock:
+        processed = _preprocessed_images.get(key)
+        if processed is not None:
+            _preprocessed_images.move_to_end(key)
+            return processed
+    with open(image_path, 'rb') as image_data:
+        image_content = image_data.read()
+    processed = image_preprocessor.process(image_content) if image_preprocessor else passthrough_image(image_content)
+    with _client_lock:
+        _preprocessed_images[key] = processed
+        while len(_preprocessed_images) > PREPROCESSED_CACHE_SIZE:
+            _preprocessed_images.popitem(last=False)
+    return processed
+
+# Optional local pre-gate for add_person_face(..., quality_filter=True), e.g. QualityGate(). Images it is certain
+# will fail the service's quality check are rejected before any upload; None sends every image to detect.
+quality_gate = None
+
+# Function to run the quality pre-gate on an image file; returns why it will fail the quality check, or None
+def check_image_quality(image_path):
+    if quality_gate is None:
+        return None
+    processed = preprocess_image(image_path)
+    return quality_gate.reject_reason(processed.content, processed.original_size)
+
+# Function to compare the pre-gate verdict on an image with the quality the service detected
+def record_quality_verdict(gate_reason, faces):
+    if quality_gate is not None:
+        service_rejected = len(faces) == 0 or faces[0].face_attributes.quality_for_recognition == QualityForRecognition.LOW
+        quality_gate.record_service_verdict(gate_reason is not None, service_rejected)
+
+# Optional near-duplicate index, e.g. PerceptualHashIndex(). With it, add_person_face skips an image that is a
+# near-duplicate of one already added to the same person (burst shots, re-exports). identify_faces always calls the
+# service, since the faceIds and identities of an earlier photo go stale. None processes every image.
+duplicate_index = None
+_duplicate_lock = threading.Lock()
+_duplicate_pending = {}
+
+# Function to look for a near-duplicate of an image file in a group of duplicate_index. Returns the value stored
+# for the duplicate, or reserves an entry for this image and returns its id, to be completed by finish_duplicate_check.
+# A caller that finds an entry still being processed waits for it.
+def check_duplicate_image(image_path, group):
+    if duplicate_index is None:
+        return None, None
+    signature = image_signature(preprocess_image(image_path).content)
+    while True:
+        with _duplicate_lock:
+            entry_id = duplicate_index.find(signature, group)
+            if entry_id is None:
+                entry_id = duplicate_index.add(signature, None, group)
+                _duplicate_pending[entry_id] = Future()
+                return None, entry_id
+            pending = _duplicate_pending.get(entry_id)
+            if pending is None and duplicate_index.get(entry_id) is None:
+                # An entry reserved for an image that is not being processed here, e.g. in an earlier run, is a miss
+                duplicate_index.remove(entry_id)
+                continue
+        value = pending.result() if pending is not None else duplicate_index.get(entry_id)
+        if value is not None:
+            return value, None
+        # The earlier image failed and its entry is gone; look again
+
+# Function to store the result for a reserved entry, or to drop the entry if value is None
+def finish_duplicate_check(entry_id, value):
+    if entry_id is None:
+        return
+    with _duplicate_lock:
+        if value is None:
+            duplicate_index.remove(entry_id)
+        else:
+            duplicate_index.set(entry_id, value)
+        pending = _duplicate_pending.pop(entry_id)
+    pending.set_result(value)
+
+# Function to pick up to count of the given image files, dropping near-duplicates of sharper images; for example
+# the best few of a burst to enroll for one person. Returns the paths, sharpest first.
+def select_distinct_images(image_paths, count=None):
+    return select_distinct([(image_path, image_signature(preprocess_image(image_path).content)) for image_path in image_paths], count)
+
+# Function to detect faces in image bytes, going through the detection cache
+def detect_faces_in_content(subscription_key, endpoint, image_content, injection_header=None):
+    face_client = get_client_context(subscription_key, endpoint).face_client
+
+    def detect(image_content):
+        return face_client.detect(
+                image_content=image_content,
+                detection_model=FaceDetectionModel.DETECTION03,
+                recognition_model=FaceRecognitionModel.RECOGNITION04,
+                return_face_id=True,
+                return_face_attributes=[FaceAttributeTypeRecognition04.QUALITY_FOR_RECOGNITION],
+                headers={"X-MS-AZSDK-Telemetry": injection_header}
+            )
+
+    if detection_cache is None:
+        return detect(image_content)
+    # faceIds only work on the resource that created them, so the endpoint is part of the key
+    return detection_cache.detect(
+            image_content,
+            detect,
+            endpoint=endpoint,
+            detection_model=FaceDetectionModel.DETECTION03,
+            recognition_model=FaceRecognitionModel.RECOGNITION04,
+            return_face_attributes=[FaceAttributeTypeRecognition04.QUALITY_FOR_RECOGNITION]
+        )
+
+# Function to detect faces in an image file; face rectangles are in the coordinates of the original image
 def detect_faces(subscription_key, endpoint, image_path, injection_header=None):
-    with FaceClient(endpoint, AzureKeyCredential(subscription_key), headers = {"X-MS-AZSDK-Telemetry": injection_header}) as face_client:
-        with open(image_path, 'rb') as image_data:
-            detected_faces = face_client.detect(
-                    image_content=image_data.read(),
-                    detection_model=FaceDetectionModel.DETECTION03,
-                    recognition_model=FaceRecognitionModel.RECOGNITION04,
-                    return_face_id=True,
-                    return_face_attributes=[FaceAttributeTypeRecognition04.QUALITY_FOR_RECOGNITION]
-                )
-        return detected_faces
-    
+    processed = preprocess_image(image_path)
+    faces = detect_faces_in_content(subscription_key, endpoint, processed.content, injection_header)
+    return processed.map_faces_to_original(faces)
+
 def enlarge_bounding_box(face_rectangle, image_width, image_height, enlargement_factor=1.2):
     left = max(0, face_rectangle.left - (face_rectangle.width * (enlargement_factor - 1) / 2))
     top = max(0, face_rectangle.top - (face_rectangle.height * (enlargement_factor - 1) / 2))
@@ -30,27 +225,221 @@ def get_image_dimensions(image_path):
     with Image.open(image_path) as img:
         return img.width, img.height
     
-def check_operation_status(subscription_key, operation_location):
-    headers = {
-        'Ocp-Apim-Subscription-Key': subscription_key,
-        'X-MS-AZSDK-Telemetry': 'sample=enroll-faces-person-directory'
-    }
-    
-    while True:
-        response = requests.get(operation_location, headers=headers)
-        response.raise_for_status()
-        
-        status = response.json()
-        if status.get('status') in ['succeeded', 'failed']:
-            if status.get('status') == 'succeeded':
-                return True
+# Tracks many long-running operations together on one background thread.
+# Each Operation-Location is polled with adaptive backoff (sub-second at first), Retry-After is honored
+# and a deadline is enforced. track() returns a Future resolving to True (succeeded) or False (failed).
+class OperationTracker:
+    def __init__(self, initial_interval=0.25, max_interval=5.0, backoff=1.5, timeout=300, max_workers=16):
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='operation-poll')
+        self._schedule = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='operation-tracker', daemon=True)
+        self._thread.start()
+
+    # Function to start tracking an operation; returns a concurrent.futures.Future
+    def track(self, subscription_key, operation_location, injection_header=None, timeout=None):
+        future = Future()
+        headers = {
+            'Ocp-Apim-Subscription-Key': subscription_key,
+            'X-MS-AZSDK-Telemetry': injection_header
+        }
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        # Polls run on the tracker threads with the priority of the caller that started the operation
+        entry = [operation_location, headers, deadline, self.initial_interval, future, current_priority()]
+        # Short operations are often done by the first look, so poll right away before backing off
+        self._schedule_poll(entry, 0)
+        return future
+
+    # Function to track an operation from asyncio code; returns an awaitable
+    def track_async(self, subscription_key, operation_location, injection_header=None, timeout=None):
+        return asyncio.wrap_future(self.track(subscription_key, operation_location, injection_header, timeout))
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def _schedule_poll(self, entry, delay):
+        with self._condition:
+            if self._closed:
+                entry[4].set_exception(RuntimeError("Operation tracker is closed."))
+                return
+            heapq.heappush(self._schedule, (time.monotonic() + delay, next(self._counter), entry))
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and (not self._schedule or self._schedule[0][0] > time.monotonic()):
+                    self._condition.wait(self._schedule[0][0] - time.monotonic() if self._schedule else None)
+                if self._closed:
+                    pending = [entry for _, _, entry in self._schedule]
+                    self._schedule.clear()
+                    break
+                _, _, entry = heapq.heappop(self._schedule)
+            self._executor.submit(self._poll, entry)
+        for entry in pending:
+            entry[4].set_exception(RuntimeError("Operation tracker is closed."))
+
+    def _poll(self, entry):
+        operation_location, headers, deadline, interval, future, priority = entry
+        try:
+            with request_priority(priority):
+                response = get_session().get(operation_location, headers=headers)
+            if response.status_code != 429:
+                response.raise_for_status()
+                status = response.json().get('status')
+                if status in ['succeeded', 'failed']:
+                    future.set_result(status == 'succeeded')
+                    return
+        except Exception as e:
+            future.set_exception(e)
+            return
+
+        delay = interval
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            future.set_exception(TimeoutError(f"Operation did not complete before the deadline: {operation_location}"))
+            return
+        # Always take one last look at the deadline rather than giving up early
+        delay = min(delay, remaining)
+        entry[3] = min(interval * self.backoff, self.max_interval)
+        self._schedule_poll(entry, delay)
+
+_operation_tracker = None
+
+# Function to get the process-wide operation tracker used by all helpers
+def get_operation_tracker():
+    global _operation_tracker
+    with _client_lock:
+        if _operation_tracker is None:
+            _operation_tracker = OperationTracker()
+        return _operation_tracker
+
+# Function to turn a tracked operation into a Future of value (or None if the operation failed)
+def _operation_result(tracked, value):
+    result = Future()
+    def on_done(future):
+        if future.exception() is not None:
+            result.set_exception(future.exception())
+        else:
+            result.set_result(value if future.result() else None)
+    tracked.add_done_callback(on_done)
+    return result
+
+# Function to wait for a long-running operation; returns True if it succeeded
+def check_operation_status(subscription_key, operation_location, timeout=None):
+    injection_header = 'sample=enroll-faces-person-directory'
+    future = get_operation_tracker().track(subscription_key, operation_location, injection_header, timeout)
+    try:
+        return future.result()
+    except TimeoutError:
+        print(f"Timed out waiting for operation: {operation_location}")
+        return False
+
+# Cache of person details (name, userData) by personId, with a time-to-live and least-recently-used eviction
+class PersonCache:
+    def __init__(self, max_size=10000, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, person_id):
+        with self._lock:
+            entry = self._entries.get(person_id)
+            if entry is None:
+                return None
+            expires, person = entry
+            if expires < time.monotonic():
+                del self._entries[person_id]
+                return None
+            self._entries.move_to_end(person_id)
+            return person
+
+    def put(self, person_id, person):
+        with self._lock:
+            self._entries[person_id] = (time.monotonic() + self.ttl, person)
+            self._entries.move_to_end(person_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, person_id=None):
+        with self._lock:
+            if person_id is None:
+                self._entries.clear()
             else:
-                return False
-        
-        time.sleep(5) 
+                self._entries.pop(person_id, None)
+
+person_cache = PersonCache()
+
+# Function to get the details of a person, served from the cache when possible
+def get_person(subscription_key, endpoint, person_id, injection_header=None):
+    person = person_cache.get(person_id)
+    if person is None:
+        person_details_url = f"{endpoint}/face/{api_version}/persons/{person_id}"
+        headers = {
+            'Ocp-Apim-Subscription-Key': subscription_key,
+            'X-MS-AZSDK-Telemetry': injection_header
+        }
+        response = get_session().get(person_details_url, headers=headers)
+        response.raise_for_status()
+        person = response.json()
+        person_cache.put(person_id, person)
+    return person
+
+# Function to get the details of many persons at once; cache misses are fetched concurrently
+def prefetch_persons(subscription_key, endpoint, person_ids, injection_header=None, max_workers=8):
+    persons = {}
+    missing = []
+    for person_id in dict.fromkeys(person_ids):
+        person = person_cache.get(person_id)
+        if person is None:
+            missing.append(person_id)
+        else:
+            persons[person_id] = person
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+            fetched = executor.map(lambda person_id: get_person(subscription_key, endpoint, person_id, injection_header), missing)
+            persons.update(zip(missing, fetched))
+    return persons
 
 # Function to add face to a person    
 def add_person_face(subscription_key, endpoint, image_path, person_id, injection_header=None, quality_filter=False):
+    duplicate, entry_id = check_duplicate_image(image_path, f"face:{person_id}")
+    if duplicate is not None:
+        print("Near-duplicate of a face already added to the person. Skipping.")
+        return duplicate
+    persisted_face_id = None
+    try:
+        gate_reason = check_image_quality(image_path) if quality_filter else None
+        if gate_reason and quality_gate.enforce:
+            print(f"Image quality is too low ({gate_reason}). Please use a different image.")
+            return None
+        faces = detect_faces(subscription_key, endpoint, image_path, injection_header)
+        if quality_filter:
+            record_quality_verdict(gate_reason, faces)
+        persisted_face_id = add_detected_person_face(subscription_key, endpoint, image_path, person_id, faces, injection_header, quality_filter)
+        return persisted_face_id
+    finally:
+        finish_duplicate_check(entry_id, persisted_face_id)
+
+# Function to add face to a person using the result of an earlier detect_faces call
+def add_detected_person_face(subscription_key, endpoint, image_path, person_id, faces, injection_header=None, quality_filter=False):
     headers = {
         'Ocp-Apim-Subscription-Key': subscription_key,
         'Content-Type': 'application/octet-stream',
@@ -59,8 +448,7 @@ def add_person_face(subscription_key, endpoint, image_path, person_id, injection
     params = {
         'detectionModel': 'detection_03'
     }
-        
-    faces = detect_faces(subscription_key, endpoint, image_path, injection_header)
+
     if len(faces) == 0:
         print("No faces detected in the image.")
         return None
@@ -69,33 +457,35 @@ def add_person_face(subscription_key, endpoint, image_path, person_id, injection
             print("Face quality is too low. Please use a different image.")
             return None
 
+    # Upload the same preprocessed image that was used for detection
+    processed = preprocess_image(image_path)
     if len(faces) > 1:
-        image_width, image_height = get_image_dimensions(image_path)
+        image_width, image_height = processed.original_size
         # If multiple faces are detected, use the first face (largest face) for adding to the target
         print(f"Multiple faces detected. Using the first face (largest face) for adding to the target.")
         face_rectangle = enlarge_bounding_box(faces[0].face_rectangle, image_width, image_height)
+        face_rectangle = processed.to_processed_rectangle(face_rectangle)
         params['targetFace'] = f"{face_rectangle['left']},{face_rectangle['top']},{face_rectangle['width']},{face_rectangle['height']}"
     else:
         print(f"One face detected. Adding to the target.")
 
     add_face_url = endpoint + f"/face/{api_version}/persons/{person_id}/recognitionModels/recognition_04/persistedFaces"
-    with open(image_path, 'rb') as image_data:
-        response = requests.post(add_face_url, params=params, headers=headers, data=image_data)
-        if response.status_code == 202:
-            operation_location = response.headers.get('Operation-Location')
-            if operation_location:
-                if check_operation_status(subscription_key, operation_location):
-                    persisted_face_id = response.json()['persistedFaceId']
-                    return persisted_face_id
-                else:
-                    print("Failed to add face.")
-                    return None
+    response = get_session().post(add_face_url, params=params, headers=headers, data=processed.content)
+    if response.status_code == 202:
+        operation_location = response.headers.get('Operation-Location')
+        if operation_location:
+            if check_operation_status(subscription_key, operation_location):
+                persisted_face_id = response.json()['persistedFaceId']
+                return persisted_face_id
             else:
-                print("No Operation-Location header found in the response.")
+                print("Failed to add face.")
                 return None
         else:
-            print(f"Failed to add face: {response.json()}")
+            print("No Operation-Location header found in the response.")
             return None
+    else:
+        print(f"Failed to add face: {response.json()}")
+        return None
 
 # Function to delete a face from a person
 def delete_person_face(subscription_key, endpoint, person_id, face_id, injection_header=None):
@@ -105,13 +495,15 @@ def delete_person_face(subscription_key, endpoint, person_id, face_id, injection
         'X-MS-AZSDK-Telemetry': injection_header
     }
     try:
-        response = requests.delete(delete_face_url, headers=headers)
+        response = get_session().delete(delete_face_url, headers=headers)
         response.raise_for_status()
 
         if response.status_code == 202:
             operation_location = response.headers.get('Operation-Location')
             if operation_location:
                 if check_operation_status(subscription_key, operation_location):
+                    if duplicate_index is not None:
+                        duplicate_index.remove_matching(lambda value: value == face_id)
                     return True
                 else:
                     print("Failed to delete face.")
@@ -138,7 +530,7 @@ def create_person(subscription_key, endpoint, person_name, injection_header=None
         "name": person_name,
     }
     try:
-        response = requests.post(create_person_url, headers=headers, json=data)
+        response = get_session().post(create_person_url, headers=headers, json=data)
         response.raise_for_status()
 
         if response.status_code == 202:
@@ -146,6 +538,7 @@ def create_person(subscription_key, endpoint, person_name, injection_header=None
             if operation_location:
                 if check_operation_status(subscription_key, operation_location):
                     person_id = response.json()['personId']
+                    person_cache.put(person_id, {'personId': person_id, 'name': person_name})
                     return person_id
                 else:
                     print("Failed to create person.")
@@ -160,6 +553,43 @@ def create_person(subscription_key, endpoint, person_name, injection_header=None
         print(f"Request failed: {e}")
         return None
 
+# Function to start creating a person without waiting for the operation; returns a Future resolving to the personId
+def begin_create_person(subscription_key, endpoint, person_name, injection_header=None, timeout=None):
+    create_person_url = f"{endpoint}/face/{api_version}/persons"
+    headers = {
+        'Ocp-Apim-Subscription-Key': subscription_key,
+        'Content-Type': 'application/json',
+        'X-MS-AZSDK-Telemetry': injection_header
+    }
+    response = get_session().post(create_person_url, headers=headers, json={"name": person_name})
+    response.raise_for_status()
+    operation_location = response.headers.get('Operation-Location')
+    if response.status_code != 202 or not operation_location:
+        raise RuntimeError(f"Failed to create person: {response.text}")
+    tracked = get_operation_tracker().track(subscription_key, operation_location, injection_header, timeout)
+    return _operation_result(tracked, response.json()['personId'])
+
+# Function to create many persons at once; the operations are polled together, so the batch takes about as long as the slowest one
+def create_persons(subscription_key, endpoint, person_names, injection_header=None, timeout=None):
+    futures = []
+    for person_name in person_names:
+        try:
+            futures.append(begin_create_person(subscription_key, endpoint, person_name, injection_header, timeout))
+        except (requests.exceptions.RequestException, RuntimeError) as e:
+            print(f"Request failed: {e}")
+            futures.append(None)
+    person_ids = []
+    for person_name, future in zip(person_names, futures):
+        try:
+            person_id = future.result() if future else None
+            if person_id:
+                person_cache.put(person_id, {'personId': person_id, 'name': person_name})
+            person_ids.append(person_id)
+        except Exception as e:
+            print(f"Failed to create person: {e}")
+            person_ids.append(None)
+    return person_ids
+
 # Function to delete a person
 def delete_person(subscription_key, endpoint, person_id, injection_header=None):
     delete_person_url = f"{endpoint}/face/{api_version}/persons/{person_id}"
@@ -167,14 +597,17 @@ def delete_person(subscription_key, endpoint, person_id, injection_header=None):
         'Ocp-Apim-Subscription-Key': subscription_key,
         'X-MS-AZSDK-Telemetry': injection_header
     }
+    person_cache.invalidate(person_id)
     try:
-        response = requests.delete(delete_person_url, headers=headers)
+        response = get_session().delete(delete_person_url, headers=headers)
         response.raise_for_status()
 
         if response.status_code == 202:
             operation_location = response.headers.get('Operation-Location')
             if operation_location:
                 if check_operation_status(subscription_key, operation_location):
+                    if duplicate_index is not None:
+                        duplicate_index.remove_group(f"face:{person_id}")
                     return True
                 else:
                     print("Failed to delete person.")
@@ -210,7 +643,7 @@ def identify_faces(subscription_key, endpoint, image_path, person_ids=None, dyna
             'bbox': face['faceRectangle']
         })
     
-    identify_url = endpoint + "/face/{api_version}/identify"
+    identify_url = endpoint + f"/face/{api_version}/identify"
     headers['Content-Type'] = 'application/json'
     body = {
         'faceIds': face_ids,
@@ -225,10 +658,14 @@ def identify_faces(subscription_key, endpoint, image_path, person_ids=None, dyna
         print("Person IDs or Dynamic Person Group ID must be provided.")
         return None
 
-    response = requests.post(identify_url, headers=headers, json=body)
+    response = get_session().post(identify_url, headers=headers, json=body)
     response.raise_for_status()
     results = response.json()
 
+    # Look up all identified person names at once; only cache misses go to the service, concurrently
+    candidate_person_ids = [result['candidates'][0]['personId'] for result in results if len(result['candidates']) > 0]
+    persons = prefetch_persons(subscription_key, endpoint, candidate_person_ids, injection_header)
+
     identified_faces = []
     for i, result in enumerate(results):
         face_info = face_details[i]
@@ -237,15 +674,9 @@ def identify_faces(subscription_key, endpoint, image_path, person_ids=None, dyna
             person_id = candidate['personId']
             confidence = candidate['confidence']
 
-            # Retrieve person details to get the name
-            person_details_url = f"{endpoint}/face/{api_version}/persons/{person_id}"
-            person_response = requests.get(person_details_url, headers=headers)
-            person_response.raise_for_status()
-            person_data = person_response.json()
-
             face_info['personId'] = person_id
             face_info['confidence'] = confidence
-            face_info['personName'] = person_data['name']
+            face_info['personName'] = persons[person_id]['name']
         else:
             face_info['personId'] = None
             face_info['confidence'] = None
@@ -268,7 +699,7 @@ def create_dynamic_person_group(subscription_key, endpoint, dynamic_person_group
         "addPersonIds": person_ids
     }
     try:
-        response = requests.put(create_DPG_url, headers=headers, json=body)
+        response = get_session().put(create_DPG_url, headers=headers, json=body)
         response.raise_for_status()
 
         if response.status_code == 202:
@@ -297,7 +728,7 @@ def delete_dynamic_person_group(subscription_key, endpoint, dynamic_person_group
         'X-MS-AZSDK-Telemetry': injection_header
     }
     try:
-        response = requests.delete(delete_DPG_url, headers=headers)
+        response = get_session().delete(delete_DPG_url, headers=headers)
         response.raise_for_status()
 
         if response.status_code == 202:
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+# Microbenchmark of BiRefNet on CPU: time and peak memory per stage (preprocess, inference, postprocess),
+# for the original allocation-heavy pre/postprocessing and the buffer-reusing one in birefnet.py,
+# followed by the throughput of predict against predict_batch for several batch sizes.
+# Run it next to BiRefNet-portrait-epoch_150.onnx:
+#
+#   python3 benchmark_birefnet.py --image ../portrait.png --runs 10 --images 16 --batch-sizes 1,2,4,8
+
+import argparse
+import statistics
+import time
+import tracemalloc
+import numpy as np
+import PIL
+from PIL import Image
+
+from birefnet import BiRefNet
+
+def legacy_preprocess(image):
+    normalized = image.convert("RGB").resize((1024, 1024), PIL.Image.Resampling.LANCZOS)
+    normalized = np.array(normalized).astype(np.float32)
+    normalized = normalized / np.max(normalized)
+    normalized[:, :, 0] = (normalized[:, :, 0] - 0.485) / 0.229
+    normalized[:, :, 1] = (normalized[:, :, 1] - 0.456) / 0.224
+    normalized[:, :, 2] = (normalized[:, :, 2] - 0.406) / 0.225
+    return np.expand_dims(normalized.transpose((2, 0, 1)), 0)
+
+def legacy_postprocess(prediction, size):
+    pred = 1 / (1 + np.exp(-prediction))
+    ma = np.max(pred)
+    mi = np.min(pred)
+    pred = (pred - mi) / (ma - mi)
+    matting = PIL.Image.fromarray((pred * 255).astype(np.uint8), mode="L")
+    return matting.resize(size, PIL.Image.Resampling.LANCZOS)
+
+# Function to check that mattings returned earlier are not changed by later calls, which reuse the buffers.
+# The image is used at the model resolution, where the matting needs no resize.
+def check_independent_results(model, image):
+    image = image.convert("RGB").resize((model.input_size, model.input_size))
+    other = image.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    first = model.predict(image)
+    expected = np.array(first)
+    model.predict(other)
+    if not np.array_equal(np.asarray(first), expected):
+        raise RuntimeError("predict changed the matting returned by the previous call")
+    print("Consecutive predict calls return independent mattings")
+
+# Function to check that predict_batch returns the mattings of predict, each for its own image
+def check_batch_results(model, image):
+    image = image.convert("RGB").resize((model.input_size, model.input_size))
+    images = [image, image.transpose(Image.Transpose.FLIP_LEFT_RIGHT), image.transpose(Image.Transpose.FLIP_TOP_BOTTOM)]
+    expected = [np.asarray(model.predict(item), dtype=np.int16) for item in images]
+    batched = [np.asarray(matting, dtype=np.int16) for matting in model.predict_batch(images, len(images))]
+    # batched inference may round differently, but never by more than one level
+    difference = max(int(np.abs(matting - single).max()) for matting, single in zip(batched, expected))
+    if difference > 1:
+        raise RuntimeError(f"predict_batch differs from predict by up to {difference} levels")
+    print(f"Max difference of mattings between predict_batch and predict: {difference}")
+
+# Function to check that refine, which mattes full-size tiles of a large crop in one letterboxed batch, gets the
+# matting of each tile rather than one matting for all of them
+def check_refine_tiles(model, image):
+    size = model.input_size
+    image = image.convert("RGB").resize((size, size))
+    tiles = [image, image.transpose(Image.Transpose.FLIP_LEFT_RIGHT), image.transpose(Image.Transpose.FLIP_TOP_BOTTOM), image.transpose(Image.Transpose.ROTATE_180)]
+    mosaic = Image.new("RGB", (2 * size, 2 * size))
+    boxes = [(0, 0, size, size), (size, 0, 2 * size, size), (0, size, size, 2 * size), (size, size, 2 * size, 2 * size)]
+    for tile, box in zip(tiles, boxes):
+        mosaic.paste(tile, box[:2])
+    refined = model.predict_batch([mosaic.crop(box) for box in boxes], letterbox=True)
+    difference = max(int(np.abs(np.asarray(matting, dtype=np.int16) - np.asarray(model.predict(tile), dtype=np.int16)).max())
+                     for matting, tile in zip(refined, tiles))
+    if difference > 1:
+        raise RuntimeError(f"refine tiles differ from the mattings of their images by up to {difference} levels")
+    print(f"Max difference of refine tiles from the mattings of their images: {difference}")
+
+def measure(name, runs, func):
+    func()
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<28} median={statistics.median(times):8.2f} ms  min={min(times):8.2f} ms  peak={peak / 2**20:7.1f} MiB")
+
+def throughput(name, func, count):
+    func()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {count / elapsed:8.2f} images/s")
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-stage time and peak memory of BiRefNet on CPU.')
+    parser.add_argument('--image', default='../portrait.png')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--images', type=int, default=16)
+    parser.add_argument('--batch-sizes', default='1,2,4,8')
+    args = parser.parse_args()
+
+    image = Image.open(args.image)
+    image.load()
+    start = time.perf_counter()
+    model = BiRefNet()
+    cold = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    BiRefNet()
+    warm = (time.perf_counter() - start) * 1000
+
+    print(f"Model load: first instance {cold:.1f} ms, later instances {warm:.1f} ms (shared session)")
+    print(f"Image {args.image} {image.size[0]}x{image.size[1]}, {args.runs} runs")
+    measure('preprocess (original)', args.runs, lambda: legacy_preprocess(image))
+    measure('preprocess (buffered)', args.runs, lambda: model.preprocess(image))
+    normalized = model.preprocess(image)
+    measure('inference', args.runs, lambda: model.session.run(None, {"input_image": normalized}))
+    prediction = model.session.run(None, {"input_image": normalized})[0][0, 0]
+    measure('postprocess (original)', args.runs, lambda: legacy_postprocess(prediction, image.size))
+    measure('postprocess (buffered)', args.runs, lambda: model.postprocess(prediction, image.size))
+
+    difference = np.abs(legacy_preprocess(image) - model.preprocess(image)).max()
+    print(f"Max difference of normalized input between implementations: {difference:.2e}")
+    check_independent_results(model, image)
+    check_batch_results(model, image)
+    check_refine_tiles(model, image)
+
+    images = [image] * args.images
+    if model.fixed_batch_size:
+        print(f"The model has a fixed batch size of {model.fixed_batch_size}; predict_batch feeds it chunks of that size")
+    throughput('predict', lambda: [model.predict(item) for item in images], len(images))
+    for batch_size in [int(value) for value in args.batch_sizes.split(',')]:
+        throughput(f'predict_batch({batch_size})', lambda: model.predict_batch(images, batch_size), len(images))
+
+if __name__ == '__main__':
+    main()
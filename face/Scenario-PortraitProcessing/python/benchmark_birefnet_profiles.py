@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+# Accuracy against latency of the BiRefNet inference profiles on CPU. Every profile's mattings are compared
+# with those of the full-resolution fp32 profile: IoU of the foreground masks (matting >= 50%) and mean
+# absolute error of the matting values (0 to 1). Run it next to BiRefNet-portrait-epoch_150.onnx:
+#
+#   python3 benchmark_birefnet_profiles.py --images ../portrait.png --runs 5
+
+import argparse
+import statistics
+import time
+import numpy as np
+from PIL import Image
+
+from birefnet import PROFILES, BiRefNet
+
+BASELINE_PROFILE = "fp32"
+
+def compare(matting, baseline):
+    matting = np.asarray(matting, dtype=np.float32) / 255
+    baseline = np.asarray(baseline, dtype=np.float32) / 255
+    foreground = matting >= 0.5
+    baseline_foreground = baseline >= 0.5
+    union = np.logical_or(foreground, baseline_foreground).sum()
+    iou = np.logical_and(foreground, baseline_foreground).sum() / union if union else 1.0
+    return iou, float(np.abs(matting - baseline).mean())
+
+def run_profile(profile, images, runs):
+    start = time.perf_counter()
+    model = BiRefNet(profile=profile)
+    load = time.perf_counter() - start
+    mattings = [model.predict(image) for image in images]
+    times = []
+    for _ in range(runs):
+        for image in images:
+            start = time.perf_counter()
+            model.predict(image)
+            times.append((time.perf_counter() - start) * 1000)
+    return load, times, mattings
+
+def main():
+    parser = argparse.ArgumentParser(description='Accuracy against latency of the BiRefNet inference profiles.')
+    parser.add_argument('--images', nargs='+', default=['../portrait.png'])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--profiles', default=','.join(PROFILES))
+    args = parser.parse_args()
+
+    images = []
+    for path in args.images:
+        image = Image.open(path)
+        image.load()
+        images.append(image)
+    profiles = [BASELINE_PROFILE] + [profile for profile in args.profiles.split(',') if profile != BASELINE_PROFILE]
+
+    print(f"{len(images)} images, {args.runs} runs, compared with profile {BASELINE_PROFILE}")
+    baseline = None
+    for profile in profiles:
+        try:
+            load, times, mattings = run_profile(profile, images, args.runs)
+        except ValueError as e:
+            print(f"{profile:<10} skipped: {e}")
+            continue
+        if baseline is None:
+            baseline = mattings
+        scores = [compare(matting, expected) for matting, expected in zip(mattings, baseline)]
+        iou = statistics.mean(score[0] for score in scores)
+        mae = statistics.mean(score[1] for score in scores)
+        print(f"{profile:<10} load={load:7.2f} s  median={statistics.median(times):8.2f} ms  "
+              f"p95={np.percentile(times, 95):8.2f} ms  IoU={iou:.4f}  MAE={mae:.4f}")
+
+if __name__ == '__main__':
+    main()
@@ -1,33 +1,252 @@
 # -*- coding: utf-8 -*-
 
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import onnxruntime as ort
-import PIL
+import PIL.Image
+
+MODEL_PATH = "BiRefNet-portrait-epoch_150.onnx"
+# Directory for graph-optimized copies of the model, so that later processes skip optimization; None disables it
+OPTIMIZED_MODEL_DIR = "optimized_models"
+
+# Inference profiles: the model input resolution and whether to run the dynamically int8-quantized model.
+# Mattings are always upsampled back to the size of the input image.
+PROFILES = {
+    "fp32": {"input_size": 1024, "quantized": False},
+    "int8": {"input_size": 1024, "quantized": True},
+    "fp32-512": {"input_size": 512, "quantized": False},
+    "int8-512": {"input_size": 512, "quantized": True}
+}
+
+# Crops smaller than this on their longest side are not matted
+MIN_CROP_SIZE = 64
+# Matting values (0-255) strictly between these bounds are boundary pixels that refinement recomputes
+REFINE_BAND = (8, 247)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_quantize_lock = threading.Lock()
+
+def get_session(model_path=MODEL_PATH, intra_op_num_threads=0, inter_op_num_threads=0,
+                graph_optimization_level=ort.GraphOptimizationLevel.ORT_ENABLE_ALL, optimized_model_dir=OPTIMIZED_MODEL_DIR):
+    # Sessions are shared by the whole process and created on first use; InferenceSession.run is thread-safe.
+    # Thread counts of 0 leave the choice to ONNX Runtime.
+    key = (os.path.abspath(model_path), intra_op_num_threads, inter_op_num_threads, graph_optimization_level, optimized_model_dir)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = _create_session(*key)
+        return session
+
+def _create_session(model_path, intra_op_num_threads, inter_op_num_threads, graph_optimization_level, optimized_model_dir):
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_num_threads
+    options.inter_op_num_threads = inter_op_num_threads
+    if inter_op_num_threads > 1:
+        options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    options.graph_optimization_level = graph_optimization_level
+    if not optimized_model_dir:
+        return ort.InferenceSession(model_path, options)
+
+    # The saved model is optimized at most up to ORT_ENABLE_EXTENDED, whose output does not depend on the hardware
+    # or execution provider. The layout optimizations of ORT_ENABLE_ALL are hardware-specific, so they are applied
+    # again whenever the saved model is loaded. The file is specific to the source file, the saved level and the
+    # ONNX Runtime version.
+    saved_level = min(graph_optimization_level, ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED, key=int)
+    stat = os.stat(model_path)
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    optimized_path = os.path.join(optimized_model_dir,
+        f"{name}-{int(saved_level)}-{ort.__version__}-{stat.st_size}-{stat.st_mtime_ns}.onnx")
+    if not os.path.exists(optimized_path):
+        # Write to a temporary file first so that other processes never load a partial model
+        os.makedirs(optimized_model_dir, exist_ok=True)
+        temp_path = f"{optimized_path}.{os.getpid()}.tmp"
+        save_options = ort.SessionOptions()
+        save_options.graph_optimization_level = saved_level
+        save_options.optimized_model_filepath = temp_path
+        if saved_level == graph_optimization_level:
+            # The session that saves the model is the one asked for
+            save_options.intra_op_num_threads = intra_op_num_threads
+            save_options.inter_op_num_threads = inter_op_num_threads
+            save_options.execution_mode = options.execution_mode
+            session = ort.InferenceSession(model_path, save_options)
+            os.replace(temp_path, optimized_path)
+            return session
+        ort.InferenceSession(model_path, save_options)
+        os.replace(temp_path, optimized_path)
+    return ort.InferenceSession(optimized_path, options)
+
+def quantize_model(model_path=MODEL_PATH, output_dir=OPTIMIZED_MODEL_DIR):
+    # Generate a copy of the model with int8 weights and dynamically quantized activations, once per source file.
+    # Only MatMul nodes are quantized: the ConvInteger kernels are usually slower than float Conv on CPU.
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    stat = os.stat(model_path)
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    output_dir = output_dir or os.path.dirname(os.path.abspath(model_path))
+    quantized_path = os.path.join(output_dir, f"{name}-int8-{stat.st_size}-{stat.st_mtime_ns}.onnx")
+    with _quantize_lock:
+        if not os.path.exists(quantized_path):
+            os.makedirs(output_dir, exist_ok=True)
+            temp_path = f"{quantized_path}.{os.getpid()}.tmp"
+            quantize_dynamic(model_path, temp_path, op_types_to_quantize=["MatMul"], weight_type=QuantType.QInt8)
+            os.replace(temp_path, quantized_path)
+    return quantized_path
 
 class BiRefNet:
 
-    def __init__(self):
-        self.session = ort.InferenceSession("BiRefNet-portrait-epoch_150.onnx")
+    MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32).reshape(3, 1, 1)
+    STD = np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape(3, 1, 1)
+
+    def __init__(self, model_path=MODEL_PATH, profile="fp32", **session_options):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile {profile!r}, expected one of {', '.join(PROFILES)}")
+        self.profile = profile
+        self.input_size = PROFILES[profile]["input_size"]
+        if PROFILES[profile]["quantized"]:
+            model_path = quantize_model(model_path, session_options.get("optimized_model_dir", OPTIMIZED_MODEL_DIR))
+        # the session comes from the process-wide cache, so only the first instance pays for loading the model
+        self.session = get_session(model_path, **session_options)
+        height, width = self.session.get_inputs()[0].shape[2:]
+        if (isinstance(height, int) and height != self.input_size) or (isinstance(width, int) and width != self.input_size):
+            raise ValueError(f"The model was exported for {width}x{height} input and cannot run profile {profile!r}; "
+                             f"re-export it with dynamic height and width to use other resolutions")
+        # A symbolic batch dimension means the exported model accepts any batch size, otherwise it is fixed
+        batch = self.session.get_inputs()[0].shape[0]
+        self.fixed_batch_size = batch if isinstance(batch, int) and batch > 0 else None
+        # Buffers reused by every predict call, so that pre/postprocessing allocates no full-size arrays
+        size = self.input_size
+        self._input = np.zeros((self.fixed_batch_size or 1, 3, size, size), dtype=np.float32)
+        self._prediction = np.empty((size, size), dtype=np.float32)
+        self._matting = np.empty((size, size), dtype=np.uint8)
+        self._lock = threading.Lock()
+
+    def normalize(self, image: PIL.Image.Image, out: np.ndarray, letterbox=False):
+        # normalize input to (c=3, h=input_size, w=input_size) inside the given buffer and return the
+        # (left, top, width, height) box of the image in it; letterboxing keeps the aspect ratio and pads around
+        width, height = self.input_size, self.input_size
+        left, top = 0, 0
+        if letterbox:
+            ratio = self.input_size / max(image.size)
+            width = max(1, min(self.input_size, round(image.size[0] * ratio)))
+            height = max(1, min(self.input_size, round(image.size[1] * ratio)))
+            left = (self.input_size - width) // 2
+            top = (self.input_size - height) // 2
+            # zero is the mean color after normalization
+            out.fill(0)
+        image = image.convert("RGB")
+        resized = image if image.size == (width, height) else image.resize((width, height), PIL.Image.Resampling.LANCZOS)
+        pixels = np.asarray(resized)
+        # scale by the image maximum and apply (x - mean) / std as one fused multiply-add, in place
+        scale = 1.0 / (max(int(pixels.max()), 1) * self.STD)
+        bias = self.MEAN / self.STD
+        region = out[:, top:top + height, left:left + width]
+        np.copyto(region, pixels.transpose((2, 0, 1)))
+        region *= scale
+        region -= bias
+        return left, top, width, height
+
+    def preprocess(self, image: PIL.Image.Image) -> np.ndarray:
+        # normalize input to (1, c=3, h=input_size, w=input_size) inside the preallocated input buffer
+        # (a model with a fixed batch size gets the image in its first slot)
+        self.normalize(image, self._input[0])
+        return self._input[:self.fixed_batch_size or 1]
+
+    def postprocess(self, prediction: np.ndarray, size, box=None) -> PIL.Image.Image:
+        # normalize the (h=input_size, w=input_size) output prediction with an in-place sigmoid and min/max scaling,
+        # keeping only the box of the image if it was letterboxed
+        if box is not None:
+            left, top, width, height = box
+            prediction = prediction[top:top + height, left:left + width]
+        pred = self._prediction[:prediction.shape[0], :prediction.shape[1]]
+        np.negative(prediction, out=pred)
+        np.exp(pred, out=pred)
+        pred += 1
+        np.reciprocal(pred, out=pred)
+        mi = pred.min()
+        ma = pred.max()
+        pred -= mi
+        pred *= 255 / (ma - mi) if ma > mi else 0
+        matting = self._matting[:pred.shape[0], :pred.shape[1]]
+        np.copyto(matting, pred, casting="unsafe")
+
+        # convert and resize the matting back to PIL object; the returned image never shares the reused buffer,
+        # which the next call overwrites
+        matting = PIL.Image.fromarray(matting, mode="L")
+        return matting.copy() if matting.size == tuple(size) else matting.resize(size, PIL.Image.Resampling.LANCZOS)
 
     def predict(self, image: PIL.Image.Image) -> PIL.Image.Image:
-        # normalize input to (1, c=3, h=1024, w=1024)
-        normalized = image.convert("RGB").resize((1024, 1024), PIL.Image.Resampling.LANCZOS)
-        normalized = np.array(normalized).astype(np.float32)
-        normalized = normalized / np.max(normalized)
-        normalized[:, :, 0] = (normalized[:, :, 0] - 0.485) / 0.229
-        normalized[:, :, 1] = (normalized[:, :, 1] - 0.456) / 0.224
-        normalized[:, :, 2] = (normalized[:, :, 2] - 0.406) / 0.225
-        normalized = np.expand_dims(normalized.transpose((2, 0, 1)), 0)
-
-        # feed into the model
-        outputs = self.session.run(None, {"input_image": normalized})
-
-        # normalize the (1, 1, h=1024, w=1024) output prediction
-        pred = 1 / (1 + np.exp(-outputs[0][0, 0, :, :]))
-        ma = np.max(pred)
-        mi = np.min(pred)
-        pred = (pred - mi) / (ma - mi)
-
-        # convert and resize the matting back to PIL object
-        matting = PIL.Image.fromarray((pred * 255).astype(np.uint8), mode="L")
-        return matting.resize(image.size, PIL.Image.Resampling.LANCZOS)
+        # the buffers are shared, so calls on one instance run one at a time
+        with self._lock:
+            normalized = self.preprocess(image)
+
+            # feed into the model
+            outputs = self.session.run(None, {"input_image": normalized})
+
+            return self.postprocess(outputs[0][0, 0, :, :], image.size)
+
+    def predict_batch(self, images, batch_size=4, letterbox=False):
+        # Stack the images into (n, c=3, h=input_size, w=input_size) inputs and return the mattings in input order.
+        # Models exported with a fixed batch size are fed chunks of exactly that size, padding the last one.
+        images = list(images)
+        if self.fixed_batch_size:
+            batch_size = self.fixed_batch_size
+        else:
+            batch_size = max(1, min(batch_size, len(images)))
+        mattings = []
+        with self._lock, ThreadPoolExecutor(max_workers=min(batch_size, os.cpu_count() or 1)) as executor:
+            if len(self._input) < batch_size:
+                self._input = np.zeros((batch_size, 3, self.input_size, self.input_size), dtype=np.float32)
+            for start in range(0, len(images), batch_size):
+                chunk = images[start:start + batch_size]
+                # resizing and normalization release the GIL, so the images of a chunk are prepared in parallel
+                boxes = list(executor.map(self.normalize, chunk, self._input, [letterbox] * len(chunk)))
+                count = self.fixed_batch_size or len(chunk)
+
+                # feed the whole chunk into the model at once
+                outputs = self.session.run(None, {"input_image": self._input[:count]})
+
+                for index, image in enumerate(chunk):
+                    box = boxes[index] if letterbox else None
+                    mattings.append(self.postprocess(outputs[0][index, 0, :, :], image.size, box))
+        return mattings
+
+    def predict_crop(self, image: PIL.Image.Image, min_size=MIN_CROP_SIZE, refine=True) -> PIL.Image.Image:
+        # Matting for a crop around a face: the crop is letterboxed instead of stretched to a square, and crops
+        # smaller than min_size on their longest side are too small to matte and are kept fully opaque.
+        if max(image.size) < min_size:
+            return PIL.Image.new("L", image.size, 255)
+
+        # coarse pass over the whole crop at the model resolution
+        with self._lock:
+            box = self.normalize(image, self._input[0], letterbox=True)
+            outputs = self.session.run(None, {"input_image": self._input[:self.fixed_batch_size or 1]})
+            matting = self.postprocess(outputs[0][0, 0, :, :], image.size, box)
+        if not refine or max(image.size) <= self.input_size:
+            return matting
+        return self.refine(image, matting)
+
+    def refine(self, image: PIL.Image.Image, matting: PIL.Image.Image) -> PIL.Image.Image:
+        # Refine an upsampled coarse matting at full resolution, but only at its boundary pixels (partly transparent
+        # after upsampling). Only the input_size tiles of the image that contain boundary pixels run through the
+        # model, so the cost grows with the length of the edge rather than with the area of the crop.
+        alpha = np.array(matting, dtype=np.uint8)
+        boundary = (alpha > REFINE_BAND[0]) & (alpha < REFINE_BAND[1])
+        image_width, image_height = image.size
+        tile = self.input_size
+        boxes = []
+        for top in range(0, image_height, tile):
+            for left in range(0, image_width, tile):
+                if boundary[top:top + tile, left:left + tile].any():
+                    # tiles at the right and bottom edges shift inwards to keep the full tile size
+                    left_edge = max(0, min(left, image_width - tile))
+                    top_edge = max(0, min(top, image_height - tile))
+                    boxes.append((left_edge, top_edge, min(left_edge + tile, image_width), min(top_edge + tile, image_height)))
+
+        tiles = self.predict_batch([image.crop(box) for box in boxes], letterbox=True)
+        for (left, top, right, bottom), refined in zip(boxes, tiles):
+            region = boundary[top:bottom, left:right]
+            alpha[top:bottom, left:right][region] = np.asarray(refined)[region]
+        return PIL.Image.fromarray(alpha, mode="L")
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+
+# Portrait processing for every face in a set of images, without interactive steps:
+# load and resize -> detect -> filter by face attributes -> crop -> matting (one batched call per image) -> write RGBA.
+#
+#   python3 portrait_pipeline.py photos/ https://example.com/group.jpg --output portraits --format webp
+
+import argparse
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+from PIL import Image
+from azure.ai.vision.face import FaceClient
+from azure.ai.vision.face.models import FaceDetectionModel, FaceRecognitionModel, FaceAttributeTypeDetection03, FaceAttributeTypeRecognition04
+from azure.core.credentials import AzureKeyCredential
+
+from birefnet import BiRefNet
+from quality_gate import QualityGate
+
+# Maximum image size
+MAX_IMAGE_SIZE = 1920
+# JPEG quality
+JPEG_QUALITY = 95
+# Detection model option
+DETECTION_MODEL = FaceDetectionModel.DETECTION03
+# Recognition model option
+RECO_MODEL = FaceRecognitionModel.RECOGNITION04
+# Face attribute options
+FACE_ATTRIBUTES = [FaceAttributeTypeDetection03.BLUR, FaceAttributeTypeDetection03.HEAD_POSE, FaceAttributeTypeDetection03.MASK, FaceAttributeTypeRecognition04.QUALITY_FOR_RECOGNITION]
+# Margin ratio on face crop
+TOP_MARGIN_MAX = 0.75
+BOTTOM_MARGIN_MAX = 0.75
+LEFT_MARGIN_MAX = 1.5
+RIGHT_MARGIN_MAX = 1.5
+# Image file extensions picked up from directories
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
+# Levels of the blur and quality attributes, from best to worst
+BLUR_LEVELS = ['low', 'medium', 'high']
+QUALITY_LEVELS = ['high', 'medium', 'low']
+# Modes of the local quality pre-gate: off, measure only and compare with the service, or skip images before detect
+QUALITY_GATE_MODES = ['off', 'shadow', 'enforce']
+
+# Face attribute filters for portraits
+class PortraitFilter:
+    def __init__(self, max_blur_level='medium', max_head_pose=30.0, allow_mask=False, min_quality='medium'):
+        self.max_blur_level = max_blur_level
+        self.max_head_pose = max_head_pose
+        self.allow_mask = allow_mask
+        self.min_quality = min_quality
+
+    # Function to return why the face is not suitable for a portrait, or None if it is
+    def reject_reason(self, face):
+        attributes = face.face_attributes
+        blur_level = attributes.blur.blur_level
+        if BLUR_LEVELS.index(blur_level) > BLUR_LEVELS.index(self.max_blur_level):
+            return f"blur={blur_level}"
+        head_pose = attributes.head_pose
+        for name, angle in (('yaw', head_pose.yaw), ('pitch', head_pose.pitch), ('roll', head_pose.roll)):
+            if abs(angle) > self.max_head_pose:
+                return f"{name}={angle}"
+        if not self.allow_mask and attributes.mask.type != 'noMask':
+            return f"mask={attributes.mask.type}"
+        quality = attributes.quality_for_recognition
+        if QUALITY_LEVELS.index(quality) > QUALITY_LEVELS.index(self.min_quality):
+            return f"quality={quality}"
+        return None
+
+# Function to create the local quality pre-gate for a QUALITY_GATE_MODES mode, or None when it is off
+def make_quality_gate(mode):
+    if mode == 'off':
+        return None
+    return QualityGate(enforce=mode == 'enforce')
+
+# Function to print how many images the pre-gate rejected and how well it agreed with the service
+def report_quality_gate(quality_gate):
+    stats = quality_gate.stats()
+    agreement = f"{stats['agreement']:.1%}" if stats['agreement'] is not None else 'n/a'
+    print(f"quality gate: {stats['rejected']}/{stats['checked']} rejected {stats['rejectedBy']}, "
+          f"{stats['secondsPerImage'] * 1000:.1f} ms/image, agreement with service {agreement} {stats['serviceVerdicts']}")
+
+# Accumulated wall time per pipeline stage; stages running on worker threads may overlap
+class StageTimings:
+    def __init__(self):
+        self.seconds = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.seconds[name] = self.seconds.get(name, 0.0) + elapsed
+                self.counts[name] = self.counts.get(name, 0) + 1
+
+    def report(self):
+        with self._lock:
+            total = sum(self.seconds.values()) or 1.0
+            for name, seconds in self.seconds.items():
+                count = self.counts[name]
+                print(f"{name:<10} {seconds:8.3f} s  {count:5d} calls  {seconds / count * 1000:9.1f} ms/call  {seconds / total:6.1%}")
+
+# Function to list the images of the given files, directories and URLs
+def list_sources(inputs):
+    sources = []
+    for source in inputs:
+        if os.path.isdir(source):
+            for name in sorted(os.listdir(source)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    sources.append(os.path.join(source, name))
+        else:
+            sources.append(source)
+    return sources
+
+# Function to read the bytes of an image file or URL
+def fetch_image_content(source):
+    if source.startswith(('http://', 'https://')):
+        response = requests.get(source)
+        response.raise_for_status()
+        return response.content
+    with open(source, 'rb') as f:
+        return f.read()
+
+# Function to decode image bytes, resized to MAX_IMAGE_SIZE, and return the image and its JPEG encoding for detection
+def decode_image(image_content):
+    with Image.open(io.BytesIO(image_content)) as image:
+        image = image.convert('RGB')
+    width, height = image.size
+    scale = min(1.0, MAX_IMAGE_SIZE / max(width, height))
+    if scale < 1.0:
+        image = image.resize((int(width * scale), int(height * scale)), Image.LANCZOS)
+    image_memory_stream = io.BytesIO()
+    image.save(image_memory_stream, format='jpeg', quality=JPEG_QUALITY)
+    return image, image_memory_stream.getvalue()
+
+# Function to load an image from a file or URL, resized to MAX_IMAGE_SIZE, and its JPEG encoding for detection
+def load_image(source):
+    return decode_image(fetch_image_content(source))
+
+# Function to compute the crop rectangle around a face, clamped to the image
+def crop_rectangle(face, image_size):
+    image_width, image_height = image_size
+    rectangle = face.face_rectangle
+    left = max(int(rectangle.left - rectangle.width * LEFT_MARGIN_MAX), 0)
+    top = max(int(rectangle.top - rectangle.height * TOP_MARGIN_MAX), 0)
+    right = min(int(rectangle.left + rectangle.width + rectangle.width * RIGHT_MARGIN_MAX), image_width)
+    bottom = min(int(rectangle.top + rectangle.height + rectangle.height * BOTTOM_MARGIN_MAX), image_height)
+    return left, top, right, bottom
+
+# Function to name the portrait file of a face in an image
+def portrait_path(output_dir, source, index, output_format):
+    stem = os.path.splitext(os.path.basename(source.split('?')[0]))[0] or 'image'
+    return os.path.join(output_dir, f"{stem}-face{index}.{output_format}")
+
+def save_portrait(portrait, path, output_format):
+    if output_format == 'webp':
+        portrait.save(path, format='webp', quality=90)
+    else:
+        portrait.save(path, format='png')
+    return path
+
+class PortraitPipeline:
+    def __init__(self, face_client, output_dir, output_format='png', portrait_filter=None, model=None, write_workers=4, quality_gate=None):
+        self.face_client = face_client
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.portrait_filter = portrait_filter or PortraitFilter()
+        self.quality_gate = quality_gate
+        self.model = model or BiRefNet()
+        self.timings = StageTimings()
+        self._writer = ThreadPoolExecutor(max_workers=write_workers)
+        self._writes = []
+        os.makedirs(output_dir, exist_ok=True)
+
+    # Function to process every suitable face of one image; the RGBA portraits are written in the background
+    def process_image(self, source):
+        with self.timings.stage('load'):
+            image, image_content = load_image(source)
+        gate_reason = None
+        if self.quality_gate is not None:
+            with self.timings.stage('gate'):
+                gate_reason = self.quality_gate.reject_reason(image)
+            if gate_reason and self.quality_gate.enforce:
+                print(f"{source}: skipped before detect ({gate_reason})")
+                return []
+        with self.timings.stage('detect'):
+            detected_faces = self.face_client.detect(
+                image_content,
+                detection_model=DETECTION_MODEL,
+                recognition_model=RECO_MODEL,
+                return_face_id=False,
+                return_face_attributes=FACE_ATTRIBUTES,
+                return_face_landmarks=True
+            )
+
+        with self.timings.stage('crop'):
+            crops = []
+            for index, face in enumerate(detected_faces):
+                reason = self.portrait_filter.reject_reason(face)
+                if reason:
+                    print(f"{source}: skipped face {index} ({reason})")
+                    continue
+                crops.append((index, image.crop(crop_rectangle(face, image.size))))
+        if self.quality_gate is not None:
+            self.quality_gate.record_service_verdict(gate_reason is not None, not crops)
+        if not crops:
+            print(f"{source}: {len(detected_faces)} faces detected, no portrait generated")
+            return []
+
+        with self.timings.stage('matting'):
+            mattings = self.model.predict_batch([crop for _, crop in crops], letterbox=True)
+
+        futures = []
+        for (index, crop), matting in zip(crops, mattings):
+            crop.putalpha(matting)
+            path = portrait_path(self.output_dir, source, index, self.output_format)
+            futures.append(self._writer.submit(self._write, crop, path))
+        self._writes.extend(futures)
+        print(f"{source}: {len(detected_faces)} faces detected, {len(crops)} portraits")
+        return futures
+
+    def _write(self, portrait, path):
+        with self.timings.stage('write'):
+            return save_portrait(portrait, path, self.output_format)
+
+    # Function to process all images and return the paths of the written portraits
+    def run(self, sources):
+        for source in sources:
+            try:
+                self.process_image(source)
+            except Exception as e:
+                print(f"{source}: error {e}")
+        return self.wait()
+
+    # Function to wait for the pending writes and return their paths
+    def wait(self):
+        paths = []
+        for future in self._writes:
+            try:
+                paths.append(future.result())
+            except Exception as e:
+                print(f"Write error: {e}")
+        self._writes = []
+        return paths
+
+    def close(self):
+        self.wait()
+        self._writer.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description='Write an RGBA portrait for every suitable face in the given images.')
+    parser.add_argument('inputs', nargs='+', help='image files, directories of images or image URLs')
+    parser.add_argument('--output', default='portraits')
+    parser.add_argument('--format', choices=['png', 'webp'], default='png')
+    parser.add_argument('--max-blur', choices=BLUR_LEVELS, default='medium')
+    parser.add_argument('--max-head-pose', type=float, default=30.0, help='maximum absolute yaw, pitch and roll in degrees')
+    parser.add_argument('--allow-mask', action='store_true')
+    parser.add_argument('--min-quality', choices=QUALITY_LEVELS, default='medium')
+    parser.add_argument('--write-workers', type=int, default=4)
+    parser.add_argument('--quality-gate', choices=QUALITY_GATE_MODES, default='off', help='local blur, exposure and resolution check before detect')
+    args = parser.parse_args()
+
+    portrait_filter = PortraitFilter(args.max_blur, args.max_head_pose, args.allow_mask, args.min_quality)
+    start = time.perf_counter()
+    with FaceClient(endpoint=os.environ["FACE_ENDPOINT_URL"], credential=AzureKeyCredential(os.environ["FACE_API_KEY"]), headers={"X-MS-AZSDK-Telemetry": "sample=portrait-processing"}) as face_client:
+        pipeline = PortraitPipeline(face_client, args.output, args.format, portrait_filter, write_workers=args.write_workers,
+                                    quality_gate=make_quality_gate(args.quality_gate))
+        try:
+            paths = pipeline.run(list_sources(args.inputs))
+        finally:
+            pipeline.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(paths)} portraits written to {args.output} in {elapsed:.2f} s")
+    pipeline.timings.report()
+    if pipeline.quality_gate is not None:
+        report_quality_gate(pipeline.quality_gate)
+
+if __name__ == '__main__':
+    main()
@@ -135,7 +135,7 @@ with Image.open(response.raw) as image:
         image = image.crop((crop_left, crop_top, crop_right, crop_bottom))
         
         # remove the background
-        foreground_matting_image = BiRefNet().predict(image)
+        foreground_matting_image = BiRefNet().predict_crop(image)
 
         # merge the image with the foreground matting
         image.putalpha(foreground_matting_image)
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+# Streaming portrait processing for many images. The stages run concurrently and are connected by bounded queues:
+#
+#   fetch (I/O threads) -> decode/resize/encode (decode process pool) -> detect + filter (I/O threads)
+#     -> decode, matting, composite and RGBA encode (matting process pool)
+#
+# A full queue blocks the stage before it, so memory stays bounded and throughput follows the slowest stage
+# instead of the sum of all stages. Only bytes cross process boundaries: the decode workers return the resized JPEG
+# sent to detect, and the matting workers decode that JPEG again, so the crop rectangles match what detect saw.
+# Only the matting workers load BiRefNet, and there are few of them, as each session takes a lot of memory.
+#
+#   python3 streaming_pipeline.py photos/ --output portraits --io-workers 8 --processes 2
+
+import argparse
+import io
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+from azure.ai.vision.face import FaceClient
+from azure.core.credentials import AzureKeyCredential
+
+from birefnet import BiRefNet
+from portrait_pipeline import (BLUR_LEVELS, DETECTION_MODEL, FACE_ATTRIBUTES, QUALITY_GATE_MODES, QUALITY_LEVELS, RECO_MODEL,
+                               PortraitFilter, StageTimings, crop_rectangle, decode_image, fetch_image_content, list_sources,
+                               make_quality_gate, portrait_path, report_quality_gate, save_portrait)
+
+# Marks the end of the input of a stage
+_DONE = object()
+# Most matting processes started by default, and the memory to allow for each one's BiRefNet session
+DEFAULT_MATTING_PROCESSES = 2
+MATTING_PROCESS_MEMORY = 2 * 1024 ** 3
+
+# The BiRefNet model of a worker process, created on its first matting
+_model = None
+
+# Function to choose the number of matting processes: DEFAULT_MATTING_PROCESSES, fewer if memory is short
+def default_matting_processes():
+    try:
+        memory = os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, OSError, ValueError):
+        return DEFAULT_MATTING_PROCESSES
+    return max(1, min(DEFAULT_MATTING_PROCESSES, memory // MATTING_PROCESS_MEMORY))
+
+# Function run in a decode worker process: the resized JPEG of the image bytes and its size, without the decoded image
+def encode_for_detect(image_content):
+    image, jpeg = decode_image(image_content)
+    return jpeg, image.size
+
+# Function run in a matting worker process: decode the JPEG sent to detect, matte the face crops and write them as RGBA files
+def matte_and_write(image_content, rectangles, paths, output_format, profile, intra_op_num_threads):
+    global _model
+    if _model is None:
+        _model = BiRefNet(profile=profile, intra_op_num_threads=intra_op_num_threads)
+    with Image.open(io.BytesIO(image_content)) as image:
+        image = image.convert('RGB')
+    crops = [image.crop(rectangle) for rectangle in rectangles]
+    mattings = _model.predict_batch(crops, letterbox=True)
+    for crop, matting, path in zip(crops, mattings, paths):
+        crop.putalpha(matting)
+        save_portrait(crop, path, output_format)
+    return paths
+
+# One pipeline stage: worker threads take items from a bounded input queue and put results into the next stage.
+# Threads of CPU-bound stages hand the work to the process pool and wait, so they only bound the work in flight.
+class Stage:
+    def __init__(self, name, function, workers, queue_size, timings, next_stage=None):
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.timings = timings
+        self.next_stage = next_stage
+        self.input = queue.Queue(maxsize=queue_size)
+        self._remaining = workers
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def put(self, item):
+        self.input.put(item)
+
+    # Function to signal that no more items follow; the stage finishes its queue and then closes the next stage
+    def close(self):
+        for _ in range(self.workers):
+            self.input.put(_DONE)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while True:
+            item = self.input.get()
+            if item is _DONE:
+                break
+            try:
+                with self.timings.stage(self.name):
+                    result = self.function(item)
+            except Exception as e:
+                print(f"{item['source']}: {self.name} error {e}")
+                continue
+            if result is not None and self.next_stage is not None:
+                self.next_stage.put(result)
+        with self._lock:
+            self._remaining -= 1
+            last = self._remaining == 0
+        if last and self.next_stage is not None:
+            self.next_stage.close()
+
+class StreamingPortraitPipeline:
+    def __init__(self, face_client, output_dir, output_format='png', portrait_filter=None, io_workers=8, processes=None,
+                 queue_size=8, profile='fp32', quality_gate=None):
+        self.face_client = face_client
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.portrait_filter = portrait_filter or PortraitFilter()
+        self.quality_gate = quality_gate
+        self.profile = profile
+        self.processes = processes or default_matting_processes()
+        self.decode_processes = os.cpu_count() or 1
+        # Split the cores between the ONNX Runtime sessions of the matting processes
+        self.intra_op_num_threads = max(1, (os.cpu_count() or 1) // self.processes)
+        self.timings = StageTimings()
+        self.paths = []
+        self._paths_lock = threading.Lock()
+        # spawn instead of fork, since the parent already runs threads. Decoding has its own pool, so its many
+        # light processes never load a BiRefNet session.
+        context = multiprocessing.get_context('spawn')
+        self._decode_pool = ProcessPoolExecutor(max_workers=self.decode_processes, mp_context=context)
+        self._matting_pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+
+        self._matting = Stage('matting', self._matte, self.processes, queue_size, self.timings)
+        self._detect = Stage('detect', self._detect_faces, io_workers, queue_size, self.timings, self._matting)
+        self._decode = Stage('decode', self._decode_image, self.decode_processes, queue_size, self.timings, self._detect)
+        self._fetch = Stage('fetch', self._fetch_image, io_workers, queue_size, self.timings, self._decode)
+        self._stages = [self._fetch, self._decode, self._detect, self._matting]
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _fetch_image(self, item):
+        item['content'] = fetch_image_content(item['source'])
+        return item
+
+    def _decode_image(self, item):
+        item['jpeg'], item['size'] = self._decode_pool.submit(encode_for_detect, item.pop('content')).result()
+        return item
+
+    def _detect_faces(self, item):
+        source = item['source']
+        gate_reason = None
+        if self.quality_gate is not None:
+            gate_reason = self.quality_gate.reject_reason(item['jpeg'])
+            if gate_reason and self.quality_gate.enforce:
+                print(f"{source}: skipped before detect ({gate_reason})")
+                return None
+        detected_faces = self.face_client.detect(
+            item['jpeg'],
+            detection_model=DETECTION_MODEL,
+            recognition_model=RECO_MODEL,
+            return_face_id=False,
+            return_face_attributes=FACE_ATTRIBUTES,
+            return_face_landmarks=True
+        )
+        item['rectangles'] = []
+        item['paths'] = []
+        for index, face in enumerate(detected_faces):
+            reason = self.portrait_filter.reject_reason(face)
+            if reason:
+                print(f"{source}: skipped face {index} ({reason})")
+                continue
+            item['rectangles'].append(crop_rectangle(face, item['size']))
+            item['paths'].append(portrait_path(self.output_dir, source, index, self.output_format))
+        if self.quality_gate is not None:
+            self.quality_gate.record_service_verdict(gate_reason is not None, not item['rectangles'])
+        print(f"{source}: {len(detected_faces)} faces detected, {len(item['rectangles'])} portraits")
+        return item if item['rectangles'] else None
+
+    def _matte(self, item):
+        paths = self._matting_pool.submit(matte_and_write, item['jpeg'], item['rectangles'], item['paths'], self.output_format,
+                                          self.profile, self.intra_op_num_threads).result()
+        with self._paths_lock:
+            self.paths.extend(paths)
+
+    # Function to stream all images through the stages and return the paths of the written portraits
+    def run(self, sources):
+        for stage in self._stages:
+            stage.start()
+        # putting blocks while the fetch queue is full
+        for source in sources:
+            self._fetch.put({'source': source})
+        self._fetch.close()
+        for stage in self._stages:
+            stage.join()
+        return self.paths
+
+    def close(self):
+        self._decode_pool.shutdown()
+        self._matting_pool.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream images through fetch, decode, detect and matting stages in parallel.')
+    parser.add_argument('inputs', nargs='+', help='image files, directories of images or image URLs')
+    parser.add_argument('--output', default='portraits')
+    parser.add_argument('--format', choices=['png', 'webp'], default='png')
+    parser.add_argument('--max-blur', choices=BLUR_LEVELS, default='medium')
+    parser.add_argument('--max-head-pose', type=float, default=30.0, help='maximum absolute yaw, pitch and roll in degrees')
+    parser.add_argument('--allow-mask', action='store_true')
+    parser.add_argument('--min-quality', choices=QUALITY_LEVELS, default='medium')
+    parser.add_argument('--io-workers', type=int, default=8, help='threads for fetching images and calling detect')
+    parser.add_argument('--processes', type=int, default=None, help=f'matting processes, each with its own BiRefNet session (default: {DEFAULT_MATTING_PROCESSES}, fewer if memory is short)')
+    parser.add_argument('--queue-size', type=int, default=8, help='items buffered between two stages')
+    parser.add_argument('--profile', default='fp32', help='BiRefNet inference profile')
+    parser.add_argument('--quality-gate', choices=QUALITY_GATE_MODES, default='off', help='local blur, exposure and resolution check before detect')
+    args = parser.parse_args()
+
+    sources = list_sources(args.inputs)
+    portrait_filter = PortraitFilter(args.max_blur, args.max_head_pose, args.allow_mask, args.min_quality)
+    start = time.perf_counter()
+    with FaceClient(endpoint=os.environ["FACE_ENDPOINT_URL"], credential=AzureKeyCredential(os.environ["FACE_API_KEY"]), headers={"X-MS-AZSDK-Telemetry": "sample=portrait-processing"}) as face_client:
+        pipeline = StreamingPortraitPipeline(face_client, args.output, args.format, portrait_filter, args.io_workers,
+                                             args.processes, args.queue_size, args.profile, make_quality_gate(args.quality_gate))
+        try:
+            paths = pipeline.run(sources)
+        finally:
+            pipeline.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(paths)} portraits from {len(sources)} images written to {args.output} in {elapsed:.2f} s "
+          f"({len(sources) / elapsed:.2f} images/s)")
+    print("Busy time per stage (stages overlap):")
+    pipeline.timings.report()
+    if pipeline.quality_gate is not None:
+        report_quality_gate(pipeline.quality_gate)
+
+if __name__ == '__main__':
+    main()
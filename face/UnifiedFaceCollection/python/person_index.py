@@ -0,0 +1,126 @@
+import itertools, sqlite3, threading
+
+# Number of persons per listing request; the service allows at most 1000
+PAGE_SIZE = 1000
+
+# Local name -> personId index of a Large Person Group, so name lookups do not download the whole group.
+# It is stored in SQLite, in memory or in a file that survives restarts. The collection that owns it keeps it up to
+# date on every add and remove; reconcile() compares it with the service a few pages at a time, to pick up changes
+# made by other clients without a full rescan. list_page(start, top) returns the persons with personId > start.
+class PersonNameIndex:
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS persons (person_id TEXT PRIMARY KEY, name TEXT)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS persons_name ON persons (name)')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+
+    # Function to tie the index to one Large Person Group; an index file of another group is emptied
+    def bind(self, collection_key):
+        with self._lock, self._connection:
+            if self._get_meta('collection') != collection_key:
+                self._clear()
+                self._set_meta('collection', collection_key)
+
+    def is_complete(self):
+        with self._lock:
+            return self._get_meta('complete') == '1'
+
+    # Function to mark the index as holding every person, e.g. right after the group was created empty
+    def mark_complete(self):
+        with self._lock, self._connection:
+            self._set_meta('complete', '1')
+
+    # Function to return the personId of the first person with the name, or None
+    def lookup(self, name):
+        with self._lock:
+            row = self._connection.execute('SELECT person_id FROM persons WHERE name = ? ORDER BY rowid LIMIT 1', (name,)).fetchone()
+        return row[0] if row else None
+
+    def add(self, person_id, name):
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO persons (person_id, name) VALUES (?, ?)', (person_id, name))
+
+    def remove(self, person_id):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM persons WHERE person_id = ?', (person_id,))
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._clear()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM persons').fetchone()[0]
+
+    # Function to load every person page by page. Each page is committed with the position reached,
+    # so an interrupted build of a persistent index resumes where it stopped.
+    def build(self, list_page, page_size=PAGE_SIZE):
+        with self._lock:
+            start = self._get_meta('build_cursor')
+        while True:
+            page = list_page(start, page_size)
+            with self._lock, self._connection:
+                self._connection.executemany('INSERT OR REPLACE INTO persons (person_id, name) VALUES (?, ?)',
+                                             [(person.person_id, person.name) for person in page])
+                if len(page) < page_size:
+                    self._delete_meta('build_cursor')
+                    self._set_meta('complete', '1')
+                    return
+                start = page[-1].person_id
+                self._set_meta('build_cursor', start)
+
+    # Function to compare the next pages of the group with the index and apply the differences. Consecutive calls
+    # sweep the whole group and then start over; pages=None sweeps the whole group at once, from the start.
+    # Returns the number of persons added, renamed or removed.
+    def reconcile(self, list_page, pages=1, page_size=PAGE_SIZE):
+        if pages is None:
+            with self._lock, self._connection:
+                self._delete_meta('reconcile_cursor')
+        changes = 0
+        for _ in itertools.count() if pages is None else range(pages):
+            with self._lock:
+                start = self._get_meta('reconcile_cursor')
+            page = list_page(start, page_size)
+            # A full page covers the personIds up to its last one, a short page everything up to the end
+            end = page[-1].person_id if len(page) == page_size else None
+            remote = {person.person_id: person.name for person in page}
+            with self._lock, self._connection:
+                query = 'SELECT person_id, name FROM persons WHERE person_id > ?'
+                arguments = [start or '']
+                if end is not None:
+                    query += ' AND person_id <= ?'
+                    arguments.append(end)
+                local = dict(self._connection.execute(query, arguments).fetchall())
+                removed = [(person_id,) for person_id in local if person_id not in remote]
+                changed = [(person_id, name) for person_id, name in remote.items() if local.get(person_id, object()) != name]
+                self._connection.executemany('DELETE FROM persons WHERE person_id = ?', removed)
+                self._connection.executemany('INSERT OR REPLACE INTO persons (person_id, name) VALUES (?, ?)', changed)
+                changes += len(removed) + len(changed)
+                if end is None:
+                    self._delete_meta('reconcile_cursor')
+                else:
+                    self._set_meta('reconcile_cursor', end)
+            if end is None:
+                break
+        return changes
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _clear(self):
+        self._connection.execute('DELETE FROM persons')
+        self._connection.execute("DELETE FROM meta WHERE key != 'collection'")
+
+    def _get_meta(self, key):
+        row = self._connection.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def _delete_meta(self, key):
+        self._connection.execute('DELETE FROM meta WHERE key = ?', (key,))
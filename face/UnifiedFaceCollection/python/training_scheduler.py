@@ -0,0 +1,109 @@
+import threading, time
+from concurrent.futures import Future
+
+# Train requests arriving within this many seconds of the first one are served by a single training cycle
+COALESCE_WINDOW = 2.0
+# Adaptive polling of the training status: sub-second at first, backing off to MAX_POLL_INTERVAL
+INITIAL_POLL_INTERVAL = 0.5
+MAX_POLL_INTERVAL = 10.0
+POLL_BACKOFF = 1.5
+
+# Trains the parts of a collection (e.g. a Large Face List and a Large Person Group) only when they changed.
+# Every add or remove marks its part dirty; a train request made while no cycle runs starts one right away, while
+# requests arriving during a cycle are coalesced for a short window into the next. Each cycle trains all dirty parts
+# concurrently in the background. request() returns a Future resolving to True when every part trained
+# succeeded (or nothing needed training), so callers decide whether and when to wait.
+# targets maps a part name to (start_training, get_training_status) functions.
+class TrainingScheduler:
+    def __init__(self, targets, coalesce_window=COALESCE_WINDOW, initial_interval=INITIAL_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL, backoff=POLL_BACKOFF):
+        self.targets = targets
+        self.coalesce_window = coalesce_window
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        # A part is dirty while its change counter differs from the counter at its last successful training;
+        # the state of the service is unknown at first, so every part starts dirty
+        self._versions = {name: 0 for name in targets}
+        self._trained = {name: None for name in targets}
+        self._pending = None
+        self._pending_due = None
+        self._running = False
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = None
+        self.cycles = 0
+
+    def mark_dirty(self, name):
+        with self._condition:
+            self._versions[name] += 1
+
+    # Function to tell whether any part changed since it was last trained
+    def is_dirty(self):
+        with self._condition:
+            return any(self._versions[name] != self._trained[name] for name in self.targets)
+
+    # Function to request a training; returns the Future of the cycle that will serve it
+    def request(self):
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Training scheduler is closed.")
+            if self._pending is None:
+                self._pending = Future()
+                # Nothing to coalesce with unless a cycle is running, during which more requests tend to arrive
+                self._pending_due = time.monotonic() + (self.coalesce_window if self._running else 0)
+                self._condition.notify()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='training-scheduler', daemon=True)
+                self._thread.start()
+            return self._pending
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and (self._pending is None or self._pending_due > time.monotonic()):
+                    self._condition.wait(self._pending_due - time.monotonic() if self._pending is not None else None)
+                future, self._pending = self._pending, None
+                if self._closed:
+                    break
+                # Changes made while this cycle runs keep their parts dirty for the next one
+                snapshot = {name: version for name, version in self._versions.items() if version != self._trained[name]}
+                self._running = True
+            self.cycles += 1
+            try:
+                future.set_result(self._train(snapshot))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._condition:
+                    self._running = False
+        if future is not None:
+            future.set_exception(RuntimeError("Training scheduler is closed."))
+
+    # Function to start training all given parts at once and poll them together until each finished
+    def _train(self, snapshot):
+        for name in snapshot:
+            self.targets[name][0]()
+        succeeded = True
+        running = set(snapshot)
+        interval = self.initial_interval
+        while running:
+            time.sleep(interval)
+            for name in list(running):
+                status = self.targets[name][1]().status
+                if status not in ('succeeded', 'failed'):
+                    continue
+                running.discard(name)
+                if status == 'succeeded':
+                    with self._condition:
+                        self._trained[name] = snapshot[name]
+                else:
+                    succeeded = False
+            interval = min(interval * self.backoff, self.max_interval)
+        return succeeded
@@ -1,27 +1,129 @@
 import json
+import threading
+import time
+import requests
+from concurrent.futures import Future, ThreadPoolExecutor
 from PIL import Image
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import ResourceNotFoundError
+from azure.core.pipeline.transport import RequestsTransport
 from azure.ai.vision.face import FaceClient, FaceAdministrationClient
 from azure.ai.vision.face.models import FaceDetectionModel, FaceRecognitionModel
 
+from bulk_operations import BulkOperation
+from detection_cache import DetectionCache
+from image_preprocessing import ImagePreprocessor, passthrough_image
+from perceptual_hash import image_signature, select_distinct
+from person_index import PAGE_SIZE, PersonNameIndex
+from rate_limiter import RateLimitedAdapter, RateLimitScheduler
+from training_scheduler import COALESCE_WINDOW, TrainingScheduler
+
+# Shared by all collections of the process, so they stay together under the transactions-per-second limit of the resource.
+# Set the rate of your pricing tier with shared_rate_limit_scheduler.configure(requests_per_second=...)
+shared_rate_limit_scheduler = RateLimitScheduler()
+
+# Seconds a name missing from the person index is trusted to be missing from the group before the group is swept again
+PERSON_INDEX_MAX_AGE = 300
+
 class UnifiedFaceCollection:
-    def __init__(self, subscription_key, endpoint, face_collection_id, injection_header):
-        self.face_client = FaceClient(endpoint, AzureKeyCredential(subscription_key), headers = {"X-MS-AZSDK-Telemetry": injection_header})
-        self.face_admin_client = FaceAdministrationClient(endpoint, AzureKeyCredential(subscription_key), headers = {"X-MS-AZSDK-Telemetry": injection_header})
+    def __init__(self, subscription_key, endpoint, face_collection_id, injection_header, detection_cache=None, image_preprocessor=None, rate_limit_scheduler=None, person_index=None, training_window=COALESCE_WINDOW, duplicate_index=None, person_index_max_age=PERSON_INDEX_MAX_AGE):
+        self.endpoint = endpoint
+        # Detect results are reused for identical image bytes until the faceIds expire; set to None to always call the service
+        self.detection_cache = detection_cache if detection_cache is not None else DetectionCache()
+        # Images are downscaled and re-encoded before every upload; set to None to upload the original files
+        self.image_preprocessor = image_preprocessor if image_preprocessor is not None else ImagePreprocessor()
+        # Both clients send through one session whose requests take tokens from the scheduler and are retried on 429/5xx,
+        # so the SDK retry policy only handles connection errors
+        self.rate_limit_scheduler = rate_limit_scheduler or shared_rate_limit_scheduler
+        self.session = requests.Session()
+        adapter = RateLimitedAdapter(self.rate_limit_scheduler)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.face_client = FaceClient(endpoint, AzureKeyCredential(subscription_key), headers = {"X-MS-AZSDK-Telemetry": injection_header},
+                                      transport=RequestsTransport(session=self.session, session_owner=False), retry_status=0)
+        self.face_admin_client = FaceAdministrationClient(endpoint, AzureKeyCredential(subscription_key), headers = {"X-MS-AZSDK-Telemetry": injection_header},
+                                                          transport=RequestsTransport(session=self.session, session_owner=False), retry_status=0)
         self.face_collection_id = face_collection_id
         self.large_face_list_id = face_collection_id + "_face_list"
         self.large_person_group_id = face_collection_id + "_person_group"
+        # Persons are looked up by name in a local index instead of listing the group; pass PersonNameIndex(path)
+        # to keep it in a file between runs
+        self.person_index = person_index if person_index is not None else PersonNameIndex()
+        self.person_index.bind(f"{endpoint}/{self.large_person_group_id}")
+        # Other clients may add persons to the group, so before a person is created for a name missing from the index,
+        # the group is swept once the index is older than person_index_max_age seconds; the sweep is shared by
+        # concurrent lookups and new persons in between trust the index. Set it to None when this collection is the
+        # only one adding persons, to never sweep.
+        self.person_index_max_age = person_index_max_age
+        self._person_sweep_lock = threading.Lock()
+        self._person_swept_at = float('-inf')
+        # Concurrent adds of a new name wait for one person to be created instead of each creating their own
+        self._person_lock = threading.Lock()
+        self._person_creations = {}
+        self._person_index_lock = threading.Lock()
+        # With a PerceptualHashIndex, an image that is a near-duplicate of one added before for the same person
+        # (burst shots, re-exports) is skipped, returning the result of the earlier add
+        self.duplicate_index = duplicate_index
+        self._duplicate_lock = threading.Lock()
+        self._duplicate_adds = {}
+        # Adds and removes mark the face list or person group dirty; train() only trains what changed, and train
+        # requests made within training_window seconds while a cycle runs share the next one
+        self.training = TrainingScheduler({
+            'face_list': (
+                lambda: self.face_admin_client.large_face_list.begin_train(self.large_face_list_id, polling=False),
+                lambda: self.face_admin_client.large_face_list.get_training_status(self.large_face_list_id)
+            ),
+            'person_group': (
+                lambda: self.face_admin_client.large_person_group.begin_train(self.large_person_group_id, polling=False),
+                lambda: self.face_admin_client.large_person_group.get_training_status(self.large_person_group_id)
+            )
+        }, training_window)
         self.create_collections()
 
-    def detect_faces(self, image_path):
+    # Function to stop the training scheduler and close the session; pending training requests fail
+    def close(self):
+        self.training.close()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def read_image(self, image_path):
         with open(image_path, 'rb') as image_data:
-            detected_faces = self.face_client.detect(
-                    image_content=image_data.read(),
+            return image_data.read()
+
+    def preprocess(self, image_content):
+        if self.image_preprocessor is None:
+            return passthrough_image(image_content)
+        return self.image_preprocessor.process(image_content)
+
+    def detect_faces(self, image_path):
+        # Face rectangles are returned in the coordinates of the original image
+        processed = self.preprocess(self.read_image(image_path))
+        return processed.map_faces_to_original(self.detect_faces_in_content(processed.content))
+
+    def detect_faces_in_content(self, image_content):
+        def detect(image_content):
+            return self.face_client.detect(
+                    image_content=image_content,
                     detection_model=FaceDetectionModel.DETECTION03,
                     recognition_model=FaceRecognitionModel.RECOGNITION04,
                     return_face_id=True,
             )
-        return detected_faces
+
+        if self.detection_cache is None:
+            return detect(image_content)
+        # faceIds only work on the resource that created them, so the endpoint is part of the key
+        return self.detection_cache.detect(
+                image_content,
+                detect,
+                endpoint=self.endpoint,
+                detection_model=FaceDetectionModel.DETECTION03,
+                recognition_model=FaceRecognitionModel.RECOGNITION04,
+        )
 
     def enlarge_bounding_box(self, face_rectangle, image_width, image_height, enlargement_factor=1.2):
         left = max(0, face_rectangle.left - (face_rectangle.width * (enlargement_factor - 1) / 2))
@@ -39,7 +141,7 @@ class UnifiedFaceCollection:
         try :
             self.face_admin_client.large_face_list.get(self.large_face_list_id)
             print(f"Large Face List: {self.large_face_list_id} already exists.")
-        except Exception:
+        except ResourceNotFoundError:
             print(f"Creating Large Face List: {self.large_face_list_id}")
             self.face_admin_client.large_face_list.create(
                 self.large_face_list_id,
@@ -51,58 +153,118 @@ class UnifiedFaceCollection:
         try :
             self.face_admin_client.large_person_group.get(self.large_person_group_id)
             print(f"Large Person Group: {self.large_person_group_id} already exists.")
-        except Exception:
+        except ResourceNotFoundError:
             print(f"Creating Large Person Group: {self.large_person_group_id}")
             self.face_admin_client.large_person_group.create(
                 self.large_person_group_id,
                 name=self.face_collection_id + " Person Group",
                 recognition_model=FaceRecognitionModel.RECOGNITION04
             )
+            # A new group has no persons, so the index is complete without listing anything
+            self.person_index.clear()
+            self.person_index.mark_complete()
 
     def add_face(self, image_path, person_name=None):
-        faces = self.detect_faces(image_path)
+        # Read and preprocess the image once and reuse the same bytes for detection and every upload
+        processed = self.preprocess(self.read_image(image_path))
+        duplicate, entry_id = self._reserve_image(processed, person_name)
+        if duplicate is not None:
+            print(f"Near-duplicate of an image added before. Skipping.")
+            return duplicate
+        added = None
+        try:
+            faces = self.detect_faces_in_content(processed.content)
+            if len(faces) == 0:
+                print(f"No faces detected in the image.")
+                return None
+            elif len(faces) > 1:
+                print(f"Multiple faces detected. Using the first face (largest face) for adding to the collection.")
+            else:
+                print(f"One face detected. Adding to the collection.")
+            added = self.add_detected_face(processed, faces, person_name)
+            return added
+        finally:
+            self._finish_image(entry_id, added)
+
+    # Function to look for a near-duplicate of the image among those added for the person. Returns the result of the
+    # earlier add, marked as duplicate, or reserves an index entry for this image and returns its id.
+    # A caller that finds an add still in progress waits for it.
+    def _reserve_image(self, processed, person_name):
+        if self.duplicate_index is None:
+            return None, None
+        signature = image_signature(processed.content)
+        while True:
+            with self._duplicate_lock:
+                entry_id = self.duplicate_index.find(signature, person_name)
+                if entry_id is None:
+                    entry_id = self.duplicate_index.add(signature, None, person_name)
+                    self._duplicate_adds[entry_id] = Future()
+                    return None, entry_id
+                pending = self._duplicate_adds.get(entry_id)
+                if pending is None and self.duplicate_index.get(entry_id) is None:
+                    # An entry reserved by an add that is not running here, e.g. one of an earlier run, is a miss
+                    self.duplicate_index.remove(entry_id)
+                    continue
+            added = pending.result() if pending is not None else self.duplicate_index.get(entry_id)
+            if added is not None:
+                return {**added, 'duplicate': True}, None
+            # The earlier add failed and its entry is gone; look again
+
+    # Function to store the result of an add in its reserved index entry, or to drop the entry if nothing was added
+    def _finish_image(self, entry_id, added):
+        if entry_id is None:
+            return
+        with self._duplicate_lock:
+            if added is None:
+                self.duplicate_index.remove(entry_id)
+            else:
+                self.duplicate_index.set(entry_id, added)
+            pending = self._duplicate_adds.pop(entry_id)
+        pending.set_result(added)
+
+    # Function to drop the index entries of deleted faces, so the images can be added again
+    def _forget_images(self, predicate):
+        if self.duplicate_index is not None:
+            self.duplicate_index.remove_matching(predicate)
+
+    # Function to add the first detected face of a preprocessed image to the collection
+    def add_detected_face(self, processed, faces, person_name=None):
+        image_content = processed.content
         target_face = None
-        if len(faces) == 0:
-            print(f"No faces detected in the image.")
-            return None
-        elif len(faces) > 1:
-            image_width, image_height = self.get_image_dimensions(image_path)
-            print(f"Multiple faces detected. Using the first face (largest face) for adding to the collection.")
+        if len(faces) > 1:
+            image_width, image_height = processed.size
             face_rectangle = self.enlarge_bounding_box(faces[0].face_rectangle, image_width, image_height)
             target_face = [face_rectangle['left'],face_rectangle['top'],face_rectangle['width'], face_rectangle['height']]
-        else:
-            print(f"One face detected. Adding to the collection.")
-        
+
         # Add face to Large Face List
-        with open(image_path, 'rb') as image:
-            persisted_face_id = self.face_admin_client.large_face_list.add_face(
-                self.large_face_list_id,
-                image,
-                target_face=target_face,
-                detection_model=FaceDetectionModel.DETECTION03,
-                user_data=json.dumps({"personId": None, "personPersistedFaceId": None})
-            ).persisted_face_id
+        persisted_face_id = self.face_admin_client.large_face_list.add_face(
+            self.large_face_list_id,
+            image_content,
+            target_face=target_face,
+            detection_model=FaceDetectionModel.DETECTION03,
+            user_data=json.dumps({"personId": None, "personPersistedFaceId": None})
+        ).persisted_face_id
+        self.training.mark_dirty('face_list')
 
         if person_name:
-            # Check if person exists
-            person = self.get_person_by_name(person_name)
-            if person is None:
-                # Create a new person if not exists
-                person = self.face_admin_client.large_person_group.create_person(
-                    self.large_person_group_id,
-                    name=person_name
-                )
-            person_id = person.person_id
+            person_id, created = None, False
+            person_persisted_face_id = None
+            try:
+                person_id, created = self._get_or_create_person(person_name)
 
-            # Add face to the created or existing person
-            with open(image_path, 'rb') as image:
+                # Add face to the person, with the mapping to the Large Face List in its userData
+                user_data_large_person_group = {
+                    "persistedFaceId": persisted_face_id
+                }
                 person_persisted_face_id = self.face_admin_client.large_person_group.add_face(
                     self.large_person_group_id,
                     person_id,
-                    image,
+                    image_content,
                     target_face=target_face,
                     detection_model=FaceDetectionModel.DETECTION03,
+                    user_data=json.dumps(user_data_large_person_group)
                 ).persisted_face_id
+                self.training.mark_dirty('person_group')
 
                 # Update the userData field with the mapping in the Large Face List
                 user_data_face_list = {
@@ -115,31 +277,171 @@ class UnifiedFaceCollection:
                     persisted_face_id,
                     user_data=user_data_face_list_json
                 )
-
-                # Update the userData field with the mapping in the Large Person Group
-                user_data_large_person_group = {
-                    "persistedFaceId": persisted_face_id
-                }
-                user_data_large_person_group_json = json.dumps(user_data_large_person_group)
-                self.face_admin_client.large_person_group.update_face(
-                    self.large_person_group_id,
-                    person_id,
-                    person_persisted_face_id,
-                    user_data=user_data_large_person_group_json
-                )
-
-                return {
-                    "face_list": {
-                        "persistedFaceId": persisted_face_id,
-                    },
-                    "person_group": {
-                        "personId": person_id,
-                    }
+            except Exception:
+                self._undo_add(persisted_face_id, person_id, person_persisted_face_id, created)
+                raise
+
+            return {
+                "face_list": {
+                    "persistedFaceId": persisted_face_id,
+                },
+                "person_group": {
+                    "personId": person_id,
                 }
+            }
 
         return {"face_list": { "persistedFaceId": persisted_face_id }}
 
+    # Function to remove what a failed add left behind: the faces it added and the person it created, if that person
+    # has no other faces. Failures here are reported, so the error of the add is the one raised.
+    def _undo_add(self, persisted_face_id, person_id, person_persisted_face_id, person_created):
+        try:
+            if person_persisted_face_id:
+                self.face_admin_client.large_person_group.delete_face(
+                    large_person_group_id=self.large_person_group_id,
+                    person_id=person_id,
+                    persisted_face_id=person_persisted_face_id
+                )
+                self.training.mark_dirty('person_group')
+            self.face_admin_client.large_face_list.delete_face(
+                large_face_list_id=self.large_face_list_id,
+                persisted_face_id=persisted_face_id
+            )
+            self.training.mark_dirty('face_list')
+            if person_created:
+                self._delete_person_if_empty(person_id)
+        except Exception as e:
+            print(f"Failed to undo a partial add: {e}")
+
+    # Function to return the personId of the person with the name, creating the person if there is none
+    def get_or_create_person(self, person_name):
+        return self._get_or_create_person(person_name)[0]
+
+    # Function to return the personId of the person with the name and whether this call created it
+    def _get_or_create_person(self, person_name):
+        person = self.get_person_by_name(person_name)
+        if person is not None:
+            return person.person_id, False
+        with self._person_lock:
+            pending = self._person_creations.get(person_name)
+            owner = pending is None
+            if owner:
+                pending = self._person_creations[person_name] = Future()
+        if not owner:
+            return pending.result(), False
+        try:
+            # Another caller, or another client, may have created the person since the lookup above
+            person = self.get_person_by_name(person_name)
+            if person is None and self._sweep_person_index():
+                person = self.get_person_by_name(person_name)
+            created = person is None
+            if created:
+                person = self.face_admin_client.large_person_group.create_person(
+                    self.large_person_group_id,
+                    name=person_name
+                )
+                self.person_index.add(person.person_id, person_name)
+            pending.set_result(person.person_id)
+            return person.person_id, created
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._person_lock:
+                del self._person_creations[person_name]
+
+    # Function to add many faces; items are image paths or (image_path, person_name) pairs.
+    # Items run concurrently with at most max_in_flight in progress; returns the per-item results and a summary.
+    # With max_faces_per_person, only the sharpest distinct images of each named person are added.
+    def add_faces(self, items, max_workers=8, max_in_flight=None, max_faces_per_person=None):
+        if max_faces_per_person:
+            # The images read for the selection are added without reading them again
+            items = self._select_faces(items, max_faces_per_person)
+        else:
+            items = ((item, None) for item in items)
+        operation = BulkOperation(max_workers, max_in_flight)
+        results = list(operation.run(lambda pair: self._add_face_item(*pair), items))
+        summary = operation.summary()
+        print(f"Added {summary['succeeded']}/{summary['count']} faces in {summary['elapsedSeconds']:.1f}s ({summary['itemsPerSecond']:.1f} faces/s)")
+        return results, summary
+
+    # Function to pick up to count images per named person, dropping near-duplicates of sharper images.
+    # Items without a person name are kept as they are.
+    def select_faces(self, items, count):
+        return [item for item, _ in self._select_faces(items, count)]
+
+    # Function to select like select_faces; returns (item, preprocessed image) pairs, with None for the items
+    # without a person name, which are not read. Only the preprocessed images of selected items are kept.
+    def _select_faces(self, items, count):
+        persons = {}
+        selected = []
+        for item in items:
+            image_path, person_name = item if isinstance(item, (tuple, list)) else (item, None)
+            if person_name is None:
+                selected.append((item, None))
+            else:
+                # Signatures come from the preprocessed bytes, like those of the duplicate index
+                processed = self.preprocess(self.read_image(image_path))
+                persons.setdefault(person_name, []).append(((item, processed), image_signature(processed.content)))
+        for signatures in persons.values():
+            selected.extend(select_distinct(signatures, count))
+        return selected
+
+    def _add_face_item(self, item, processed=None):
+        image_path, person_name = item if isinstance(item, (tuple, list)) else (item, None)
+        result = {'imagePath': image_path, 'personName': person_name, 'persistedFaceId': None, 'personId': None}
+        try:
+            if processed is None:
+                processed = self.preprocess(self.read_image(image_path))
+            duplicate, entry_id = self._reserve_image(processed, person_name)
+            added = duplicate
+            try:
+                if added is None:
+                    faces = self.detect_faces_in_content(processed.content)
+                    if len(faces) == 0:
+                        result['error'] = "No faces detected in the image."
+                        return result
+                    added = self.add_detected_face(processed, faces, person_name)
+            finally:
+                self._finish_image(entry_id, added)
+        except Exception as e:
+            # Reported here, so the result names the image rather than the (item, preprocessed image) pair
+            result['error'] = str(e)
+            return result
+        result['persistedFaceId'] = added['face_list']['persistedFaceId']
+        if 'person_group' in added:
+            result['personId'] = added['person_group']['personId']
+        result['duplicate'] = duplicate is not None
+        return result
+
     def remove_face(self, persisted_face_id):
+        person_id = self._delete_face(persisted_face_id)
+        if person_id:
+            self._delete_person_if_empty(person_id)
+        return True
+
+    # Function to remove many faces from the collection. The faces are deleted concurrently, then every person that
+    # lost a face is checked once and deleted if no faces are left. Returns the per-face results and a summary.
+    def remove_faces(self, persisted_face_ids, max_workers=8, max_in_flight=None):
+        operation = BulkOperation(max_workers, max_in_flight)
+        results = []
+        person_ids = set()
+        for result in operation.run(self._remove_face_item, persisted_face_ids):
+            results.append(result)
+            if result.get('personId'):
+                person_ids.add(result['personId'])
+        summary = operation.summary()
+        deleted = BulkOperation(max_workers, max_in_flight).run(lambda person_id: {'deleted': self._delete_person_if_empty(person_id)}, person_ids)
+        summary['personsDeleted'] = sum(1 for result in deleted if result.get('deleted'))
+        print(f"Removed {summary['succeeded']}/{summary['count']} faces in {summary['elapsedSeconds']:.1f}s ({summary['itemsPerSecond']:.1f} faces/s), deleted {summary['personsDeleted']} persons without faces")
+        return results, summary
+
+    def _remove_face_item(self, persisted_face_id):
+        return {'persistedFaceId': persisted_face_id, 'personId': self._delete_face(persisted_face_id)}
+
+    # Function to delete a face from the Large Face List and its mapped face from the Large Person Group;
+    # returns the personId of the mapped face, or None
+    def _delete_face(self, persisted_face_id):
         face_data  = self.face_admin_client.large_face_list.get_face(
             large_face_list_id=self.large_face_list_id,
             persisted_face_id=persisted_face_id
@@ -156,110 +458,163 @@ class UnifiedFaceCollection:
                 person_id=person_id,
                 persisted_face_id=person_persisted_face_id
             )
-
-            # Check if the person has any faces left
-            person_data = self.face_admin_client.large_person_group.get_person(
-                large_person_group_id=self.large_person_group_id,
-                person_id=person_id
-            )
-            if not person_data.persisted_face_ids:
-                # Delete the person if no faces are left
-                print(f"Deleting the person as no faces are left.")
-                self.face_admin_client.large_person_group.delete_person(
-                    large_person_group_id=self.large_person_group_id,
-                    person_id=person_id
-                )
+            self.training.mark_dirty('person_group')
+        else:
+            person_id = None
 
         # Remove face from Large Face List
         self.face_admin_client.large_face_list.delete_face(
             large_face_list_id=self.large_face_list_id,
             persisted_face_id=persisted_face_id
         )
+        self.training.mark_dirty('face_list')
+        self._forget_images(lambda added: added['face_list']['persistedFaceId'] == persisted_face_id)
+        return person_id
 
+    # Function to delete the person if no faces are left; returns True if it was deleted
+    def _delete_person_if_empty(self, person_id):
+        person_data = self.face_admin_client.large_person_group.get_person(
+            large_person_group_id=self.large_person_group_id,
+            person_id=person_id
+        )
+        if person_data.persisted_face_ids:
+            return False
+        print(f"Deleting the person as no faces are left.")
+        self.face_admin_client.large_person_group.delete_person(
+            large_person_group_id=self.large_person_group_id,
+            person_id=person_id
+        )
+        self.person_index.remove(person_id)
+        self.training.mark_dirty('person_group')
         return True
 
-    def remove_person(self, person_identifier, delete_faces=False):
+    def remove_person(self, person_identifier, delete_faces=False, max_workers=8):
         # Determine if the identifier is a name or an ID
         person_id = None
+        person_faces = None
         if isinstance(person_identifier, str) and len(person_identifier) == 36:
             person_id = person_identifier
         else:
-            person = self.get_person_by_name(person_identifier)
-            if person:
-                person_id = person.person_id
+            person_faces = self.get_person_by_name(person_identifier)
+            if person_faces:
+                person_id = person_faces.person_id
             else:
                 return False
 
-        # Retrieve the person's faces from the person group
-        person_faces = self.face_admin_client.large_person_group.get_person(
-            large_person_group_id=self.large_person_group_id,
-            person_id=person_id
-        )
-        # Update userData in the Large Face List
-        for person_persisted_face_id in person_faces.persisted_face_ids:
-            # Retrieve userData from the face in the person group
-            face_data = self.face_admin_client.large_person_group.get_face(
+        # Retrieve the person's faces from the person group, unless the name lookup already returned them
+        if person_faces is None:
+            person_faces = self.face_admin_client.large_person_group.get_person(
                 large_person_group_id=self.large_person_group_id,
-                person_id=person_id,
-                persisted_face_id=person_persisted_face_id
+                person_id=person_id
             )
-            user_data = face_data.user_data
-            if user_data:
-                user_data_dict = json.loads(user_data)
-                persisted_face_id = user_data_dict.get("persistedFaceId")
-
-                if delete_faces:
-                    # Delete the face from the Large Face List
-                    self.face_admin_client.large_face_list.delete_face(
-                        large_face_list_id=self.large_face_list_id,
-                        persisted_face_id=persisted_face_id
-                    )
-                else:
-                    # Update userData for the face in the Large Face List
-                    user_data_face_list = {
-                        "personId": None,
-                        "personPersistedFaceId": None
-                    }
-                    user_data_face_list_json = json.dumps(user_data_face_list)
-                    self.face_admin_client.large_face_list.update_face(
-                        self.large_face_list_id,
-                        persisted_face_id,
-                        user_data=user_data_face_list_json
-                    )
+        # Update userData in the Large Face List; the faces are independent, so they are handled concurrently
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(lambda face_id: self._unlink_person_face(person_id, face_id, delete_faces), person_faces.persisted_face_ids))
 
         # Remove the person from the person group
         self.face_admin_client.large_person_group.delete_person(
             large_person_group_id=self.large_person_group_id,
             person_id=person_id
         )
+        self.person_index.remove(person_id)
+        self.training.mark_dirty('person_group')
+        self._forget_images(lambda added: added.get('person_group', {}).get('personId') == person_id)
 
         return True
 
-    def get_person_by_name(self, person_name):
-        persons = self.face_admin_client.large_person_group.get_persons(self.large_person_group_id)
-        for person in persons:
-            if person.name == person_name:
-                return person
-        return None
+    # Function to delete or unmap the Large Face List face mapped to a face of the person
+    def _unlink_person_face(self, person_id, person_persisted_face_id, delete_faces):
+        # Retrieve userData from the face in the person group
+        face_data = self.face_admin_client.large_person_group.get_face(
+            large_person_group_id=self.large_person_group_id,
+            person_id=person_id,
+            persisted_face_id=person_persisted_face_id
+        )
+        user_data = face_data.user_data
+        if user_data:
+            user_data_dict = json.loads(user_data)
+            persisted_face_id = user_data_dict.get("persistedFaceId")
+
+            if delete_faces:
+                # Delete the face from the Large Face List
+                self.face_admin_client.large_face_list.delete_face(
+                    large_face_list_id=self.large_face_list_id,
+                    persisted_face_id=persisted_face_id
+                )
+                self.training.mark_dirty('face_list')
+            else:
+                # Update userData for the face in the Large Face List
+                user_data_face_list = {
+                    "personId": None,
+                    "personPersistedFaceId": None
+                }
+                user_data_face_list_json = json.dumps(user_data_face_list)
+                self.face_admin_client.large_face_list.update_face(
+                    self.large_face_list_id,
+                    persisted_face_id,
+                    user_data=user_data_face_list_json
+                )
 
+    # Function to return the person with the name, with its userData and persistedFaceIds, or None
+    def get_person_by_name(self, person_name):
+        # The index is built on the first lookup, paging through the group once
+        if not self.person_index.is_complete():
+            with self._person_index_lock:
+                if not self.person_index.is_complete():
+                    started = time.monotonic()
+                    self.person_index.build(self.list_persons_page)
+                    # A freshly built index is as good as a sweep
+                    self._person_swept_at = started
+        while True:
+            person_id = self.person_index.lookup(person_name)
+            if person_id is None:
+                return None
+            try:
+                return self.face_admin_client.large_person_group.get_person(self.large_person_group_id, person_id)
+            except ResourceNotFoundError:
+                # Deleted by another client; try the next person with the name, if any
+                self.person_index.remove(person_id)
+
+    # Function to compare the whole person index with the group when it is older than person_index_max_age, and
+    # return whether it was compared since the last sweep by this or a concurrent call
+    def _sweep_person_index(self):
+        if self.person_index_max_age is None:
+            return False
+        requested = time.monotonic()
+        with self._person_sweep_lock:
+            if self._person_swept_at > requested:
+                return True
+            started = time.monotonic()
+            if started - self._person_swept_at < self.person_index_max_age:
+                return False
+            self.person_index.reconcile(self.list_persons_page, pages=None)
+            self._person_swept_at = started
+            return True
+
+    # Function to list up to top persons of the Large Person Group with a personId greater than start
+    def list_persons_page(self, start=None, top=PAGE_SIZE):
+        return self.face_admin_client.large_person_group.get_persons(self.large_person_group_id, start=start, top=top)
+
+    # Function to apply changes made to the Large Person Group by other clients to the person index, checking the
+    # given number of pages per call; returns the number of persons added, renamed or removed
+    def reconcile_person_index(self, pages=1):
+        if not self.person_index.is_complete():
+            self.person_index.build(self.list_persons_page)
+            return len(self.person_index)
+        return self.person_index.reconcile(self.list_persons_page, pages)
+
+    # Function to train the parts of the collection that changed since their last training; returns True when
+    # training succeeded
     def train(self):
-        # Train the Large Face List
-        poller_face_list = self.face_admin_client.large_face_list.begin_train(
-            large_face_list_id=self.large_face_list_id,
-            polling_interval=5,
-        )
-        poller_face_list.wait()
-        print(f"The face list {self.large_face_list_id} is trained successfully.")
+        return self.train_async().result()
 
-        # Train the Large Person Group
-        poller_person_group = self.face_admin_client.large_person_group.begin_train(
-            large_person_group_id=self.large_person_group_id,
-            polling_interval=5,
-        )
-        poller_person_group.wait()
-        print(f"The person group {self.large_person_group_id} is trained successfully.")
-        
-        return True
+    # Function to request training without blocking; returns a Future resolving to what train() returns
+    def train_async(self):
+        return self.training.request()
+
+    # Function to tell whether faces or persons were added or removed since the last training
+    def needs_training(self):
+        return self.training.is_dirty()
 
     def find_face(self, image_path, search_type='face'):
         # Detect face in the image
@@ -299,6 +654,8 @@ class UnifiedFaceCollection:
     def delete_collection(self):
         self.face_admin_client.large_face_list.delete(self.large_face_list_id)
         self.face_admin_client.large_person_group.delete(self.large_person_group_id)
+        self.person_index.clear()
+        self._forget_images(lambda added: True)
         return
 
     def list_faces(self):
@@ -314,12 +671,18 @@ class UnifiedFaceCollection:
 
     def list_persons(self):
         persons = []
-        data = self.face_admin_client.large_person_group.get_persons(self.large_person_group_id)
-        for person in data:
-            persons.append({
-                'personId': person.person_id,
-                'name': person.name,
-            })
+        # The service returns at most PAGE_SIZE persons per request
+        start = None
+        while True:
+            data = self.list_persons_page(start)
+            for person in data:
+                persons.append({
+                    'personId': person.person_id,
+                    'name': person.name,
+                })
+            if len(data) < PAGE_SIZE:
+                break
+            start = data[-1].person_id
 
         return persons
 